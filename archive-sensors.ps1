@@ -0,0 +1 @@
+python ./python/archive_sensors.py
\ No newline at end of file
@@ -0,0 +1 @@
+python ./python/migrate_sensors_db.py
\ No newline at end of file
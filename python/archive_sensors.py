@@ -0,0 +1,17 @@
+# archive_sensors.py
+import sys
+from sensors.archive import SensorArchiver
+from sensors.log import logger
+
+
+def main():
+    # 可选参数：保留最近多少天的数据（默认30天）
+    max_age_days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+
+    logger.debug(f"归档 {max_age_days} 天之前的传感器读数...")
+    archiver = SensorArchiver(max_age_days=max_age_days)
+    archiver.archive()
+
+
+if __name__ == "__main__":
+    main()
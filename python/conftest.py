@@ -0,0 +1,2 @@
+# conftest.py
+# 在 python/ 下运行 pytest：本目录加入 sys.path，测试中按 main.py 的方式导入 sensors 等包
@@ -13,7 +13,8 @@ class ToxicGasDatabase:
         :param db_name: 数据库文件名
         :param excel_path: Excel文件路径（可选）
         """
-        self.conn = sqlite3.connect(db_name)
+        # 允许在专用线程中使用（见 util.async_db.async_serial），调用方保证串行
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
         self.cursor = self.conn.cursor()
         self.create_table()
 
@@ -1,4 +1,6 @@
 # %%
+import gzip
+import hmac
 import json
 import contextlib
 import pandas as pd
@@ -8,10 +10,11 @@ from pathlib import Path
 from datetime import datetime
 from omegaconf import OmegaConf
 
-from nicegui import app, ui
+from nicegui import app, ui, run
 
 from fastapi import Request
-from fastapi.responses import RedirectResponse, FileResponse, HTMLResponse
+from fastapi.responses import (RedirectResponse, FileResponse, HTMLResponse, JSONResponse, Response,
+                               StreamingResponse)
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from auth.models import RoleEnum
@@ -23,8 +26,17 @@ from auth.auth_manager import PermissionManager
 from sensors.ui import SensorsUI
 from sensors.sensor_reader import SensorDataReader
 from sensors.sensor_writer import SensorDataWriter
+from sensors.pool import all_pool_stats
+from sensors.hot_cache import get_hot_cache
+from sensors.bulk_ingest import BulkIngestor
+from sensors.poller import SensorSnapshotPoller
+from sensors.push import SensorEventStream
+from sensors.alerts import AlertEngine, AlertLog
+from sensors.ingest import add_column_listener
+from sensors.rolling_stats import SensorRollingStats
 
 from util.user_session_manager import UserSessionManager
+from util.async_db import async_reader, async_serial
 
 from explorer.toxic_gas import ToxicGasDatabase
 
@@ -44,8 +56,67 @@ app.add_static_files('/static', 'static')  # URL path, local folder %%
 
 
 # %%
-# Gas explorer data
+# Gas explorer data (pages await gas_db_async, so queries run off the event loop)
 gas_db = ToxicGasDatabase()
+gas_db_async = async_serial(gas_db)
+
+# %%
+# Sensors data (readers share a per-thread connection pool)
+# Recent readings are served from the in-memory hot cache, which follows the db
+sensor_hot_cache = get_hot_cache()
+# Running statistics are updated by every write, the reader serves them without queries
+sensor_stats = SensorRollingStats()
+add_column_listener(sensor_stats.update)
+sensor_reader = SensorDataReader(hot_cache=sensor_hot_cache, rolling_stats=sensor_stats)
+sensor_writer = SensorDataWriter()
+
+# One poller per process computes the sensor snapshot for all pages and endpoints
+sensor_poller = SensorSnapshotPoller(async_reader(sensor_reader), interval=5)
+app.on_startup(sensor_poller.start)
+SENSORS_CONF = OmegaConf.load('conf/sensors.yml')
+
+# Alerts are evaluated on every ingested batch, thresholds come from the gas catalog
+ALERTS_CONF = SENSORS_CONF['alerts']
+sensor_alerts = AlertEngine(warning=ALERTS_CONF['warning'], danger=ALERTS_CONF['danger'],
+                            max_rate=ALERTS_CONF['max_rate'],
+                            hysteresis=ALERTS_CONF['hysteresis'],
+                            debounce=ALERTS_CONF['debounce'])
+sensor_alerts.set_gases(gas_db.get_all_gases(), dict(ALERTS_CONF['gases']))
+sensor_alert_log = AlertLog()
+# Alerts raised before a restart stay active until their readings clear them
+sensor_alerts.restore(sensor_alert_log.raised())
+sensor_alerts.add_listener(sensor_alert_log.record)
+# Deleted sensors clear their alerts and rolling statistics
+sensor_poller.add_delete_listener(sensor_alerts.remove)
+sensor_poller.add_delete_listener(sensor_stats.drop)
+add_column_listener(sensor_alerts.evaluate)
+
+
+async def reload_alert_thresholds():
+    """气体数据库变化后重新设置告警阈值"""
+    sensor_alerts.set_gases(await gas_db_async.get_all_gases(), dict(ALERTS_CONF['gases']))
+
+
+def on_tailed_rows(rows):
+    """其他进程写入的新读数：评估告警、更新统计，并合并进传感器快照"""
+    sensor_alerts.feed_rows(rows)
+    sensor_stats.feed_rows(rows)
+    sensor_poller.feed_rows(rows)
+
+
+# New rows from any process are merged into the snapshot and pushed to the overlays;
+# only those sensors are updated, the full poll still runs every 5 seconds
+add_column_listener(sensor_poller.feed_columns)
+app.on_startup(lambda: sensor_hot_cache.start_tailer(
+    interval=0.25, on_rows=on_tailed_rows))
+sensor_events = SensorEventStream(sensor_poller)
+
+# %%
+# Sensors bulk ingest (field gateways push batches, authenticated by token)
+SENSOR_INGEST_ROUTE = '/api/sensors/ingest'
+sensor_ingestor = BulkIngestor(SensorDataWriter(buffered=True), sensor_reader,
+                               max_rows=SENSORS_CONF['ingest']['max_rows'],
+                               max_future_seconds=SENSORS_CONF['ingest']['max_future_seconds'])
 
 # %%
 # Cases
@@ -91,7 +162,8 @@ except:
     pass
 
 # Auth middle ware
-unrestricted_page_routes = {'/login', '/welcome', '/'}
+# The ingest route checks its own token instead of the login session
+unrestricted_page_routes = {'/login', '/welcome', '/', SENSOR_INGEST_ROUTE}
 session_manager = UserSessionManager()
 
 
@@ -161,12 +233,14 @@ class GasManagementUI:
         self.sort_column = "气体名称"
         self.sort_ascending = True
 
-        self.refresh_data()
-        self.create_ui()
+    async def build(self):
+        """加载数据并创建界面"""
+        await self.refresh_data()
+        await self.create_ui()
 
-    def refresh_data(self):
+    async def refresh_data(self):
         """刷新数据"""
-        gases = gas_db.search_gases(
+        gases = await gas_db_async.search_gases(
             condition=self.search_condition if self.search_value else None,
             value=self.search_value,
             toxicity_level=self.toxicity_filter if self.toxicity_filter else None
@@ -182,11 +256,19 @@ class GasManagementUI:
         else:
             self.current_df = pd.DataFrame()
 
-    def on_search(self):
+    async def on_search(self):
         """搜索按钮回调"""
-        self.refresh_data()
+        await self.refresh_data()
         self.update_table()
-        self.update_stats()
+        await self.update_stats()
+
+    async def on_reset(self):
+        """重置按钮回调"""
+        self.search_value = ''
+        self.toxicity_filter = ''
+        self.search_input.set_value('')
+        self.toxicity_select.set_value('')
+        await self.on_search()
 
     def on_add_gas(self):
         """添加气体对话框"""
@@ -232,13 +314,14 @@ class GasManagementUI:
 
         dialog.open()
 
-    def add_gas_and_refresh(self, gas_data, dialog):
+    async def add_gas_and_refresh(self, gas_data, dialog):
         """添加气体并刷新界面"""
-        if gas_db.add_gas(gas_data):
+        if await gas_db_async.add_gas(gas_data):
             dialog.close()
-            self.refresh_data()
+            await reload_alert_thresholds()
+            await self.refresh_data()
             self.update_table()
-            self.update_stats()
+            await self.update_stats()
             ui.notify(f"成功添加气体: {gas_data['气体名称']}")
 
     def on_delete_gas(self, formula):
@@ -253,13 +336,14 @@ class GasManagementUI:
 
         dialog.open()
 
-    def delete_gas_and_refresh(self, formula, dialog):
+    async def delete_gas_and_refresh(self, formula, dialog):
         """删除气体并刷新"""
-        if gas_db.delete_gas(formula):
+        if await gas_db_async.delete_gas(formula):
             dialog.close()
-            self.refresh_data()
+            await reload_alert_thresholds()
+            await self.refresh_data()
             self.update_table()
-            self.update_stats()
+            await self.update_stats()
             ui.notify(f"成功删除气体: {formula}")
 
     def update_table(self):
@@ -289,9 +373,9 @@ class GasManagementUI:
         else:
             self.table.update_rows([])
 
-    def update_stats(self):
+    async def update_stats(self):
         """更新统计信息显示"""
-        stats = gas_db.get_statistics()
+        stats = await gas_db_async.get_statistics()
 
         if stats:
             stats_text = f"""
@@ -305,23 +389,23 @@ class GasManagementUI:
         else:
             self.stats_label.set_text("暂无统计数据")
 
-    def on_export_excel(self):
+    async def on_export_excel(self):
         """导出到Excel"""
         try:
-            gas_db.export_to_excel('toxic_gases_export.xlsx')
+            await gas_db_async.export_to_excel('toxic_gases_export.xlsx')
             ui.notify("数据已导出到 toxic_gases_export.xlsx")
         except Exception as e:
             ui.notify(f"导出失败: {str(e)}", type='negative')
 
-    def on_sort(self, column):
+    async def on_sort(self, column):
         """排序处理"""
         if column['column']['name'] in self.current_df.columns:
             self.sort_column = column['column']['name']
             self.sort_ascending = column['ascending']
-            self.refresh_data()
+            await self.refresh_data()
             self.update_table()
 
-    def create_ui(self):
+    async def create_ui(self):
         """创建UI界面"""
         # 标题
         ui.label('气体管理').classes('text-h4 text-primary')
@@ -356,11 +440,7 @@ class GasManagementUI:
 
             # 重置按钮
             ui.button('重置', icon='refresh',
-                      on_click=lambda: (setattr(self, 'search_value', ''),
-                                        setattr(self, 'toxicity_filter', ''),
-                                        self.search_input.set_value(''),
-                                        self.toxicity_select.set_value(''),
-                                        self.on_search())).props('flat')
+                      on_click=self.on_reset).props('flat')
 
         # 操作按钮区域
         if permission_manager.check_permission(user_service.get_user_by_id(app.storage.user['id']), 'edit_content'):
@@ -375,7 +455,7 @@ class GasManagementUI:
             with ui.card_section():
                 ui.label('统计信息').classes('text-h6')
                 self.stats_label = ui.label()
-                self.update_stats()  # 初始显示统计信息
+                await self.update_stats()  # 初始显示统计信息
 
         # 数据表格
         with ui.card().classes('w-full'):
@@ -672,6 +752,7 @@ async def gas_explorer_page():
         # ui.label('Gas explorer').classes('text-h4 font-bold text-primary')
 
         _ui = GasManagementUI()
+        await _ui.build()
 
         # 分割线
         ui.separator().classes('my-4')
@@ -1260,10 +1341,9 @@ async def sensors_page():
     rights = {e: permission_manager.check_permission(
         this_user, e) for e in checks}
 
-    # 创建数据读取器实例
-    reader = SensorDataReader()
-    writer = SensorDataWriter()
-    ui_manager = SensorsUI(reader, writer, rights)
+    # 页面共用进程内的读取器和写入器
+    ui_manager = SensorsUI(sensor_reader, sensor_writer, sensor_poller, rights,
+                           alerts=sensor_alerts)
 
     # 创建页面
     await ui_manager.create_sensors_page()
@@ -1406,6 +1486,7 @@ def show_map(lat: str = '39.906217', lon: str = '116.3912757', zoom: str = '4',
         '"{{lat}}"': lat,
         '"{{lon}}"': lon,
         '{{session}}': session,
+        '"{{cluster_max_zoom}}"': str(sensor_poller.clusters.max_zoom),
     }
     for k, v in changes.items():
         html_content = html_content.replace(k, v)
@@ -1425,17 +1506,204 @@ def show_room(session: str = '???'):
     return HTMLResponse(content=html_content)
 
 
+def sensor_viewport(x0: Optional[float], y0: Optional[float],
+                    x1: Optional[float], y1: Optional[float]) -> Optional[tuple]:
+    """查询参数中的视口 (x0, y0, x1, y1)，四个参数都给出时才按视口过滤"""
+    if None in (x0, y0, x1, y1):
+        return None
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Accept-Encoding 是否接受 gzip（q=0 表示不接受；未列出 gzip 时看 *）"""
+    qualities = {}
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否命中 etag（弱比较：忽略 W/ 前缀）"""
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+
+    tags = {opaque(tag) for tag in request.headers.get('If-None-Match', '').split(',')}
+    return '*' in tags or opaque(etag) in tags
+
+
+def json_bytes_response(request: Request, body: bytes, headers: dict) -> Response:
+    """已编码的 JSON 响应，客户端支持时 gzip 压缩（很小的响应不压缩）"""
+    headers = {**headers, 'Vary': 'Accept-Encoding'}
+    if len(body) > 1024 and accepts_gzip(request):
+        headers['Content-Encoding'] = 'gzip'
+        body = gzip.compress(body, compresslevel=6)
+    return Response(body, headers=headers, media_type='application/json')
+
+
 @app.get('/latest_sensor_data')
-def require_json_latest_sensor_data():
-    reader = SensorDataReader()
-    sensors = reader.get_sensor_info()
-    for s in sensors:
-        try:
-            s['value'] = reader.get_latest_data(s['sensor_id'])[0]['value']
-        except:
-            pass
-    obj = json.dumps(sensors)
-    return HTMLResponse(obj, media_type='application/json')
+async def require_json_latest_sensor_data(request: Request,
+                                          x0: Optional[float] = None, y0: Optional[float] = None,
+                                          x1: Optional[float] = None, y1: Optional[float] = None):
+    """
+    所有传感器及其最新读数（给出 x0, y0, x1, y1 时只返回视口内的传感器）
+
+    来自共享快照，每个内容版本只编码、压缩一次；ETag 为快照的内容版本，
+    数据未变化时对 If-None-Match 返回 304。
+    """
+    snapshot = await sensor_poller.current()
+    headers = {'ETag': snapshot.etag, 'Cache-Control': 'no-cache',
+               'Vary': 'Accept-Encoding'}
+    if etag_matches(request, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+
+    bbox = sensor_viewport(x0, y0, x1, y1)
+    if bbox is not None:
+        rows = sensor_poller.rows_in(snapshot, bbox)
+        body = json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return json_bytes_response(request, body, headers)
+
+    if accepts_gzip(request):
+        headers['Content-Encoding'] = 'gzip'
+        return Response(snapshot.encoded(compress=True), headers=headers,
+                        media_type='application/json')
+    return Response(snapshot.encoded(), headers=headers, media_type='application/json')
+
+
+@app.get('/latest_sensor_data/changes')
+async def require_json_sensor_changes(request: Request, since: Optional[str] = None,
+                                      x0: Optional[float] = None, y0: Optional[float] = None,
+                                      x1: Optional[float] = None, y1: Optional[float] = None):
+    """
+    增量同步最新传感器数据
+
+    since 为上次返回的 cursor，只返回之后变化的传感器和已删除传感器的ID；
+    不带 since 或游标已失效时返回全部传感器（full 为 true）。
+    给出视口 x0, y0, x1, y1 时只同步视口内的传感器。
+    """
+    result = await sensor_poller.changes_since(since, sensor_viewport(x0, y0, x1, y1))
+    body = json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json_bytes_response(request, body, {'Cache-Control': 'no-store'})
+
+
+@app.get('/latest_sensor_data/stream')
+async def stream_sensor_changes(request: Request, since: Optional[str] = None,
+                                x0: Optional[float] = None, y0: Optional[float] = None,
+                                x1: Optional[float] = None, y1: Optional[float] = None):
+    """
+    推送传感器变化（Server-Sent Events）
+
+    每条 sensors 事件的数据与 /latest_sensor_data/changes 相同，事件ID为游标；
+    浏览器重连时带上 Last-Event-ID，从断开处继续。视口参数同 changes。
+    """
+    cursor = request.headers.get('Last-Event-ID') or since
+    events = sensor_events.events(cursor, sensor_viewport(x0, y0, x1, y1))
+    return StreamingResponse(events, media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.get('/sensor_clusters')
+async def require_json_sensor_clusters(request: Request, zoom: float = 0,
+                                       x0: Optional[float] = None, y0: Optional[float] = None,
+                                       x1: Optional[float] = None, y1: Optional[float] = None):
+    """
+    缩放级别 zoom 下视口内的传感器聚类（含读数的最大值和平均值）
+
+    zoom 为整个传感器范围显示为 256 * 2^zoom 像素时的级别；只含一个传感器的
+    格子和超过最大聚类级别时的传感器在 sensors 中按 /latest_sensor_data 的格式返回。
+    """
+    snapshot = await sensor_poller.current()
+    result = sensor_poller.clusters_in(snapshot, zoom, sensor_viewport(x0, y0, x1, y1))
+    result['cursor'] = snapshot.cursor
+    body = json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return json_bytes_response(request, body, {'Cache-Control': 'no-store'})
+
+
+@app.get('/sensor_clusters/stream')
+async def stream_sensor_clusters(zoom: float = 0,
+                                 x0: Optional[float] = None, y0: Optional[float] = None,
+                                 x1: Optional[float] = None, y1: Optional[float] = None):
+    """推送视口内的聚类（Server-Sent Events），clusters 事件的数据同 /sensor_clusters（不含 cursor，事件ID为游标）"""
+    events = sensor_events.clusters(zoom, sensor_viewport(x0, y0, x1, y1))
+    return StreamingResponse(events, media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.get('/sensors/nearest')
+async def require_json_nearest_sensors(x: float, y: float, k: int = 5):
+    """距离 (x, y) 最近的 k 个传感器及其最新读数，按距离升序（含 distance）"""
+    await sensor_poller.current()
+    return JSONResponse(sensor_poller.nearest(x, y, max(1, min(k, 1000))))
+
+
+@app.get('/sensor_status')
+async def require_json_sensor_status(state: Optional[str] = None):
+    """各状态（在线/延迟/离线）的传感器数；指定 state 时同时返回该状态的传感器ID"""
+    liveness = sensor_poller.liveness
+    result = {'counts': liveness.counts()}
+    if state is not None:
+        if state not in liveness.counts():
+            return JSONResponse({'error': f'unknown state: {state}'}, status_code=400)
+        result['sensors'] = sorted(liveness.sensors_in(state))
+    return JSONResponse(result)
+
+
+@app.get('/sensor_alerts')
+def require_json_sensor_alerts(limit: int = 100, sensor_id: Optional[str] = None):
+    """未解除的告警和最近的告警记录（新的在前）；给出 sensor_id 时只返回该传感器的记录"""
+    return {'active': sensor_alerts.active(),
+            'recent': sensor_alert_log.recent(max(1, min(limit, 1000)), sensor_id)}
+
+
+@app.get('/sensor_stats')
+def require_json_sensor_stats(sensor_id: Optional[str] = None):
+    """传感器的增量统计（均值、方差、EWMA、最近1小时最小/最大值），来自内存，不查询历史数据"""
+    return {'sensors': sensor_reader.get_sensor_stats(sensor_id)}
+
+
+@app.get('/sensor_pool_stats')
+def require_json_sensor_pool_stats():
+    return {**all_pool_stats(), 'poller': sensor_poller.stats(),
+            'push_connections': sensor_events.connections,
+            'alerts': sensor_alerts.stats(), 'rolling_stats': sensor_stats.stats()}
+
+
+@app.post(SENSOR_INGEST_ROUTE)
+async def post_sensor_readings(request: Request):
+    """
+    现场网关批量写入传感器读数
+
+    请求体为 NDJSON、JSON 数组、CSV 或 msgpack，字段 sensor_id, value[, timestamp]；
+    请求头 X-Ingest-Token 需与 conf/sensors.yml 中的令牌一致。
+    """
+    token = str(SENSORS_CONF['ingest']['token'] or '')
+    if not token or not hmac.compare_digest(request.headers.get('X-Ingest-Token', ''), token):
+        return JSONResponse({'error': 'invalid ingest token'}, status_code=401)
+
+    body = await request.body()
+    try:
+        result = await run.io_bound(sensor_ingestor.ingest, body,
+                                    request.headers.get('Content-Type', ''))
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except RuntimeError as e:
+        # 写入队列已关闭或写入线程已停止
+        return JSONResponse({'error': str(e)}, status_code=503)
+    return JSONResponse(result)
 
 
 # ---------------------------------------------------------------------------
@@ -1509,6 +1777,19 @@ async def get_hysplit_simulation_table_json(session: str):
     obj = json.load(open(p))
     return HTMLResponse(json.dumps(obj), media_type='application/json')
 
+
+async def simulation_sensors():
+    """模拟的输入：共享快照中的传感器信息，有读数的附带最新值"""
+    snapshot = await sensor_poller.current()
+    sensors = []
+    for sensor in snapshot.sensors:
+        sensor = dict(sensor)
+        latest = snapshot.latest.get(sensor['sensor_id'])
+        if latest is not None:
+            sensor['value'] = latest['value']
+        sensors.append(sensor)
+    return sensors
+
 # ---------------------------------------------------------------------------
 
 
@@ -1554,15 +1835,9 @@ async def simulation_page_fds():
     update_simulation_history()
     simulation_history_select.on_value_change(on_select_session)
 
-    def on_click():
-        reader = SensorDataReader()
-        sensors = reader.get_sensor_info()
-        for s in sensors:
-            try:
-                s['value'] = reader.get_latest_data(s['sensor_id'])[0]['value']
-            except:
-                pass
-        session = simulate_with_fds(sensors)
+    async def on_click():
+        sensors = await simulation_sensors()
+        session = await run.io_bound(simulate_with_fds, sensors)
         update_room(session=session)
         # update_simulation_history()
         ui.notify(
@@ -1570,7 +1845,7 @@ async def simulation_page_fds():
 
     simulate_button.on('click', on_click)
 
-    gases = gas_db.search_gases()
+    gases = await gas_db_async.search_gases()
     geo_candidates = {
         '北京': {'lat': 39.9042, 'lon': 116.4074, 'zoom': 4},
         '上海': {'lat': 31.2304, 'lon': 121.4737, 'zoom': 4},
@@ -1777,14 +2052,8 @@ async def simulation_page_hysplit():
     simulation_history_select.on_value_change(on_select_session)
 
     # Simulate button action
-    def on_click():
-        reader = SensorDataReader()
-        sensors = reader.get_sensor_info()
-        for s in sensors:
-            try:
-                s['value'] = reader.get_latest_data(s['sensor_id'])[0]['value']
-            except:
-                pass
+    async def on_click():
+        sensors = await simulation_sensors()
 
         session = mk_hysplit_session()
         simulate_with_hysplit(sensors, session)
@@ -1796,7 +2065,7 @@ async def simulation_page_hysplit():
 
     simulate_button.on('click', on_click)
 
-    gases = gas_db.search_gases()
+    gases = await gas_db_async.search_gases()
     geo_candidates = {
         '北京': {'lat': 39.9042, 'lon': 116.4074, 'zoom': 4},
         '上海': {'lat': 31.2304, 'lon': 121.4737, 'zoom': 4},
@@ -0,0 +1,23 @@
+# migrate_sensors_db.py
+import sqlite3
+
+from sensors.db_creator import ensure_schema
+from sensors.migrate_v2 import migrate_to_v2
+from sensors.log import logger
+
+
+def main():
+    # 迁移前请停止 keep-writing-sensors 和 serve-forever
+    logger.debug("正在把传感器数据库迁移到 v2 存储结构...")
+    migrate_to_v2()
+
+    # 补建最新值、汇总表和告警记录（旧数据库从历史读数回填）
+    conn = sqlite3.connect('db/sensor_data.db')
+    try:
+        ensure_schema(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+# alerts.py
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .log import logger
+from .storage import configure_connection
+from .ingest import Reading, as_datetime
+from .schema import from_epoch_ms, to_epoch_ms
+
+# 告警级别（下标即 AlertEngine 中的级别值）
+WARNING = '警戒'
+DANGER = '危险'
+RATE = '突变'
+LEVELS = (None, WARNING, DANGER)
+
+# 级别对应的显示颜色（Quasar 颜色名）
+ALERT_COLORS = {None: 'green', WARNING: 'orange', DANGER: 'red', RATE: 'purple'}
+
+RAISED = 'raised'
+CLEARED = 'cleared'
+
+# 告警事件：{'sensor_id', 'rule': 'threshold' | 'rate', 'state': RAISED | CLEARED,
+#           'level': 新级别（解除时为 None）, 'previous': 原级别,
+#           'value': 触发的读数, 'threshold': 越过的阈值, 'timestamp': 读数时间}
+AlertEvent = Dict
+
+
+def parse_threshold(text) -> Optional[float]:
+    """
+    气体数据库中阈值文本的数值部分，例如 '10 ppm' -> 10.0
+
+    单位不做换算，传感器读数应与气体数据库使用相同的单位；没有数值时返回 None。
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = re.search(r'\d+(?:\.\d+)?(?:[eE][-+]?\d+)?', str(text).replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def create_alert_tables(cursor: sqlite3.Cursor):
+    """创建告警记录表（每次告警产生或解除一行）"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sensor_alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sensor_id TEXT NOT NULL,
+        rule TEXT NOT NULL,
+        state TEXT NOT NULL,
+        level TEXT,
+        previous TEXT,
+        value REAL NOT NULL,
+        threshold REAL,
+        timestamp TIMESTAMP NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_alerts_sensor ON sensor_alerts(sensor_id, id)')
+
+
+class AlertEngine:
+    """
+    读数写入时评估的告警引擎
+
+    每个传感器一个槽位，阈值、上一条读数和告警状态都保存在按槽位索引的
+    NumPy 数组中。每批读数按传感器分轮处理（第 k 轮为各传感器的第 k 条读数），
+    每一轮对所有传感器做一次向量运算，因此同一传感器的读数仍按时间顺序评估。
+
+    两条规则：
+    - 阈值：读数达到警戒浓度、危险浓度时告警；回落到解除阈值以下才降级
+      （警戒级别的解除阈值为安全阈值，没有时为警戒浓度 * (1 - hysteresis)）
+    - 变化率：相邻两条读数每秒的变化超过 max_rate 时告警，
+      回落到 max_rate * (1 - hysteresis) 以下才解除
+    连续 debounce 条读数都要求改变状态时才真正改变（去抖）。
+
+    线程安全：写入线程（ingest 监听）和数据库轮询线程都可以调用；
+    监听器在调用线程中执行。
+
+    Args:
+        warning: 没有对应气体的传感器的警戒阈值，None 表示不检查
+        danger: 没有对应气体的传感器的危险阈值
+        max_rate: 变化率阈值（每秒），None 表示不检查
+        hysteresis: 回差比例
+        debounce: 改变状态需要的连续读数条数
+    """
+
+    def __init__(self, warning: Optional[float] = None, danger: Optional[float] = None,
+                 max_rate: Optional[float] = None, hysteresis: float = 0.05,
+                 debounce: int = 2):
+        self.hysteresis = hysteresis
+        self.debounce = max(1, int(debounce))
+        self.max_rate = max_rate
+        self._default = self._levels_from(None, warning, danger)
+        # 传感器ID前缀 -> (解除, 警戒, 危险, 危险解除) 阈值
+        self._prefixes: List[Tuple[str, Tuple[float, float, float, float]]] = []
+        self._slot: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[AlertEvent]], None]] = []
+        self._stats = {'readings': 0, 'batches': 0, 'events': 0, 'last_ms': 0.0}
+        self._allocate_arrays(0)
+
+    def _allocate_arrays(self, capacity: int):
+        # 阈值：[解除, 警戒, 危险, 危险解除]
+        self._thresholds = np.full((capacity, 4), np.inf)
+        self._last_ts = np.full(capacity, -1, dtype=np.int64)
+        self._last_value = np.full(capacity, np.nan)
+        self._rate = np.zeros(capacity)
+        # 阈值规则和变化率规则各自的 (状态, 待定方向, 待定条数)
+        self._level = np.zeros(capacity, dtype=np.int8)
+        self._level_dir = np.zeros(capacity, dtype=np.int8)
+        self._level_count = np.zeros(capacity, dtype=np.int32)
+        self._rate_on = np.zeros(capacity, dtype=np.int8)
+        self._rate_dir = np.zeros(capacity, dtype=np.int8)
+        self._rate_count = np.zeros(capacity, dtype=np.int32)
+
+    def _levels_from(self, safe: Optional[float], warning: Optional[float],
+                     danger: Optional[float]) -> Tuple[float, float, float, float]:
+        """由安全阈值、警戒浓度、危险浓度得到 (解除, 警戒, 危险, 危险解除)"""
+        keep = 1 - self.hysteresis
+        warning = np.inf if warning is None else warning
+        danger = np.inf if danger is None else danger
+        if safe is None or safe >= warning:
+            safe = warning * keep
+        return safe, warning, danger, max(warning, danger * keep)
+
+    def add_listener(self, callback: Callable[[List[AlertEvent]], None]):
+        """注册告警回调，参数为本批读数产生的告警事件列表"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[List[AlertEvent]], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def set_gases(self, gases: Iterable[Dict], prefixes: Dict[str, str]):
+        """
+        按气体数据库设置阈值
+
+        Args:
+            gases: ToxicGasDatabase.get_all_gases() 的结果
+            prefixes: 传感器ID前缀 -> 气体（分子式、气体名称或CAS号）
+        """
+        by_name = {}
+        for gas in gases:
+            for key in ('分子式', '气体名称', 'CAS号'):
+                if gas.get(key):
+                    by_name[str(gas[key])] = gas
+
+        rules = []
+        for prefix, name in prefixes.items():
+            gas = by_name.get(str(name))
+            if gas is None:
+                logger.warning(f"告警配置中的气体 {name} 不在气体数据库中")
+                continue
+            rules.append((prefix, self._levels_from(parse_threshold(gas['安全阈值']),
+                                                    parse_threshold(gas['警戒浓度']),
+                                                    parse_threshold(gas['危险浓度']))))
+        # 长前缀优先
+        rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+
+        with self._lock:
+            self._prefixes = rules
+            for sensor_id, slot in self._slot.items():
+                self._thresholds[slot] = self._rule_for(sensor_id)
+
+    def _rule_for(self, sensor_id: str) -> Tuple[float, float, float, float]:
+        for prefix, levels in self._prefixes:
+            if sensor_id.startswith(prefix):
+                return levels
+        return self._default
+
+    def thresholds(self, sensor_id: str) -> Dict[str, Optional[float]]:
+        """传感器的阈值 {'clear', 'warning', 'danger'}（不检查时为 None）"""
+        with self._lock:
+            slot = self._slot.get(sensor_id)
+            levels = self._thresholds[slot] if slot is not None else self._rule_for(sensor_id)
+        clear, warning, danger, _ = (None if np.isinf(v) else float(v) for v in levels)
+        return {'clear': clear, 'warning': warning, 'danger': danger}
+
+    def level(self, sensor_id: str) -> Optional[str]:
+        """传感器当前的阈值告警级别（正常时为 None）"""
+        with self._lock:
+            slot = self._slot.get(sensor_id)
+            return None if slot is None else LEVELS[self._level[slot]]
+
+    def active(self) -> List[Dict]:
+        """当前所有未解除的告警 [{'sensor_id', 'level', 'rate', 'value', 'timestamp'}, ...]"""
+        with self._lock:
+            n = len(self._ids)
+            slots = np.flatnonzero((self._level[:n] > 0) | (self._rate_on[:n] > 0))
+            return [{'sensor_id': self._ids[slot],
+                     'level': LEVELS[self._level[slot]],
+                     'rate': bool(self._rate_on[slot]),
+                     'value': float(self._last_value[slot]),
+                     'timestamp': from_epoch_ms(int(self._last_ts[slot]))}
+                    for slot in slots.tolist()]
+
+    def restore(self, events: Iterable[AlertEvent]):
+        """
+        从告警记录恢复未解除的告警（进程重启后调用，见 AlertLog.raised）
+
+        恢复后这些告警在读数回落时正常解除，而不会重复产生。
+        """
+        with self._lock:
+            for event in events:
+                slot = self._slot_of(event['sensor_id'])
+                if event['rule'] == 'rate':
+                    self._rate_on[slot] = 1
+                elif event['level'] in LEVELS:
+                    self._level[slot] = LEVELS.index(event['level'])
+                ts = to_epoch_ms(as_datetime(event['timestamp']))
+                if ts >= self._last_ts[slot]:
+                    self._last_ts[slot] = ts
+                    self._last_value[slot] = event['value']
+
+    def remove(self, sensor_id: str) -> List[AlertEvent]:
+        """
+        传感器被删除：解除它的告警并清空状态
+
+        Returns:
+            解除告警的事件（同时通知监听器）
+        """
+        now_ms = to_epoch_ms(datetime.now())
+        events: List[AlertEvent] = []
+        with self._lock:
+            slot = self._slot.get(sensor_id)
+            if slot is None:
+                return events
+            value = self._last_value[slot]
+            value = 0.0 if np.isnan(value) else value
+            level = int(self._level[slot])
+            if level:
+                events.append(self._event(slot, 'threshold', False, None, LEVELS[level], value,
+                                          self._thresholds[slot, 3 if level == 2 else 0], now_ms))
+            if self._rate_on[slot]:
+                events.append(self._event(slot, 'rate', False, None, RATE, value,
+                                          np.inf, now_ms))
+            self._last_ts[slot] = -1
+            self._last_value[slot] = np.nan
+            self._rate[slot] = 0.0
+            for state in (self._level, self._level_dir, self._level_count,
+                          self._rate_on, self._rate_dir, self._rate_count):
+                state[slot] = 0
+            self._stats['events'] += len(events)
+        self._emit(events)
+        return events
+
+    def feed(self, readings: List[Reading]) -> List[AlertEvent]:
+        """评估一批读数 [(sensor_id, value, timestamp), ...]（可直接注册为写入监听器）"""
+        if not readings:
+            return []
+        sensor_ids = [sensor_id for sensor_id, _, _ in readings]
+        ts = np.fromiter((to_epoch_ms(as_datetime(t)) for _, _, t in readings),
+                         dtype=np.int64, count=len(readings))
+        values = np.fromiter((v for _, v, _ in readings), dtype=float, count=len(readings))
+        return self.evaluate(sensor_ids, ts, values)
+
+    def feed_rows(self, rows: List[Tuple[str, int, float]]) -> List[AlertEvent]:
+        """评估 DatabaseTailer 读到的一批 [(sensor_id, 毫秒时间戳, value), ...]"""
+        if not rows:
+            return []
+        sensor_ids = [sensor_id for sensor_id, _, _ in rows]
+        ts = np.fromiter((t for _, t, _ in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((v for _, _, v in rows), dtype=float, count=len(rows))
+        return self.evaluate(sensor_ids, ts, values)
+
+    def evaluate(self, sensor_ids: List[str], ts: np.ndarray,
+                 values: np.ndarray) -> List[AlertEvent]:
+        """
+        评估一批读数并通知监听器（可直接注册为列式写入监听器）
+
+        同一读数重复送入（例如同进程写入后又被数据库轮询读到）时只评估一次：
+        不比该传感器上一条读数新的读数被忽略。
+
+        Returns:
+            本批产生的告警事件
+        """
+        start = time.perf_counter()
+        events: List[AlertEvent] = []
+        with self._lock:
+            slots = np.fromiter((self._slot_of(sensor_id) for sensor_id in sensor_ids),
+                                dtype=np.int64, count=len(sensor_ids))
+            order = np.lexsort((ts, slots))
+            slots, ts, values = slots[order], ts[order], values[order]
+
+            # 每条读数在本传感器中的序号
+            first = np.ones(len(slots), dtype=bool)
+            first[1:] = slots[1:] != slots[:-1]
+            starts = np.flatnonzero(first)
+            rank = np.arange(len(slots)) - np.repeat(starts, np.diff(np.append(starts, len(slots))))
+            # 按序号排列，每一轮是其中连续的一段（回放时一个传感器可能有很多条）
+            by_rank = np.argsort(rank, kind='stable')
+            bounds = np.append(0, np.cumsum(np.bincount(rank))).tolist() if len(rank) else [0]
+
+            for r in range(len(bounds) - 1):
+                pick = by_rank[bounds[r]:bounds[r + 1]]
+                s, t, v = slots[pick], ts[pick], values[pick]
+                fresh = (t > self._last_ts[s]) & ~np.isnan(v)
+                if fresh.any():
+                    self._step(s[fresh], t[fresh], v[fresh], events)
+
+            self._stats['readings'] += len(slots)
+            self._stats['batches'] += 1
+            self._stats['events'] += len(events)
+            self._stats['last_ms'] = (time.perf_counter() - start) * 1000
+
+        self._emit(events)
+        return events
+
+    def stats(self) -> Dict:
+        with self._lock:
+            n = len(self._ids)
+            return {**self._stats, 'sensors': n,
+                    'active': int(np.count_nonzero((self._level[:n] > 0)
+                                                   | (self._rate_on[:n] > 0)))}
+
+    def _slot_of(self, sensor_id: str) -> int:
+        slot = self._slot.get(sensor_id)
+        if slot is not None:
+            return slot
+        slot = len(self._ids)
+        if slot >= len(self._last_ts):
+            # 容量翻倍
+            old = {name: getattr(self, name) for name in (
+                '_thresholds', '_last_ts', '_last_value', '_rate', '_level', '_level_dir',
+                '_level_count', '_rate_on', '_rate_dir', '_rate_count')}
+            self._allocate_arrays(max(64, 2 * slot))
+            for name, array in old.items():
+                getattr(self, name)[:slot] = array
+        self._ids.append(sensor_id)
+        self._slot[sensor_id] = slot
+        self._thresholds[slot] = self._rule_for(sensor_id)
+        return slot
+
+    def _debounce(self, state: np.ndarray, direction: np.ndarray, count: np.ndarray,
+                  s: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """
+        去抖：连续 debounce 条读数要求同方向变化时才把 state 改为 target
+
+        Returns:
+            状态改变了的读数的掩码
+        """
+        wanted = np.sign(target.astype(np.int16) - state[s]).astype(np.int8)
+        same = (wanted != 0) & (wanted == direction[s])
+        count[s] = np.where(wanted == 0, 0, np.where(same, count[s] + 1, 1))
+        direction[s] = wanted
+        fire = count[s] >= self.debounce
+        fired = s[fire]
+        state[fired] = target[fire]
+        count[fired] = 0
+        direction[fired] = 0
+        return fire
+
+    def _step(self, s: np.ndarray, t: np.ndarray, v: np.ndarray,
+              events: List[AlertEvent]):
+        """评估每个传感器各一条读数（s 中没有重复的槽位）"""
+        # 变化率（与上一条读数比较）
+        prev_t, prev_v = self._last_ts[s], self._last_value[s]
+        dt = (t - prev_t) / 1000
+        has_prev = (prev_t >= 0) & ~np.isnan(prev_v)
+        rate = np.where(has_prev, np.abs(v - np.where(has_prev, prev_v, 0))
+                        / np.where(has_prev, dt, 1), 0.0)
+        self._last_ts[s] = t
+        self._last_value[s] = v
+        self._rate[s] = rate
+
+        # 阈值规则：先看是否升级，再看是否仍高于当前级别的解除阈值
+        limits = self._thresholds[s]
+        level = self._level[s].copy()
+        raw = np.where(v >= limits[:, 2], 2, np.where(v >= limits[:, 1], 1, 0))
+        hold_at = np.select([level == 2, level == 1], [limits[:, 3], limits[:, 0]], -np.inf)
+        lower = np.where(v >= limits[:, 0], 1, 0)
+        target = np.where(raw > level, raw, np.where(v >= hold_at, level, lower)).astype(np.int8)
+        fire = self._debounce(self._level, self._level_dir, self._level_count, s, target)
+        for i in np.flatnonzero(fire).tolist():
+            old, new = int(level[i]), int(target[i])
+            raised = new > old
+            # 升级时为新级别的阈值，降级时为原级别的解除阈值
+            threshold = limits[i, new] if raised else limits[i, 3 if old == 2 else 0]
+            events.append(self._event(int(s[i]), 'threshold', raised, LEVELS[new],
+                                      LEVELS[old], v[i], threshold, t[i]))
+
+        if self.max_rate is None:
+            return
+        on = self._rate_on[s].copy()
+        limit = np.where(on > 0, self.max_rate * (1 - self.hysteresis), self.max_rate)
+        rate_target = np.where(on > 0, rate >= limit, rate > limit).astype(np.int8)
+        fire = self._debounce(self._rate_on, self._rate_dir, self._rate_count, s, rate_target)
+        for i in np.flatnonzero(fire).tolist():
+            raised = bool(rate_target[i])
+            events.append(self._event(int(s[i]), 'rate', raised, RATE if raised else None,
+                                      None if raised else RATE, v[i], limit[i], t[i]))
+
+    def _event(self, slot: int, rule: str, raised: bool, level: Optional[str],
+               previous: Optional[str], value: float, threshold: float,
+               ts_ms: int) -> AlertEvent:
+        return {'sensor_id': self._ids[slot], 'rule': rule,
+                'state': RAISED if raised else CLEARED,
+                'level': level, 'previous': previous, 'value': float(value),
+                'threshold': None if np.isinf(threshold) else float(threshold),
+                'timestamp': from_epoch_ms(int(ts_ms))}
+
+    def _emit(self, events: List[AlertEvent]):
+        if not events:
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error(f"告警监听器出错: {e}")
+
+
+class AlertLog:
+    """
+    告警记录表 sensor_alerts 的读写（自己的连接，可在任意线程中调用）
+
+    Args:
+        db_path: 数据库文件路径
+        managed: 是否使用托管存储模式（WAL）
+    """
+
+    def __init__(self, db_path: str = 'db/sensor_data.db', managed: bool = True):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        if managed:
+            configure_connection(self.conn, persistent=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            create_alert_tables(self.conn.cursor())
+
+    def record(self, events: List[AlertEvent]):
+        """写入一批告警事件（可直接注册为 AlertEngine 的监听器）"""
+        with self._lock:
+            try:
+                with self.conn:
+                    self.conn.executemany('''
+                    INSERT INTO sensor_alerts
+                    (sensor_id, rule, state, level, previous, value, threshold, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', [(e['sensor_id'], e['rule'], e['state'], e['level'], e['previous'],
+                           e['value'], e['threshold'], e['timestamp']) for e in events])
+            except sqlite3.Error as e:
+                logger.error(f"写入告警记录失败: {e}")
+
+    def raised(self) -> List[AlertEvent]:
+        """
+        每个仍存在的传感器、每条规则最后一条记录为产生告警的事件
+
+        即重启前未解除的告警，用于 AlertEngine.restore。
+        """
+        with self._lock:
+            cursor = self.conn.execute('''
+            SELECT a.sensor_id, a.rule, a.state, a.level, a.previous, a.value,
+                   a.threshold, a.timestamp
+            FROM sensor_alerts a
+            JOIN (SELECT MAX(id) AS id FROM sensor_alerts GROUP BY sensor_id, rule) last
+              ON last.id = a.id
+            WHERE a.state = ? AND a.sensor_id IN (SELECT sensor_id FROM sensors)
+            ORDER BY a.id
+            ''', (RAISED,))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def recent(self, limit: int = 100, sensor_id: Optional[str] = None) -> List[Dict]:
+        """最近的告警记录（新的在前）"""
+        sql = 'SELECT * FROM sensor_alerts'
+        params: tuple = ()
+        if sensor_id is not None:
+            sql += ' WHERE sensor_id = ?'
+            params = (sensor_id,)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        with self._lock:
+            cursor = self.conn.execute(sql, params + (limit,))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,273 @@
+# archive.py
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .log import logger
+from .storage import configure_connection
+from .schema import SCHEMA_V2, from_epoch_ms, schema_version, to_epoch_ms
+
+
+def archive_path(archive_dir, day: str) -> Path:
+    """某一天的归档文件路径，例如 data/sensor_archive/readings-2025-12-10.npz"""
+    return Path(archive_dir) / f'readings-{day}.npz'
+
+
+def archived_days(archive_dir) -> List[str]:
+    """已归档的日期列表（升序）"""
+    folder = Path(archive_dir)
+    if not folder.is_dir():
+        return []
+    days = []
+    for p in folder.glob('readings-*.npz'):
+        day = p.stem[len('readings-'):]
+        try:
+            datetime.strptime(day, '%Y-%m-%d')
+        except ValueError:
+            # 不是归档文件（例如旧版本中断时留下的临时文件）
+            continue
+        days.append(day)
+    return sorted(days)
+
+
+def _read_npz(path: Path) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as data:
+        columns = {}
+        # v1 数据库的归档带有原始 id，v2 没有
+        if 'id' in data.files:
+            columns['id'] = data['id']
+        columns['sensor_id'] = data['sensor_id'].astype(object)
+        columns['value'] = data['value']
+        columns['timestamp'] = data['timestamp'].astype('datetime64[us]')
+        return pd.DataFrame(columns)
+
+
+def _write_npz(path: Path, df: pd.DataFrame):
+    """按列写入压缩的 NPZ 文件（先写临时文件再替换，避免产生半个文件）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 临时文件名不匹配 readings-*.npz，中断时不会被当作归档文件
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    columns = {
+        'sensor_id': df['sensor_id'].to_numpy(dtype=str),
+        'value': df['value'].to_numpy(dtype=np.float64),
+        'timestamp': df['timestamp'].to_numpy(dtype='datetime64[us]').view(np.int64),
+    }
+    if 'id' in df.columns and df['id'].notna().all():
+        columns['id'] = df['id'].to_numpy(dtype=np.int64)
+    # 传入文件对象，savez 不会在文件名后追加 .npz
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp_path, path)
+
+
+def iter_archive(archive_dir, sensor_id: Optional[str] = None,
+                 start_time: Optional[datetime] = None,
+                 end_time: Optional[datetime] = None) -> Iterator[pd.DataFrame]:
+    """
+    按天逐个读取时间范围内的归档数据（同一时刻只有一天的数据在内存中）
+
+    Yields:
+        每天一个 DataFrame，列为 [id,] sensor_id, value, timestamp，按时间排序
+    """
+    for day in archived_days(archive_dir):
+        day_start = datetime.fromisoformat(day)
+        if start_time and day_start + timedelta(days=1) <= start_time:
+            continue
+        if end_time and day_start > end_time:
+            continue
+
+        df = _read_npz(archive_path(archive_dir, day))
+        if sensor_id:
+            df = df[df['sensor_id'] == sensor_id]
+        if start_time:
+            df = df[df['timestamp'] >= start_time]
+        if end_time:
+            df = df[df['timestamp'] <= end_time]
+        if not df.empty:
+            yield df.reset_index(drop=True)
+
+
+def load_archive(archive_dir, sensor_id: Optional[str] = None,
+                 start_time: Optional[datetime] = None,
+                 end_time: Optional[datetime] = None) -> pd.DataFrame:
+    """
+    读取时间范围内的归档数据
+
+    Returns:
+        DataFrame，列为 [id,] sensor_id, value, timestamp，按时间排序
+    """
+    frames = list(iter_archive(archive_dir, sensor_id, start_time, end_time))
+    if not frames:
+        return pd.DataFrame({'id': pd.Series(dtype=np.int64),
+                             'sensor_id': pd.Series(dtype=object),
+                             'value': pd.Series(dtype=np.float64),
+                             'timestamp': pd.Series(dtype='datetime64[us]')})
+    return pd.concat(frames, ignore_index=True).sort_values(
+        'timestamp', kind='stable', ignore_index=True)
+
+
+class SensorArchiver:
+    """
+    冷数据归档
+
+    把早于 max_age_days 天的读数按天写入 archive_dir 下的压缩列式文件，
+    然后分块从 sensor_readings 中删除。汇总表（rollup）保留，长时间范围的
+    图表查询不受影响。
+    """
+
+    def __init__(self, db_path: str = 'db/sensor_data.db',
+                 archive_dir: str = 'data/sensor_archive',
+                 max_age_days: int = 30, chunk_size: int = 10000,
+                 managed: bool = True):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.max_age_days = max_age_days
+        self.chunk_size = chunk_size
+        self.managed = managed
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """归档截止时间（按天对齐）"""
+        now = now or datetime.now()
+        cutoff = now - timedelta(days=self.max_age_days)
+        return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def archive(self, now: Optional[datetime] = None) -> int:
+        """
+        归档所有早于截止时间的读数
+
+        Returns:
+            归档的读数条数
+        """
+        cutoff = self.cutoff(now)
+        conn = sqlite3.connect(self.db_path)
+        if self.managed:
+            configure_connection(conn)
+
+        total = 0
+        try:
+            if schema_version(conn) == SCHEMA_V2:
+                for day in self._days_v2(conn, cutoff):
+                    total += self._archive_day_v2(conn, day)
+            else:
+                days = [row[0] for row in conn.execute('''
+                SELECT DISTINCT substr(timestamp, 1, 10)
+                FROM sensor_readings
+                WHERE timestamp < ?
+                ORDER BY 1
+                ''', (cutoff,))]
+
+                for day in days:
+                    total += self._archive_day(conn, day)
+        finally:
+            conn.close()
+
+        logger.info(f"归档完成: {total} 条读数，截止 {cutoff}")
+        return total
+
+    def _merge_into_file(self, day: str, df: pd.DataFrame) -> Path:
+        """同一天再次归档（迟到的数据）时与已有文件合并"""
+        path = archive_path(self.archive_dir, day)
+        if path.exists():
+            df = pd.concat([_read_npz(path), df], ignore_index=True)
+            key = 'id' if 'id' in df.columns and df['id'].notna().all() \
+                else ['sensor_id', 'timestamp']
+            df = df.drop_duplicates(key, keep='last')
+        df = df.sort_values('timestamp', kind='stable', ignore_index=True)
+        _write_npz(path, df)
+        return path
+
+    def _days_v2(self, conn: sqlite3.Connection, cutoff: datetime) -> List[str]:
+        """
+        v2 下需要归档的日期（只包含有读数的日期）
+
+        每个传感器在主键 (sensor_key, ts) 上从一个有读数的日期直接跳到下一个：
+        查找次数与有读数的日期数成正比，个别很早的异常时间戳不会带来逐日的空查询。
+        """
+        limit = to_epoch_ms(cutoff)
+        keys = [row[0] for row in conn.execute('SELECT sensor_key FROM sensor_keys')]
+        days = set()
+        for key in keys:
+            start = -2 ** 63
+            while True:
+                ts = conn.execute('''
+                SELECT MIN(ts) FROM readings_v2
+                WHERE sensor_key = ? AND ts >= ? AND ts < ?
+                ''', (key, start, limit)).fetchone()[0]
+                if ts is None:
+                    break
+                day = from_epoch_ms(ts).replace(hour=0, minute=0, second=0, microsecond=0)
+                days.add(day)
+                start = to_epoch_ms(day + timedelta(days=1))
+        return [day.strftime('%Y-%m-%d') for day in sorted(days)]
+
+    def _archive_day_v2(self, conn: sqlite3.Connection, day: str) -> int:
+        day_start = datetime.fromisoformat(day)
+        day_end = day_start + timedelta(days=1)
+
+        rows = conn.execute('''
+        SELECT k.sensor_id, r.sensor_key, r.ts, r.value
+        FROM sensor_keys k
+        CROSS JOIN readings_v2 r ON r.sensor_key = k.sensor_key
+        WHERE r.ts >= ? AND r.ts < ?
+        ''', (to_epoch_ms(day_start), to_epoch_ms(day_end))).fetchall()
+        if not rows:
+            return 0
+
+        sensor_ids, keys, ts, values = zip(*rows)
+        df = pd.DataFrame({
+            'sensor_id': list(sensor_ids),
+            'value': np.asarray(values, dtype=np.float64),
+            'timestamp': np.asarray(ts, dtype='datetime64[ms]').astype('datetime64[us]'),
+        })
+        path = self._merge_into_file(day, df)
+
+        # v2 没有自增 id，按主键精确删除已写入文件的行
+        pks = list(zip(keys, ts))
+        for i in range(0, len(pks), self.chunk_size):
+            with conn:
+                conn.executemany(
+                    'DELETE FROM readings_v2 WHERE sensor_key = ? AND ts = ?',
+                    pks[i:i + self.chunk_size])
+
+        logger.debug(f"归档 {day}: {len(pks)} 条 -> {path}")
+        return len(pks)
+
+    def _archive_day(self, conn: sqlite3.Connection, day: str) -> int:
+        day_start = datetime.fromisoformat(day)
+        day_end = day_start + timedelta(days=1)
+
+        df = pd.read_sql_query('''
+        SELECT id, sensor_id, value, timestamp
+        FROM sensor_readings
+        WHERE timestamp >= ? AND timestamp < ?
+        ''', conn, params=(day_start, day_end))
+        if df.empty:
+            return 0
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+        max_id = int(df['id'].max())
+
+        path = self._merge_into_file(day, df)
+
+        # 只删除已写入文件的行：之后插入的行 id 一定更大
+        deleted = 0
+        while True:
+            with conn:
+                cursor = conn.execute('''
+                DELETE FROM sensor_readings
+                WHERE id IN (
+                    SELECT id FROM sensor_readings
+                    WHERE timestamp >= ? AND timestamp < ? AND id <= ?
+                    LIMIT ?
+                )
+                ''', (day_start, day_end, max_id, self.chunk_size))
+            if cursor.rowcount <= 0:
+                break
+            deleted += cursor.rowcount
+
+        logger.debug(f"归档 {day}: {deleted} 条 -> {path}")
+        return deleted
@@ -0,0 +1,195 @@
+# bulk_ingest.py
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .log import logger
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，未安装时不接受 msgpack 格式
+    msgpack = None
+
+
+# Content-Type -> 数据格式
+CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/json': 'json',
+    'text/csv': 'csv',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+}
+
+# 按检查顺序排列的拒绝原因，每行只记录第一个原因
+REJECT_REASONS = ['missing_sensor_id', 'unknown_sensor', 'invalid_value',
+                  'invalid_timestamp', 'future_timestamp']
+
+
+def parse_payload(body: bytes, content_type: str) -> pd.DataFrame:
+    """
+    把请求体解析为 DataFrame（列至少包含 sensor_id, value，timestamp 可选）
+
+    支持 NDJSON（每行一个对象）、JSON 数组、CSV（带表头）和 msgpack
+    （对象数组或 {列名: 数组}）。
+
+    Raises:
+        ValueError: 格式不支持或无法解析
+    """
+    fmt = CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+    if fmt is None:
+        raise ValueError(f'不支持的数据格式: {content_type}')
+    if not body.strip():
+        return pd.DataFrame(columns=['sensor_id', 'value'])
+
+    try:
+        if fmt == 'ndjson':
+            df = pd.read_json(io.BytesIO(body), lines=True, dtype=False,
+                              convert_dates=False)
+        elif fmt == 'json':
+            df = pd.DataFrame(json.loads(body))
+        elif fmt == 'csv':
+            df = pd.read_csv(io.BytesIO(body), dtype=str, keep_default_na=False,
+                             na_values=[''])
+        else:
+            if msgpack is None:
+                raise ValueError('服务器未安装 msgpack，无法解析 msgpack 数据')
+            df = pd.DataFrame(msgpack.unpackb(body, raw=False))
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f'无法解析 {fmt} 数据: {e}') from e
+
+    missing = {'sensor_id', 'value'} - set(df.columns)
+    if missing:
+        raise ValueError(f'缺少字段: {", ".join(sorted(missing))}')
+    return df
+
+
+def _parse_timestamps(column: Optional[pd.Series], index: pd.Index,
+                      now: datetime) -> pd.Series:
+    """
+    把时间列解析为本地时间（naive）
+
+    数字为 Unix 毫秒时间戳；带时区的字符串换算为本地时间；
+    不带时区的字符串视为本地时间；空值使用接收时间。无法解析的为 NaT。
+    """
+    result = pd.Series(pd.NaT, index=index, dtype='datetime64[us]')
+    if column is None:
+        return result.fillna(pd.Timestamp(now))
+
+    local_tz = now.astimezone().tzinfo
+    present = column.notna() & (column.astype(str).str.strip() != '')
+    numbers = pd.to_numeric(column, errors='coerce')
+    is_number = present & numbers.notna()
+    if is_number.any():
+        result[is_number] = (pd.to_datetime(numbers[is_number], unit='ms', utc=True,
+                                            errors='coerce')
+                             .dt.tz_convert(local_tz).dt.tz_localize(None))
+
+    text = column[present & ~is_number].astype(str).str.strip()
+    aware = text.str.contains(r'(?:Z|[+-]\d\d:?\d\d)$', regex=True)
+    if aware.any():
+        result[aware[aware].index] = (
+            pd.to_datetime(text[aware], format='ISO8601', utc=True, errors='coerce')
+            .dt.tz_convert(local_tz).dt.tz_localize(None))
+    if (~aware).any():
+        result[aware[~aware].index] = pd.to_datetime(
+            text[~aware], format='ISO8601', errors='coerce')
+
+    return result.where(present, pd.Timestamp(now))
+
+
+def validate_readings(df: pd.DataFrame, known_sensors: Iterable[str],
+                      now: Optional[datetime] = None,
+                      max_future: timedelta = timedelta(minutes=5)
+                      ) -> Tuple[List[Tuple], Dict[str, int]]:
+    """
+    整列校验一批读数
+
+    Args:
+        df: parse_payload 的结果
+        known_sensors: 已注册的传感器ID
+        now: 接收时间，默认为当前时间
+        max_future: 允许的时间戳超前量
+
+    Returns:
+        (有效读数 [(sensor_id, value, timestamp), ...], {拒绝原因: 条数})
+    """
+    now = now or datetime.now()
+    if df.empty:
+        return [], {}
+
+    sensor_ids = df['sensor_id'].astype('string').str.strip()
+    values = pd.to_numeric(df['value'], errors='coerce').astype(np.float64)
+    timestamps = _parse_timestamps(df.get('timestamp'), df.index, now)
+
+    # 与 REJECT_REASONS 一一对应；空值一律视为不通过
+    checks = [
+        sensor_ids.eq('').to_numpy(dtype=bool, na_value=True),
+        ~sensor_ids.isin(list(known_sensors)).to_numpy(dtype=bool, na_value=False),
+        ~np.isfinite(values.to_numpy()),
+        timestamps.isna().to_numpy(),
+        (timestamps > now + max_future).to_numpy(dtype=bool),
+    ]
+    reason = np.select(checks, REJECT_REASONS, default='')
+
+    rejected = {}
+    for name in REJECT_REASONS:
+        count = int((reason == name).sum())
+        if count:
+            rejected[name] = count
+
+    ok = reason == ''
+    readings = list(zip(sensor_ids[ok].tolist(), values[ok].tolist(),
+                        timestamps[ok].dt.to_pydatetime().tolist()))
+    return readings, rejected
+
+
+class BulkIngestor:
+    """
+    HTTP 批量写入：解析、校验后交给组提交写入队列
+
+    writer 应为 buffered=True 的 SensorDataWriter，接口线程只负责入队。
+    """
+
+    def __init__(self, writer, reader, max_rows: int = 100000,
+                 max_future_seconds: float = 300, enqueue_timeout: float = 5.0):
+        self.writer = writer
+        self.reader = reader
+        self.max_rows = max_rows
+        self.max_future = timedelta(seconds=max_future_seconds)
+        self.enqueue_timeout = enqueue_timeout
+
+    def ingest(self, body: bytes, content_type: str) -> Dict:
+        """
+        处理一个请求体
+
+        Returns:
+            {'accepted': 条数, 'rejected': 条数, 'reasons': {拒绝原因: 条数}}
+
+        Raises:
+            ValueError: 格式错误或条数超过 max_rows
+        """
+        df = parse_payload(body, content_type)
+        if len(df) > self.max_rows:
+            raise ValueError(f'单次最多 {self.max_rows} 条读数，收到 {len(df)} 条')
+
+        known = [s['sensor_id'] for s in self.reader.get_sensor_info()]
+        readings, reasons = validate_readings(df, known, max_future=self.max_future)
+
+        accepted = 0
+        if readings:
+            accepted = self.writer.ingest.put_many(readings, block=True,
+                                                   timeout=self.enqueue_timeout)
+            if accepted < len(readings):
+                reasons['queue_full'] = len(readings) - accepted
+
+        rejected = len(df) - accepted
+        if rejected:
+            logger.warning(f"批量写入拒绝 {rejected} 条: {reasons}")
+        return {'accepted': accepted, 'rejected': rejected, 'reasons': reasons}
@@ -0,0 +1,59 @@
+# change_log.py
+from collections import deque
+from typing import Iterable, Optional, Set, Tuple
+
+
+class SensorChangeLog:
+    """
+    按快照内容版本记录发生变化和被删除的传感器
+
+    只保留最近 max_versions 个版本；客户端的游标早于保留范围时需要全量同步。
+
+    Args:
+        max_versions: 保留的版本数（轮询间隔 5 秒时 720 个版本约为 1 小时）
+    """
+
+    def __init__(self, max_versions: int = 720):
+        # (版本, 变化的传感器, 删除的传感器, 位置变化的传感器)，版本递增
+        self._entries = deque(maxlen=max_versions)
+        # 不早于该版本的游标可以增量同步
+        self._floor: Optional[int] = None
+
+    def reset(self, version: int):
+        """从 version 开始重新记录（例如第一个快照）"""
+        self._entries.clear()
+        self._floor = version
+
+    def record(self, version: int, changed: Iterable[str], deleted: Iterable[str],
+               moved: Iterable[str] = ()):
+        """记录 version 相对上一个版本的变化（moved 为新增或位置变化的传感器）"""
+        if self._floor is None:
+            self._floor = version
+            return
+        if len(self._entries) == self._entries.maxlen:
+            # 最早的记录将被挤出，之前的游标无法再增量同步
+            self._floor = self._entries[0][0]
+        self._entries.append(
+            (version, frozenset(changed), frozenset(deleted), frozenset(moved)))
+
+    def since(self, version: int) -> Optional[Tuple[Set[str], Set[str], Set[str]]]:
+        """
+        version 之后变化、删除和位置变化的传感器
+
+        Returns:
+            (变化的传感器, 删除的传感器, 位置变化的传感器)；
+            version 超出保留范围时返回 None
+        """
+        if self._floor is None or version < self._floor:
+            return None
+        changed, deleted, moved = set(), set(), set()
+        for entry_version, entry_changed, entry_deleted, entry_moved in reversed(self._entries):
+            if entry_version <= version:
+                break
+            changed |= entry_changed
+            deleted |= entry_deleted
+            moved |= entry_moved
+        return changed, deleted, moved
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,117 @@
+# chart_sync.py
+import json
+from typing import Optional
+
+import numpy as np
+from nicegui import ui
+
+
+# 在浏览器中追加新的点、删除移出时间窗口的点，只重绘该图表
+_APPEND_JS = '''
+(() => {
+    const element = getElement(%(id)d);
+    if (!element || !element.chart) return;
+    const options = element.options;
+    const data = options.series[0].data;
+    for (const point of %(points)s) data.push(point);
+    let i = 0;
+    while (i < data.length && data[i][0] < %(min)d) i++;
+    if (i > 0) data.splice(0, i);
+    options.xAxis.min = %(min)d;
+    options.xAxis.max = %(max)d;
+    element.chart.setOption({xAxis: {min: %(min)d, max: %(max)d}, series: [{data: data}]});
+})()
+'''
+
+
+def trend_chart_options() -> dict:
+    """
+    趋势图的初始配置
+
+    横轴为时间轴，数据点为 [毫秒时间戳, 数值]。时间戳是本地墙上时钟按 UTC
+    换算的毫秒数（见 sensors.schema），因此按 UTC 显示即为本地时间。
+    """
+    return {
+        'useUTC': True,
+        'animation': False,
+        'tooltip': {'trigger': 'axis'},
+        'xAxis': {'type': 'time', 'name': '时间'},
+        'yAxis': {'type': 'value', 'name': '数值', 'scale': True},
+        'series': [{'type': 'line', 'name': '-', 'showSymbol': False, 'data': []}],
+    }
+
+
+class TrendChartSync:
+    """
+    传感器趋势图的增量更新
+
+    切换传感器或时间范围时整体设置一次（已降采样的）数据；之后每次只发送比上次
+    更新的点，并在浏览器中删除移出时间窗口的点，刷新开销与新增点数成正比。
+    追加的点超过预算一倍后需要重新降采样（见 needs_reset）。
+    """
+
+    def __init__(self, chart: ui.echart, window_ms: int = 60 * 60 * 1000):
+        self.chart = chart
+        self.window_ms = window_ms
+        self.max_points = 1000
+        self.sensor_id: Optional[str] = None
+        # 已发送的最后一个点的时间戳（毫秒）
+        self.last_ts: Optional[int] = None
+
+    def invalidate(self):
+        """下次刷新时整体重新加载（例如时间范围改变后）"""
+        self.sensor_id = None
+
+    def needs_reset(self) -> bool:
+        """图表中的点数是否已超过预算的两倍"""
+        return len(self.chart.options['series'][0]['data']) > 2 * self.max_points
+
+    def reset(self, sensor_id: str, ts: np.ndarray, values: np.ndarray, now_ms: int,
+              max_points: Optional[int] = None):
+        """
+        整体替换数据
+
+        Args:
+            ts, values: 时间窗口内的数据（已降采样到 max_points 以内）
+            max_points: 本次使用的点数预算
+        """
+        if max_points:
+            self.max_points = max_points
+        start = now_ms - self.window_ms
+        options = self.chart.options
+        options['series'][0]['name'] = sensor_id
+        options['series'][0]['data'] = np.column_stack(
+            [ts, values]).tolist() if len(ts) else []
+        options['xAxis']['min'] = start
+        options['xAxis']['max'] = now_ms
+        self.chart.update()
+
+        self.sensor_id = sensor_id
+        self.last_ts = int(ts[-1]) if len(ts) else start
+
+    def append(self, ts: np.ndarray, values: np.ndarray, now_ms: int):
+        """追加 last_ts 之后的新读数，并把时间窗口移动到 now_ms"""
+        start = now_ms - self.window_ms
+        points = np.column_stack([ts, values]).tolist() if len(ts) else []
+
+        # 服务端的配置做同样的修改（不发送整个配置），页面重连时仍是最新数据
+        options = self.chart.options
+        with self.chart.props.suspend_updates():
+            data = options['series'][0]['data']
+            data.extend(points)
+            i = 0
+            while i < len(data) and data[i][0] < start:
+                i += 1
+            if i:
+                del data[:i]
+            options['xAxis']['min'] = start
+            options['xAxis']['max'] = now_ms
+
+        self.chart.client.run_javascript(_APPEND_JS % {
+            'id': self.chart.id,
+            'points': json.dumps(points),
+            'min': start,
+            'max': now_ms,
+        })
+        if len(ts):
+            self.last_ts = int(ts[-1])
@@ -0,0 +1,218 @@
+# cluster.py
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .spatial import BBox
+
+# (sensor_id, x, y, 最新读数或 None)
+ClusterPoint = Tuple[str, float, float, Optional[float]]
+
+
+class _Level:
+    """一个缩放级别的分组（只与位置有关）和聚合值（与读数有关）"""
+
+    def __init__(self, slots: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                 cell_x: np.ndarray, cell_y: np.ndarray,
+                 mean_x: np.ndarray, mean_y: np.ndarray):
+        self.slots = slots      # 按格子排序后的传感器槽位
+        self.starts = starts    # 每个格子在 slots 中的起点
+        self.counts = counts
+        self.cell_x = cell_x
+        self.cell_y = cell_y
+        self.mean_x = mean_x    # 格子内传感器位置的平均值（聚类的显示位置）
+        self.mean_y = mean_y
+        # (有读数的传感器数, 读数之和, 读数最大值)，读数变化后置空
+        self.aggregates: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+
+class SensorClusterIndex:
+    """
+    按地图缩放级别的传感器聚类
+
+    缩放级别 z 时整个传感器范围（相对坐标 0-1）显示为 tile_size * 2^z 像素，
+    每 radius 像素见方的格子里的传感器合成一个聚类，显示在它们的平均位置，
+    并带上读数的最大值和平均值。视口里的聚类数只与视口的像素大小有关，
+    与传感器总数无关。
+
+    每个级别在第一次查询时计算并缓存：读数变化只重新聚合（numpy 向量运算），
+    传感器新增、删除或移动时才重新分组。
+
+    Args:
+        radius: 聚类半径（像素）
+        tile_size: 级别 0 时整个传感器范围的像素大小
+        max_zoom: 最大的聚类级别，更大的级别不再聚类
+    """
+
+    def __init__(self, radius: float = 64, tile_size: float = 256, max_zoom: int = 12):
+        self.radius = radius
+        self.tile_size = tile_size
+        self.max_zoom = max_zoom
+        self._slot: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._x = np.zeros(0)
+        self._y = np.zeros(0)
+        self._values = np.zeros(0)
+        self._alive = np.zeros(0, dtype=bool)
+        self._levels: Dict[int, _Level] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot)
+
+    def level(self, zoom: float) -> int:
+        """缩放值（可以是小数）对应的级别"""
+        return max(0, int(math.floor(zoom)))
+
+    def cell_size(self, level: int) -> float:
+        """级别 level 的格子边长（相对坐标）"""
+        return self.radius / (self.tile_size * 2 ** level)
+
+    def rebuild(self, points: Iterable[ClusterPoint]):
+        """用 [(sensor_id, x, y, value), ...] 重建"""
+        points = list(points)
+        size = len(points)
+        self._ids = [sensor_id for sensor_id, _, _, _ in points]
+        self._slot = {sensor_id: slot for slot, sensor_id in enumerate(self._ids)}
+        self._free = []
+        self._x = np.array([x for _, x, _, _ in points], dtype=float).reshape(size)
+        self._y = np.array([y for _, _, y, _ in points], dtype=float).reshape(size)
+        self._values = np.array([np.nan if v is None else v for _, _, _, v in points],
+                                dtype=float).reshape(size)
+        self._alive = np.ones(size, dtype=bool)
+        self._levels.clear()
+
+    def insert(self, sensor_id: str, x: float, y: float):
+        """添加传感器（已存在时移动到新位置）"""
+        slot = self._slot.get(sensor_id)
+        if slot is None:
+            slot = self._allocate(sensor_id)
+        elif self._x[slot] == x and self._y[slot] == y:
+            return
+        self._x[slot] = x
+        self._y[slot] = y
+        self._levels.clear()
+
+    def remove(self, sensor_id: str):
+        slot = self._slot.pop(sensor_id, None)
+        if slot is None:
+            return
+        self._ids[slot] = None
+        self._alive[slot] = False
+        self._values[slot] = np.nan
+        self._free.append(slot)
+        self._levels.clear()
+
+    def set_value(self, sensor_id: str, value: Optional[float]):
+        """更新传感器的最新读数（None 表示没有读数）"""
+        slot = self._slot.get(sensor_id)
+        if slot is None:
+            return
+        value = np.nan if value is None else float(value)
+        old = self._values[slot]
+        if old == value or (np.isnan(old) and np.isnan(value)):
+            return
+        self._values[slot] = value
+        for level in self._levels.values():
+            level.aggregates = None
+
+    def query(self, level: int, bbox: Optional[BBox] = None) -> Tuple[List[Dict], List[str]]:
+        """
+        级别 level 下平均位置在 bbox 内的聚类
+
+        Returns:
+            (聚类列表, 单独显示的 sensor_id 列表)；聚类为
+            {'id', 'x_position', 'y_position', 'count', 'value_count', 'max', 'mean'}，
+            只含一个传感器的格子作为单个传感器返回
+        """
+        grid = self._level(level)
+        if not len(grid.starts):
+            return [], []
+        with_value, total, maximum = self._aggregate(grid)
+
+        if bbox is None:
+            picked = np.arange(len(grid.starts))
+        else:
+            x0, y0, x1, y1 = bbox
+            picked = np.flatnonzero((grid.mean_x >= x0) & (grid.mean_x <= x1)
+                                    & (grid.mean_y >= y0) & (grid.mean_y <= y1))
+
+        clusters, singles = [], []
+        for i in picked.tolist():
+            count = int(grid.counts[i])
+            if count == 1:
+                singles.append(self._ids[grid.slots[grid.starts[i]]])
+                continue
+            n = int(with_value[i])
+            clusters.append({
+                'id': f'{level}/{grid.cell_x[i]}/{grid.cell_y[i]}',
+                'x_position': float(grid.mean_x[i]),
+                'y_position': float(grid.mean_y[i]),
+                'count': count,
+                'value_count': n,
+                'max': float(maximum[i]) if n else None,
+                'mean': float(total[i] / n) if n else None,
+            })
+        return clusters, singles
+
+    def stats(self) -> Dict:
+        return {'sensors': len(self._slot), 'levels': sorted(self._levels)}
+
+    def _allocate(self, sensor_id: str) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = sensor_id
+        else:
+            slot = len(self._ids)
+            self._ids.append(sensor_id)
+            if slot >= len(self._alive):
+                # 容量翻倍，避免逐个添加时反复复制
+                capacity = max(16, 2 * len(self._alive))
+                self._x = np.resize(self._x, capacity)
+                self._y = np.resize(self._y, capacity)
+                self._values = np.resize(self._values, capacity)
+                self._alive = np.resize(self._alive, capacity)
+                self._alive[slot:] = False
+        self._slot[sensor_id] = slot
+        self._alive[slot] = True
+        self._values[slot] = np.nan
+        return slot
+
+    def _level(self, level: int) -> _Level:
+        """级别 level 的分组，位置变化后第一次查询时重新计算"""
+        grid = self._levels.get(level)
+        if grid is not None:
+            return grid
+
+        slots = np.flatnonzero(self._alive)
+        size = self.cell_size(level)
+        cx = np.floor(self._x[slots] / size).astype(np.int64)
+        cy = np.floor(self._y[slots] / size).astype(np.int64)
+        order = np.lexsort((cy, cx))
+        slots, cx, cy = slots[order], cx[order], cy[order]
+
+        boundary = np.ones(len(slots), dtype=bool)
+        boundary[1:] = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+        starts = np.flatnonzero(boundary)
+        if len(starts):
+            counts = np.diff(np.append(starts, len(slots)))
+            mean_x = np.add.reduceat(self._x[slots], starts) / counts
+            mean_y = np.add.reduceat(self._y[slots], starts) / counts
+        else:
+            counts = mean_x = mean_y = np.zeros(0)
+        grid = _Level(slots, starts, counts, cx[starts], cy[starts], mean_x, mean_y)
+        self._levels[level] = grid
+        return grid
+
+    def _aggregate(self, grid: _Level) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """各格子的 (有读数的传感器数, 读数之和, 读数最大值)，读数变化后重新计算"""
+        if grid.aggregates is None:
+            values = self._values[grid.slots]
+            has_value = ~np.isnan(values)
+            grid.aggregates = (
+                np.add.reduceat(has_value.astype(np.int64), grid.starts),
+                np.add.reduceat(np.where(has_value, values, 0.0), grid.starts),
+                np.maximum.reduceat(np.where(has_value, values, -np.inf), grid.starts),
+            )
+        return grid.aggregates
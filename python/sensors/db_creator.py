@@ -2,12 +2,105 @@
 import sqlite3
 from datetime import datetime
 from .log import logger
+from .storage import configure_connection
+from .rollup import create_rollup_tables, rebuild_rollups, rollup_table
+from .alerts import create_alert_tables
+from .schema import (SCHEMA_V2, create_compat_view, create_journal, create_v2_tables,
+                     schema_version, set_schema_version)
 
 
-def init_database():
-    """初始化数据库和表结构"""
-    conn = sqlite3.connect('db/sensor_data.db')
+def _existing_schema(cursor):
+    """已有数据库的存储结构版本，新数据库返回None"""
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE name IN ('sensor_readings', 'readings_v2')")
+    names = {row[0] for row in cursor.fetchall()}
+    if not names:
+        return None
+    return schema_version(cursor.connection)
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+def ensure_schema(conn: sqlite3.Connection):
+    """
+    创建由读数派生的表（最新值、时间桶汇总、告警记录、v2 写入日志），可重复调用
+
+    旧数据库第一次调用时从历史读数回填新建的 sensor_latest 和汇总表；
+    读写进程连接数据库时调用，已有数据库不需要重新执行 init_database。
+    """
     cursor = conn.cursor()
+    # 多个进程同时启动时串行执行
+    conn.commit()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        has_readings = _table_exists(cursor, 'sensor_readings')
+        new_latest = not _table_exists(cursor, 'sensor_latest')
+        new_rollups = not _table_exists(cursor, rollup_table('1d'))
+
+        # 每个传感器的最新读数，由写入器在每次写入时维护
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_latest (
+            sensor_id TEXT PRIMARY KEY,
+            value REAL NOT NULL,
+            timestamp TIMESTAMP NOT NULL,
+            FOREIGN KEY (sensor_id) REFERENCES sensors (sensor_id)
+        )
+        ''')
+
+        # 旧数据库升级：从历史读数回填最新值
+        if new_latest and has_readings:
+            cursor.execute('''
+            INSERT INTO sensor_latest (sensor_id, value, timestamp)
+            SELECT sensor_id, value, MAX(timestamp)
+            FROM sensor_readings
+            GROUP BY sensor_id
+            ''')
+            logger.info(f"回填 sensor_latest: {cursor.rowcount} 个传感器")
+
+        # 1分钟/1小时/1天 时间桶汇总表
+        create_rollup_tables(cursor)
+
+        # 告警记录（见 sensors.alerts）
+        create_alert_tables(cursor)
+
+        # v2 的写入日志，其他进程据此增量读取新数据
+        if _table_exists(cursor, 'readings_v2'):
+            create_journal(cursor)
+    except Exception:
+        conn.rollback()
+        raise
+
+    if new_rollups and has_readings:
+        # 旧数据库升级：从历史读数回填汇总表（与建表在同一事务中提交）
+        rebuild_rollups(conn)
+    else:
+        conn.commit()
+
+
+def init_database(db_path='db/sensor_data.db', managed=True, schema=None):
+    """
+    初始化数据库和表结构
+
+    Args:
+        db_path: 数据库文件路径
+        managed: 是否使用托管存储模式（WAL、synchronous=NORMAL等）
+        schema: 存储结构版本，None表示保持已有数据库的版本，新数据库使用v2
+                （v1 转 v2 请使用 sensors.migrate_v2）
+    """
+    conn = sqlite3.connect(db_path)
+    if managed:
+        configure_connection(conn)
+    cursor = conn.cursor()
+
+    existing = _existing_schema(cursor)
+    if schema is None:
+        schema = existing or SCHEMA_V2
+    elif existing is not None and existing != schema:
+        conn.close()
+        raise ValueError(f'数据库已是 v{existing} 结构，不能按 v{schema} 初始化')
 
     # 创建传感器信息表
     cursor.execute('''
@@ -20,29 +113,39 @@ def init_database():
     )
     ''')
 
-    # 创建传感器数据表
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS sensor_readings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        sensor_id TEXT NOT NULL,
-        value REAL NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (sensor_id) REFERENCES sensors (sensor_id)
-    )
-    ''')
+    if schema == SCHEMA_V2:
+        # 整数键 + 毫秒时间戳，按 (sensor_key, ts) 聚簇，无额外索引
+        create_v2_tables(cursor)
+        create_compat_view(cursor)
+    else:
+        # 创建传感器数据表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sensor_id TEXT NOT NULL,
+            value REAL NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (sensor_id) REFERENCES sensors (sensor_id)
+        )
+        ''')
+
+        # 创建索引以提高查询性能（需要单独执行）
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_sensor_time ON sensor_readings(sensor_id, timestamp)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp)')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_sensor_id ON sensor_readings(sensor_id)')
+    set_schema_version(conn, schema)
 
-    # 创建索引以提高查询性能（需要单独执行）
-    cursor.execute(
-        'CREATE INDEX IF NOT EXISTS idx_sensor_time ON sensor_readings(sensor_id, timestamp)')
-    cursor.execute(
-        'CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp)')
-    cursor.execute(
-        'CREATE INDEX IF NOT EXISTS idx_sensor_id ON sensor_readings(sensor_id)')
     cursor.execute(
         'CREATE INDEX IF NOT EXISTS idx_sensors_id ON sensors(sensor_id)')
 
     conn.commit()
 
+    # 最新值、汇总表和告警记录
+    ensure_schema(conn)
+
     # 验证表是否创建成功
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
     tables = cursor.fetchall()
@@ -57,6 +160,11 @@ def init_database():
     for index in indexes:
         logger.debug(f"  - {index[0]}")
 
+    if managed:
+        mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        logger.info(f"日志模式: {mode}")
+    logger.info(f"存储结构版本: v{schema}")
+
     conn.close()
     logger.info("数据库初始化完成！")
 
@@ -0,0 +1,96 @@
+# downsample.py
+from typing import Tuple
+
+import numpy as np
+
+
+def lttb(ts: np.ndarray, values: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets 降采样
+
+    首尾两点保留，其余数据等分为 n_out-2 个桶，每个桶选出与“上一个选中点”和
+    “下一个桶的均值点”组成三角形面积最大的点。桶内面积用 NumPy 整体计算，
+    Python 循环只按桶进行。
+
+    Args:
+        ts: 时间戳数组（按升序）
+        values: 数值数组
+        n_out: 输出点数
+
+    Returns:
+        (时间戳数组, 数值数组)，点数不超过 n_out
+    """
+    n = len(ts)
+    if n_out >= n or n_out < 3:
+        return ts, values
+
+    # 以第一个点为原点，避免毫秒时间戳相乘时损失精度
+    x = (ts - ts[0]).astype(np.float64)
+    y = np.asarray(values, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # 每个桶的均值点（用前缀和一次算出），下一个桶的均值点作为三角形的第三个顶点
+    cx = np.concatenate([[0.0], np.cumsum(x)])
+    cy = np.concatenate([[0.0], np.cumsum(y)])
+    counts = ends - starts
+    avg_x = (cx[ends] - cx[starts]) / counts
+    avg_y = (cy[ends] - cy[starts]) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        s, e = starts[i], ends[i]
+        area = np.abs((x[a] - next_x[i]) * (y[s:e] - y[a])
+                      - (x[a] - x[s:e]) * (next_y[i] - y[a]))
+        a = s + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return ts[selected], values[selected]
+
+
+def minmax(ts: np.ndarray, values: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    最小/最大值包络降采样
+
+    数据等分为 n_out // 2 个桶，每个桶保留最小值和最大值两个点（按时间顺序），
+    尖峰不会被平滑掉。完全向量化。
+
+    Returns:
+        (时间戳数组, 数值数组)，点数不超过 n_out
+    """
+    n = len(ts)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return ts, values
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+
+    # 按 (桶, 数值) 排序后，每个桶的第一个是最小值、最后一个是最大值
+    order = np.lexsort((values, bucket))
+    lo = order[edges[:-1]]
+    hi = order[edges[1:] - 1]
+
+    selected = np.unique(np.concatenate([lo, hi]))
+    return ts[selected], values[selected]
+
+
+METHODS = {'lttb': lttb, 'minmax': minmax}
+
+
+def downsample(ts: np.ndarray, values: np.ndarray, max_points: int,
+               method: str = 'lttb') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把时间序列降采样到不超过 max_points 个点
+
+    Args:
+        method: 'lttb'（保持形状）或 'minmax'（保留极值）
+    """
+    if method not in METHODS:
+        raise ValueError(f'未知的降采样方法: {method}')
+    return METHODS[method](np.asarray(ts), np.asarray(values), max_points)
@@ -0,0 +1,362 @@
+# hot_cache.py
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .log import logger
+from .storage import configure_connection
+from .schema import SCHEMA_V2, schema_version, to_epoch_ms
+from .ingest import add_column_listener
+
+
+class RingBuffer:
+    """
+    单个传感器的定长环形缓冲区
+
+    时间戳（毫秒，int64）和数值（float64）分别存放在两个 NumPy 数组中，
+    按时间升序保存，满了之后覆盖最旧的数据。迟到的读数（不比已有数据新）
+    按时间合并到缓冲区中，已有的时间戳保留原值。
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.head = 0   # 下一个写入位置
+        self.size = 0
+        # 从该时间起缓冲区中的数据是完整的
+        self.complete_since: Optional[int] = None
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        if self.size == 0:
+            return None
+        return int(self.ts[self.head - 1])
+
+    def extend(self, ts: np.ndarray, values: np.ndarray) -> int:
+        """
+        追加一批按时间升序的读数，旧于已有数据的读数按时间合并
+
+        Returns:
+            实际写入的条数
+        """
+        merged = 0
+        last = self.last_ts
+        if last is not None:
+            late = ts <= last
+            if late.any():
+                merged = self._merge(ts[late], values[late])
+                ts, values = ts[~late], values[~late]
+        n = len(ts)
+        if n == 0:
+            return merged
+        if n > self.capacity:
+            ts, values = ts[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+
+        idx = (self.head + np.arange(n)) % self.capacity
+        self.ts[idx] = ts
+        self.values[idx] = values
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+        if self.complete_since is None:
+            self.complete_since = int(ts[0])
+        # 覆盖旧数据后，完整区间从最旧的保留数据开始
+        if self.size == self.capacity:
+            self.complete_since = max(self.complete_since, int(self.ts[self.head]))
+        return merged + n
+
+    def _merge(self, ts: np.ndarray, values: np.ndarray) -> int:
+        """
+        把迟到的读数按时间插入缓冲区（重新排列整个缓冲区，O(capacity)）
+
+        早于完整区间起点的读数不需要缓存（该时间段的查询走数据库）。
+
+        Returns:
+            插入的条数
+        """
+        old_ts, old_values = self.window(np.iinfo(np.int64).min)
+        keep = (ts >= self.complete_since) & ~np.isin(ts, old_ts)
+        ts, values = ts[keep], values[keep]
+        if not len(ts):
+            return 0
+        # 同一批中重复的时间戳保留第一条
+        ts, first = np.unique(ts, return_index=True)
+        values = values[first]
+
+        all_ts = np.concatenate([old_ts, ts])
+        order = np.argsort(all_ts, kind='stable')
+        all_ts = all_ts[order][-self.capacity:]
+        all_values = np.concatenate([old_values, values])[order][-self.capacity:]
+
+        n = len(all_ts)
+        self.ts[:n] = all_ts
+        self.values[:n] = all_values
+        self.head = n % self.capacity
+        self.size = n
+        # 满了之后最旧的数据被挤出，完整区间从最旧的保留数据开始
+        if n == self.capacity:
+            self.complete_since = max(self.complete_since, int(all_ts[0]))
+        return len(ts)
+
+    def window(self, since_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+        """获取 since_ms 之后的数据（按时间升序的副本）"""
+        if self.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        start = (self.head - self.size) % self.capacity
+        order = (start + np.arange(self.size)) % self.capacity
+        ts = self.ts[order]
+        i = np.searchsorted(ts, since_ms, side='left')
+        return ts[i:], self.values[order[i:]]
+
+
+class SensorHotCache:
+    """
+    进程内最近读数缓存（每个传感器一个 RingBuffer）
+
+    同进程的写入器通过 ingest 监听直接写入缓存；其他进程写入的数据由
+    DatabaseTailer 轮询数据库补充。读取最近时间窗口时不需要执行 SQL。
+    """
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._buffers: Dict[str, RingBuffer] = {}
+        self._lock = threading.Lock()
+        self._tailer: Optional['DatabaseTailer'] = None
+        # 清空后有数据没有进入缓存，新建的缓冲区在预热之前都不完整
+        self._incomplete = False
+
+    def _buffer(self, sensor_id: str) -> RingBuffer:
+        buffer = self._buffers.get(sensor_id)
+        if buffer is None:
+            buffer = RingBuffer(self.capacity)
+            if self._incomplete:
+                buffer.complete_since = np.iinfo(np.int64).max
+            self._buffers[sensor_id] = buffer
+        return buffer
+
+    def feed(self, readings: List[Tuple]):
+        """写入一批读数 [(sensor_id, value, timestamp), ...]"""
+        grouped: Dict[str, list] = {}
+        for sensor_id, value, timestamp in readings:
+            grouped.setdefault(sensor_id, []).append((to_epoch_ms(timestamp), value))
+
+        with self._lock:
+            for sensor_id, points in grouped.items():
+                points.sort()
+                data = np.asarray(points, dtype=np.float64)
+                self._buffer(sensor_id).extend(data[:, 0].astype(np.int64), data[:, 1])
+
+    def feed_columns(self, sensor_ids: Sequence[str], ts: np.ndarray, values: np.ndarray):
+        """写入一批列式读数（sensor_id 数组, 毫秒时间戳数组, 数值数组）"""
+        if not len(ts):
+            return
+        ids, inverse = np.unique(np.asarray(sensor_ids, dtype=object), return_inverse=True)
+        order = np.lexsort((ts, inverse))
+        starts = np.flatnonzero(np.append(True, np.diff(inverse[order]) != 0))
+        bounds = np.append(starts, len(order)).tolist()
+        ts = np.asarray(ts, dtype=np.int64)[order]
+        values = np.asarray(values, dtype=np.float64)[order]
+        with self._lock:
+            for sensor_id, start, end in zip(ids[inverse[order[starts]]].tolist(),
+                                             bounds[:-1], bounds[1:]):
+                self._buffer(sensor_id).extend(ts[start:end], values[start:end])
+
+    def feed_arrays(self, sensor_id: str, ts: np.ndarray, values: np.ndarray):
+        """写入一个传感器按时间升序的数组"""
+        with self._lock:
+            self._buffer(sensor_id).extend(np.asarray(ts, dtype=np.int64),
+                                           np.asarray(values, dtype=np.float64))
+
+    def prime(self, sensor_id: str, ts: np.ndarray, values: np.ndarray,
+              since_ms: int):
+        """
+        用从数据库读取的历史数据预热缓存
+
+        Args:
+            ts, values: since_ms 之后的完整历史（按时间升序）
+            since_ms: 这批数据覆盖的起始时间（毫秒）
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            old = self._buffers.get(sensor_id)
+            buffer = RingBuffer(self.capacity)
+            buffer.complete_since = since_ms
+            buffer.extend(ts, values)
+            if old is not None:
+                # 保留预热期间已经写入缓存的更新数据
+                buffer.extend(*old.window(since_ms))
+            self._buffers[sensor_id] = buffer
+
+    def covers(self, sensor_id: str, since_ms: int) -> bool:
+        """缓存中是否有 since_ms 之后的完整数据"""
+        with self._lock:
+            buffer = self._buffers.get(sensor_id)
+            return (buffer is not None and buffer.complete_since is not None
+                    and buffer.complete_since <= since_ms)
+
+    def window(self, sensor_id: str, since_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取传感器 since_ms 之后的数据
+
+        Returns:
+            (时间戳数组（毫秒）, 数值数组)，按时间升序
+        """
+        with self._lock:
+            buffer = self._buffers.get(sensor_id)
+            if buffer is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+            return buffer.window(since_ms)
+
+    def drop(self, sensor_id: str):
+        with self._lock:
+            self._buffers.pop(sensor_id, None)
+
+    def clear(self):
+        """清空缓存（之后的查询走数据库并重新预热）"""
+        with self._lock:
+            self._buffers.clear()
+            self._incomplete = True
+
+    def is_live(self) -> bool:
+        """是否有 DatabaseTailer 在同步其他进程写入的数据"""
+        return self._tailer is not None and self._tailer.is_alive()
+
+    def start_tailer(self, db_path: str = 'db/sensor_data.db',
+                     interval: float = 1.0,
+                     on_rows: Optional[Callable[[List[Tuple]], None]] = None) -> 'DatabaseTailer':
+        """
+        启动数据库轮询线程（重复调用返回已启动的线程）
+
+        Args:
+            on_rows: 读到新数据后在轮询线程中调用，参数为新读数
+                [(sensor_id, 毫秒时间戳, value), ...]（例如评估告警、通知快照轮询器提前刷新）
+        """
+        if not self.is_live():
+            self._tailer = DatabaseTailer(self, db_path, interval, on_rows=on_rows)
+            self._tailer.start()
+        return self._tailer
+
+
+class DatabaseTailer(threading.Thread):
+    """轮询数据库中新增的读数并写入缓存"""
+
+    def __init__(self, cache: SensorHotCache, db_path: str, interval: float = 1.0,
+                 batch_size: int = 20000,
+                 on_rows: Optional[Callable[[List[Tuple]], None]] = None):
+        super().__init__(name='sensor-tailer', daemon=True)
+        self.cache = cache
+        self.on_rows = on_rows
+        self.db_path = db_path
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+        self._cursor = None  # v1: sensor_readings 的最大 id；v2: readings_journal 的最大 seq
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path)
+        configure_connection(conn, persistent=False)
+        conn.execute('PRAGMA query_only = ON')
+        try:
+            schema = schema_version(conn)
+            poll = self._poll_v2 if schema == SCHEMA_V2 else self._poll_v1
+            while True:
+                try:
+                    # 一次没有取完时立即继续
+                    if poll(conn) >= self.batch_size:
+                        continue
+                except sqlite3.Error as e:
+                    logger.warning(f"读取新数据失败: {e}")
+                if self._stop_event.wait(self.interval):
+                    break
+        finally:
+            conn.close()
+
+    def _feed_rows(self, rows):
+        if not rows:
+            return
+        grouped: Dict[str, list] = {}
+        for sensor_id, ts, value in rows:
+            grouped.setdefault(sensor_id, []).append((ts, value))
+        for sensor_id, points in grouped.items():
+            # 按写入顺序读到的数据不一定按时间排列
+            points.sort()
+            data = np.asarray(points, dtype=np.float64)
+            self.cache.feed_arrays(sensor_id, data[:, 0].astype(np.int64), data[:, 1])
+        if self.on_rows is not None:
+            try:
+                self.on_rows(rows)
+            except Exception as e:
+                logger.error(f"新数据回调出错: {e}")
+
+    def _poll_v1(self, conn: sqlite3.Connection) -> int:
+        if self._cursor is None:
+            # 从启动时刻开始同步，之前的数据按需从数据库预热
+            self._cursor = conn.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM sensor_readings').fetchone()[0]
+            return 0
+
+        rows = conn.execute('''
+        SELECT id, sensor_id,
+               CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER),
+               value
+        FROM sensor_readings
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+        ''', (self._cursor, self.batch_size)).fetchall()
+        if rows:
+            self._cursor = rows[-1][0]
+            self._feed_rows(sorted((r[1], r[2], r[3]) for r in rows))
+        return len(rows)
+
+    def _poll_v2(self, conn: sqlite3.Connection) -> int:
+        # 按写入日志的 seq 读取，迟到的读数（时间戳较早）也不会漏掉
+        if self._cursor is None:
+            self._cursor = conn.execute(
+                'SELECT COALESCE(MAX(seq), 0) FROM readings_journal').fetchone()[0]
+            return 0
+
+        rows = conn.execute('''
+        SELECT j.seq, k.sensor_id, j.ts, r.value
+        FROM readings_journal j
+        JOIN readings_v2 r ON r.sensor_key = j.sensor_key AND r.ts = j.ts
+        JOIN sensor_keys k ON k.sensor_key = j.sensor_key
+        WHERE j.seq > ?
+        ORDER BY j.seq
+        LIMIT ?
+        ''', (self._cursor, self.batch_size)).fetchall()
+        if rows and rows[0][0] > self._cursor + 1 and self._gap(conn):
+            # 读取落后于日志清理，中间的数据已无法增量读取
+            logger.warning("写入日志已被清理，清空缓存后从数据库重新预热")
+            self.cache.clear()
+        if rows:
+            self._cursor = rows[-1][0]
+            self._feed_rows(sorted((r[1], r[2], r[3]) for r in rows))
+        return len(rows)
+
+    def _gap(self, conn: sqlite3.Connection) -> bool:
+        """游标之后的日志是否已被清理"""
+        oldest = conn.execute('SELECT MIN(seq) FROM readings_journal').fetchone()[0]
+        return oldest is not None and oldest > self._cursor + 1
+
+
+_hot_cache: Optional[SensorHotCache] = None
+_hot_cache_lock = threading.Lock()
+
+
+def get_hot_cache() -> SensorHotCache:
+    """进程内共享的缓存，创建时注册为写入监听器"""
+    global _hot_cache
+    with _hot_cache_lock:
+        if _hot_cache is None:
+            _hot_cache = SensorHotCache()
+            add_column_listener(_hot_cache.feed_columns)
+        return _hot_cache
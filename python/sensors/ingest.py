@@ -0,0 +1,474 @@
+# ingest.py
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .log import logger
+from .storage import configure_connection
+from .rollup import update_rollups, update_rollups_columns
+from .schema import (INSERT_V2_SQL, SCHEMA_V1, SCHEMA_V2, format_epoch_ms, from_epoch_ms,
+                     insert_readings, inserted_v2_rows, resolve_sensor_keys,
+                     schema_version, to_epoch_ms)
+
+
+# (sensor_id, value, timestamp)
+Reading = Tuple[str, float, datetime]
+
+# 列式读数的回调参数：(sensor_id 数组, 毫秒时间戳数组, 数值数组)
+ColumnListener = Callable[[Sequence[str], np.ndarray, np.ndarray], None]
+
+
+# 写入提交后的回调，参数为本次提交的读数列表
+_ingest_listeners: List[Callable[[List[Reading]], None]] = []
+# 同上，参数为列式的读数（见 add_column_listener）
+_column_listeners: List[ColumnListener] = []
+
+
+def add_ingest_listener(callback: Callable[[List[Reading]], None]):
+    """注册写入监听器（在写入线程中、事务提交后调用）"""
+    if callback not in _ingest_listeners:
+        _ingest_listeners.append(callback)
+
+
+def remove_ingest_listener(callback: Callable[[List[Reading]], None]):
+    if callback in _ingest_listeners:
+        _ingest_listeners.remove(callback)
+
+
+def add_column_listener(callback: ColumnListener):
+    """
+    注册列式的写入监听器，参数为 (sensor_ids, 毫秒时间戳数组, 数值数组)
+
+    与 add_ingest_listener 收到同样的读数，但不需要逐条构造 datetime，
+    适合按数组计算的监听器；大批量列式写入时只有列式监听器不做逐条转换。
+    """
+    if callback not in _column_listeners:
+        _column_listeners.append(callback)
+
+
+def remove_column_listener(callback: ColumnListener):
+    if callback in _column_listeners:
+        _column_listeners.remove(callback)
+
+
+def _call_listeners(listeners: list, *args):
+    """依次调用监听器，单个监听器出错不影响写入"""
+    for callback in list(listeners):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"写入监听器出错: {e}")
+
+
+def notify_ingest(readings: List[Reading]):
+    """通知所有监听器（列式监听器收到转换后的数组）"""
+    _call_listeners(_ingest_listeners, readings)
+    if _column_listeners and readings:
+        sensor_ids = [sensor_id for sensor_id, _, _ in readings]
+        ts = np.fromiter((to_epoch_ms(t) for _, _, t in readings),
+                         dtype=np.int64, count=len(readings))
+        values = np.fromiter((v for _, v, _ in readings), dtype=float, count=len(readings))
+        _call_listeners(_column_listeners, sensor_ids, ts, values)
+
+
+def notify_ingest_columns(sensor_ids: Sequence[str], ts: np.ndarray, values: np.ndarray):
+    """通知所有监听器（逐条的监听器收到转换后的读数列表）"""
+    _call_listeners(_column_listeners, sensor_ids, ts, values)
+    if _ingest_listeners and len(ts):
+        readings = list(zip(sensor_ids, values.tolist(), map(from_epoch_ms, ts.tolist())))
+        _call_listeners(_ingest_listeners, readings)
+
+
+def as_datetime(timestamp) -> datetime:
+    """将时间戳统一为本地时间的 naive datetime（None 表示当前时间）"""
+    if timestamp is None:
+        return datetime.now()
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+def as_epoch_ms(timestamps, size: int) -> np.ndarray:
+    """
+    把一列时间戳统一为毫秒时间戳数组（与 as_datetime 的约定相同：本地时间）
+
+    Args:
+        timestamps: None（全部为当前时间）、整数毫秒数组、datetime64 数组，
+            或 datetime / 文本组成的序列（逐条转换）
+        size: 读数条数
+
+    Raises:
+        ValueError: 长度与 size 不一致
+    """
+    if timestamps is None:
+        return np.full(size, to_epoch_ms(datetime.now()), dtype=np.int64)
+    column = np.asarray(timestamps)
+    if column.dtype.kind == 'M':
+        # naive datetime64 即本地时间的墙上时钟，与 to_epoch_ms 一致
+        column = column.astype('datetime64[ms]').astype(np.int64)
+    elif column.dtype.kind in 'iu':
+        column = column.astype(np.int64, copy=False)
+    else:
+        column = np.fromiter((to_epoch_ms(as_datetime(t)) for t in column),
+                             dtype=np.int64, count=len(column))
+    if len(column) != size:
+        raise ValueError(f'时间戳有 {len(column)} 条，读数有 {size} 条')
+    return column
+
+
+def upsert_latest(cursor: sqlite3.Cursor, readings: List[Reading]) -> Dict[str, Reading]:
+    """
+    维护 sensor_latest 表：每个传感器只保留时间戳最大的一条读数
+
+    Args:
+        cursor: 数据库游标
+        readings: [(sensor_id, value, timestamp), ...]
+
+    Returns:
+        本批次中每个传感器的最新读数 {sensor_id: reading}
+    """
+    latest = {}
+    for reading in readings:
+        sensor_id, _, timestamp = reading
+        if sensor_id not in latest or timestamp >= latest[sensor_id][2]:
+            latest[sensor_id] = reading
+
+    cursor.executemany('''
+    INSERT INTO sensor_latest (sensor_id, value, timestamp)
+    VALUES (?, ?, ?)
+    ON CONFLICT(sensor_id) DO UPDATE SET
+        value = excluded.value,
+        timestamp = excluded.timestamp
+    WHERE excluded.timestamp >= sensor_latest.timestamp
+    ''', list(latest.values()))
+    return latest
+
+
+def update_derived_tables(cursor: sqlite3.Cursor,
+                          readings: List[Reading]) -> Dict[str, Reading]:
+    """
+    维护由读数派生的表（最新值、时间桶汇总），与读数写入在同一事务中
+
+    Returns:
+        本批次中每个传感器的最新读数 {sensor_id: reading}
+    """
+    latest = upsert_latest(cursor, readings)
+    update_rollups(cursor, readings)
+    return latest
+
+
+def store_readings(cursor: sqlite3.Cursor, readings: List[Reading],
+                   schema: int = SCHEMA_V1) -> List[Reading]:
+    """
+    在当前事务中写入一批读数（由调用方提交）
+
+    Args:
+        cursor: 数据库游标
+        readings: [(sensor_id, value, timestamp), ...]
+        schema: 存储结构版本
+
+    Returns:
+        实际写入的读数（重复的读数不写入，也不合并到派生表）
+    """
+    readings = insert_readings(cursor, readings, schema)
+    if not readings:
+        return readings
+
+    # 每个传感器只更新一次，取本批次中最大的时间戳
+    latest = update_derived_tables(cursor, readings)
+
+    cursor.executemany('''
+    UPDATE sensors
+    SET last_updated = ?
+    WHERE sensor_id = ?
+    ''', [(timestamp, sensor_id) for sensor_id, _, timestamp in latest.values()])
+    return readings
+
+
+def store_columns(cursor: sqlite3.Cursor, sensor_ids: np.ndarray, ts: np.ndarray,
+                  values: np.ndarray,
+                  schema: int = SCHEMA_V1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    在当前事务中写入一批列式读数（由调用方提交），结果与 store_readings 相同
+
+    读数按数组分组计算：每个传感器的最新值和各时间桶的汇总在 numpy 中算出，
+    每张派生表一次 executemany；读数逐列转换后直接 zip 给 executemany，
+    不构造中间的元组列表（sqlite3 不能绑定 numpy 标量，因此先 tolist）。
+
+    Args:
+        cursor: 数据库游标
+        sensor_ids: 传感器ID数组（object）
+        ts: 毫秒时间戳数组（int64）
+        values: 数值数组（float64）
+        schema: 存储结构版本
+
+    Returns:
+        实际写入的 (sensor_ids, ts, values)（重复的读数不写入，也不合并到派生表）
+    """
+    ids, inverse = np.unique(sensor_ids, return_inverse=True)
+    ids = ids.tolist()
+
+    if schema == SCHEMA_V2:
+        keys = resolve_sensor_keys(cursor, ids)
+        key_list = np.array([keys[sensor_id] for sensor_id in ids],
+                            dtype=np.int64)[inverse].tolist()
+        ts_list = ts.tolist()
+        cursor.executemany(INSERT_V2_SQL, zip(key_list, ts_list, values.tolist()))
+        inserted = inserted_v2_rows(cursor, key_list, ts_list, cursor.rowcount)
+        if not inserted.all():
+            sensor_ids, ts, values = sensor_ids[inserted], ts[inserted], values[inserted]
+            inverse = inverse[inserted]
+            if not len(ts):
+                return sensor_ids, ts, values
+    else:
+        insert_readings(cursor, list(zip(sensor_ids.tolist(), values.tolist(),
+                                         format_epoch_ms(ts).tolist())), schema)
+    written = sensor_ids, ts, values
+
+    # 按 (传感器, 时间) 排序后，每个传感器的最后一条即为最新读数；
+    # 排序是稳定的，同一时间戳以后写入的为准
+    order = np.lexsort((ts, inverse))
+    inverse, ts, values = inverse[order], ts[order], values[order]
+    ends = np.flatnonzero(np.append(inverse[1:] != inverse[:-1], True))
+    upsert_latest(cursor, [(ids[i], v, from_epoch_ms(t)) for i, v, t in zip(
+        inverse[ends].tolist(), values[ends].tolist(), ts[ends].tolist())])
+    update_rollups_columns(cursor, ids, inverse, ts, values)
+
+    # 最后更新时间取 sensor_latest 中的时间戳，即每个传感器真实的最大时间戳
+    cursor.execute('''
+    UPDATE sensors
+    SET last_updated = sensor_latest.timestamp
+    FROM sensor_latest
+    WHERE sensor_latest.sensor_id = sensors.sensor_id
+      AND sensor_latest.sensor_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(ids),))
+    return written
+
+
+class IngestQueue:
+    """
+    组提交写入队列
+
+    读数先进入内存队列，由后台线程在达到 max_rows 条或等待 max_delay 秒后
+    作为一个事务批量提交。队列超过 max_queue 条时写入方阻塞（背压）。
+    """
+
+    def __init__(self, db_path: str = 'db/sensor_data.db', max_rows: int = 5000,
+                 max_delay: float = 0.2, max_queue: int = 100000,
+                 managed: bool = True):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.managed = managed
+        self.schema = None  # 由后台线程连接数据库后确定
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._flush_requested = False
+        self._closed = False
+        self._stopped = False  # 写入线程已退出（正常关闭或出错）
+
+        # 计数器（在 _lock 内修改）
+        self._enqueued = 0
+        self._processed = 0
+        self._stats = {
+            'rejected': 0,
+            'failed': 0,
+            'flushes': 0,
+            'backpressure_waits': 0,
+            'last_flush_rows': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='sensor-ingest',
+                                        daemon=True)
+        self._thread.start()
+
+    def put(self, sensor_id: str, value: float, timestamp=None,
+            block: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        加入一条读数
+
+        Args:
+            block: 队列已满时是否等待
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            是否成功入队
+        """
+        return self.put_many([(sensor_id, value, timestamp)],
+                             block=block, timeout=timeout) == 1
+
+    def put_many(self, readings: Iterable, block: bool = True,
+                 timeout: Optional[float] = None) -> int:
+        """
+        加入多条读数 [(sensor_id, value, timestamp), ...]
+
+        Returns:
+            成功入队的条数
+        """
+        items = [(sensor_id, float(value), as_datetime(timestamp))
+                 for sensor_id, value, timestamp in readings]
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        accepted = 0
+        with self._lock:
+            while accepted < len(items):
+                if self._closed:
+                    raise RuntimeError('写入队列已关闭')
+                if self._stopped:
+                    # 没有线程消费，等待队列腾出空间会一直阻塞
+                    raise RuntimeError('写入线程已停止')
+
+                room = self.max_queue - len(self._queue)
+                if room <= 0:
+                    if not block:
+                        break
+                    self._stats['backpressure_waits'] += 1
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._not_full.wait(remaining)
+                    continue
+
+                chunk = items[accepted:accepted + room]
+                self._queue.extend(chunk)
+                accepted += len(chunk)
+                self._enqueued += len(chunk)
+                self._not_empty.notify()
+
+            rejected = len(items) - accepted
+            if rejected:
+                self._stats['rejected'] += rejected
+        if rejected:
+            logger.warning(f"写入队列已满，丢弃 {rejected} 条数据")
+        return accepted
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        立即提交队列中已有的数据并等待完成
+
+        Returns:
+            超时前是否全部提交
+        """
+        with self._lock:
+            target = self._enqueued
+            self._flush_requested = True
+            self._not_empty.notify()
+            self._flushed.wait_for(
+                lambda: self._processed >= target or self._stopped, timeout)
+            return self._processed >= target
+
+    def _take_batch(self) -> List[Reading]:
+        """等待并取出一批数据（达到数量阈值或时间阈值）"""
+        with self._lock:
+            while not self._queue and not self._closed and not self._flush_requested:
+                self._not_empty.wait()
+
+            deadline = time.monotonic() + self.max_delay
+            while (len(self._queue) < self.max_rows
+                   and not self._closed and not self._flush_requested):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._not_empty.wait(remaining)
+
+            n = min(len(self._queue), self.max_rows)
+            batch = [self._queue.popleft() for _ in range(n)]
+            if not self._queue:
+                self._flush_requested = False
+            self._not_full.notify_all()
+            return batch
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Reading]):
+        start = time.perf_counter()
+        try:
+            with conn:
+                written = store_readings(conn.cursor(), batch, self.schema)
+        except Exception as e:
+            # 任何错误都只丢弃这一批，写入线程继续运行
+            logger.error(f"批量提交失败，丢弃 {len(batch)} 条数据: {e!r}")
+            with self._lock:
+                self._stats['failed'] += len(batch)
+        else:
+            if written:
+                notify_ingest(written)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self._processed += len(batch)
+            stats = self._stats
+            stats['flushes'] += 1
+            stats['last_flush_rows'] = len(batch)
+            stats['last_flush_ms'] = elapsed_ms
+            stats['max_flush_ms'] = max(stats['max_flush_ms'], elapsed_ms)
+            stats['total_flush_ms'] += elapsed_ms
+            self._flushed.notify_all()
+
+    def _run(self):
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path)
+            if self.managed:
+                configure_connection(conn)
+            self.schema = schema_version(conn)
+            while True:
+                batch = self._take_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+                else:
+                    with self._lock:
+                        self._flushed.notify_all()
+                with self._lock:
+                    if self._closed and not self._queue:
+                        break
+        except Exception as e:
+            logger.error(f"写入线程异常退出，队列中 {len(self._queue)} 条数据未写入: {e!r}")
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self._stopped = True
+                # 唤醒等待中的写入方和 flush，它们会发现线程已停止
+                self._not_full.notify_all()
+                self._flushed.notify_all()
+
+    def stats(self) -> Dict:
+        """
+        队列统计信息
+
+        Returns:
+            {'queue_depth': 当前队列长度, 'enqueued': 入队总数,
+             'committed': 已提交总数, 'last_flush_ms': 最近一次提交耗时, ...}
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._queue)
+            stats['enqueued'] = self._enqueued
+            stats['committed'] = self._processed - stats['failed']
+        flushes = stats['flushes']
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / flushes if flushes else 0.0
+        return stats
+
+    def close(self, timeout: Optional[float] = None):
+        """提交剩余数据并停止后台线程"""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        self._thread.join(timeout)
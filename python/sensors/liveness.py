@@ -0,0 +1,180 @@
+# liveness.py
+import heapq
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .log import logger
+
+ONLINE = '在线'
+DELAYED = '延迟'
+OFFLINE = '离线'
+STATES = (ONLINE, DELAYED, OFFLINE)
+
+# 状态对应的显示颜色（Quasar 颜色名）
+STATUS_COLORS = {ONLINE: 'green', DELAYED: 'orange', OFFLINE: 'red'}
+
+# (sensor_id, 原状态, 新状态, 发生时间（毫秒）)
+Transition = Tuple[str, str, str, int]
+
+
+class LivenessTracker:
+    """
+    传感器在线状态跟踪
+
+    记录每个传感器最后一次读数的时间，并把下一次状态变化（在线 -> 延迟、
+    延迟 -> 离线）的时刻放进最小堆。每个传感器在堆中最多有一个有效条目，
+    advance 只弹出已到期的条目，收到新读数时只处理该传感器，
+    因此每次刷新的开销与状态变化数成正比，与传感器总数无关。
+
+    时间都是毫秒时间戳（见 sensors.schema.to_epoch_ms）。
+
+    Args:
+        delayed_after: 超过该秒数没有新读数视为延迟
+        offline_after: 超过该秒数没有新读数视为离线
+    """
+
+    def __init__(self, delayed_after: float = 60, offline_after: float = 300):
+        self.delayed_ms = int(delayed_after * 1000)
+        self.offline_ms = int(offline_after * 1000)
+        self._last_seen: Dict[str, Optional[int]] = {}
+        self._state: Dict[str, str] = {}
+        self._members: Dict[str, Set[str]] = {state: set() for state in STATES}
+        # (到期时间, sensor_id)，与 _deadline 不一致的条目已失效
+        self._heap: List[Tuple[int, str]] = []
+        self._deadline: Dict[str, int] = {}
+        self._listeners: List[Callable[[List[Transition]], None]] = []
+
+    def add_listener(self, callback: Callable[[List[Transition]], None]):
+        """注册状态变化回调，参数为本次发生的状态变化列表"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[List[Transition]], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def classify(self, last_seen: Optional[int], now_ms: int) -> str:
+        """根据最后读数时间判断状态（从未有读数视为离线）"""
+        if last_seen is None:
+            return OFFLINE
+        age = now_ms - last_seen
+        if age > self.offline_ms:
+            return OFFLINE
+        if age > self.delayed_ms:
+            return DELAYED
+        return ONLINE
+
+    def state(self, sensor_id: str) -> str:
+        """传感器当前状态（未知传感器视为离线）"""
+        return self._state.get(sensor_id, OFFLINE)
+
+    def last_seen(self, sensor_id: str) -> Optional[int]:
+        return self._last_seen.get(sensor_id)
+
+    def sensors_in(self, state: str) -> Set[str]:
+        """处于某个状态的所有传感器，例如 sensors_in(OFFLINE)"""
+        return set(self._members[state])
+
+    def counts(self) -> Dict[str, int]:
+        return {state: len(members) for state, members in self._members.items()}
+
+    def sync_sensors(self, sensor_ids: Iterable[str]):
+        """同步传感器集合：新增的传感器记为离线，已删除的不再跟踪"""
+        sensor_ids = set(sensor_ids)
+        for sensor_id in list(self._state):
+            if sensor_id not in sensor_ids:
+                self._members[self._state.pop(sensor_id)].discard(sensor_id)
+                self._last_seen.pop(sensor_id, None)
+                self._deadline.pop(sensor_id, None)
+        for sensor_id in sensor_ids:
+            if sensor_id not in self._state:
+                self._state[sensor_id] = OFFLINE
+                self._members[OFFLINE].add(sensor_id)
+                self._last_seen[sensor_id] = None
+
+    def observe(self, sensor_id: str, ts_ms: int, now_ms: int) -> Optional[Transition]:
+        """
+        记录一条读数的时间（不比已记录的时间新时忽略）
+
+        Returns:
+            状态发生变化时返回该变化，否则 None（不通知监听器，见 observe_many）
+        """
+        last = self._last_seen.get(sensor_id)
+        if last is not None and ts_ms <= last:
+            return None
+        self._last_seen[sensor_id] = ts_ms
+        transition = self._set_state(sensor_id, self.classify(ts_ms, now_ms), now_ms)
+        self._schedule(sensor_id)
+        return transition
+
+    def observe_many(self, readings: Iterable[Tuple[str, int]], now_ms: int) -> List[Transition]:
+        """记录一批 (sensor_id, 毫秒时间戳)，并通知监听器"""
+        transitions = []
+        for sensor_id, ts_ms in readings:
+            transition = self.observe(sensor_id, ts_ms, now_ms)
+            if transition:
+                transitions.append(transition)
+        self._emit(transitions)
+        return transitions
+
+    def advance(self, now_ms: int) -> List[Transition]:
+        """处理 now_ms 之前到期的状态变化，并通知监听器"""
+        transitions = []
+        while self._heap and self._heap[0][0] <= now_ms:
+            deadline, sensor_id = heapq.heappop(self._heap)
+            if self._deadline.get(sensor_id) != deadline:
+                continue
+            del self._deadline[sensor_id]
+            transition = self._set_state(
+                sensor_id, self.classify(self._last_seen.get(sensor_id), now_ms), now_ms)
+            if transition:
+                transitions.append(transition)
+            self._schedule(sensor_id)
+        self._emit(transitions)
+        return transitions
+
+    def stats(self) -> Dict:
+        return {**self.counts(), 'pending': len(self._deadline), 'heap': len(self._heap)}
+
+    def _next_deadline(self, sensor_id: str) -> Optional[int]:
+        last = self._last_seen.get(sensor_id)
+        state = self._state.get(sensor_id)
+        if last is None or state == OFFLINE:
+            return None
+        if state == ONLINE:
+            return last + self.delayed_ms + 1
+        return last + self.offline_ms + 1
+
+    def _schedule(self, sensor_id: str):
+        deadline = self._next_deadline(sensor_id)
+        if deadline is None:
+            self._deadline.pop(sensor_id, None)
+            return
+        if self._deadline.get(sensor_id) != deadline:
+            self._deadline[sensor_id] = deadline
+            heapq.heappush(self._heap, (deadline, sensor_id))
+            # 失效条目过多时重建堆
+            if len(self._heap) > 2 * len(self._deadline) + 1024:
+                self._heap = [(d, s) for s, d in self._deadline.items()]
+                heapq.heapify(self._heap)
+
+    def _set_state(self, sensor_id: str, state: str, now_ms: int) -> Optional[Transition]:
+        old = self._state.get(sensor_id)
+        if old == state:
+            return None
+        if old is not None:
+            self._members[old].discard(sensor_id)
+        self._members[state].add(sensor_id)
+        self._state[sensor_id] = state
+        if old is None and state == OFFLINE:
+            # 新传感器默认即为离线，不算状态变化
+            return None
+        return (sensor_id, old or OFFLINE, state, now_ms)
+
+    def _emit(self, transitions: List[Transition]):
+        if not transitions:
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(transitions)
+            except Exception as e:
+                logger.error(f"传感器状态监听器出错: {e}")
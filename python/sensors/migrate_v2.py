@@ -0,0 +1,87 @@
+# migrate_v2.py
+import sqlite3
+import time
+
+from .log import logger
+from .storage import configure_connection
+from .schema import (SCHEMA_V1, SCHEMA_V2, create_compat_view, create_v2_tables,
+                     schema_version, set_schema_version)
+
+
+def migrate_to_v2(db_path: str = 'db/sensor_data.db', chunk_size: int = 50000,
+                  managed: bool = True, vacuum: bool = True) -> int:
+    """
+    把 v1 存储结构迁移为 v2
+
+    按 id 分块把 sensor_readings 复制到 readings_v2，完成后删除旧表及其索引，
+    并创建同名兼容视图。迁移期间应停止写入进程，迁移后需重启读写进程。
+
+    Args:
+        db_path: 数据库文件路径
+        chunk_size: 每个事务复制的行数
+        managed: 是否使用托管存储模式（WAL）
+        vacuum: 迁移后是否执行 VACUUM 回收空间
+
+    Returns:
+        迁移的读数条数
+    """
+    conn = sqlite3.connect(db_path)
+    if managed:
+        configure_connection(conn)
+
+    try:
+        version = schema_version(conn)
+        if version == SCHEMA_V2:
+            logger.info("数据库已是 v2 结构，无需迁移")
+            return 0
+        if version != SCHEMA_V1:
+            raise ValueError(f'未知的存储结构版本: v{version}')
+
+        start = time.perf_counter()
+        with conn:
+            create_v2_tables(conn.cursor())
+            # 为所有已注册和出现过读数的传感器分配整数键
+            conn.execute('''
+            INSERT OR IGNORE INTO sensor_keys (sensor_id)
+            SELECT sensor_id FROM sensors
+            UNION
+            SELECT DISTINCT sensor_id FROM sensor_readings
+            ''')
+
+        max_id = conn.execute(
+            'SELECT COALESCE(MAX(id), 0) FROM sensor_readings').fetchone()[0]
+
+        copied = 0
+        for low in range(0, max_id, chunk_size):
+            with conn:
+                # julianday 换算为毫秒；同一传感器同一毫秒的重复读数保留 id 较大者
+                cursor = conn.execute('''
+                INSERT OR REPLACE INTO readings_v2 (sensor_key, ts, value)
+                SELECT k.sensor_key,
+                       CAST(ROUND((julianday(sr.timestamp) - 2440587.5) * 86400000) AS INTEGER),
+                       sr.value
+                FROM sensor_readings sr
+                JOIN sensor_keys k ON sr.sensor_id = k.sensor_id
+                WHERE sr.id > ? AND sr.id <= ?
+                ORDER BY sr.id
+                ''', (low, low + chunk_size))
+            copied += cursor.rowcount
+            logger.debug(f"迁移进度: id <= {min(low + chunk_size, max_id)} / {max_id}")
+
+        with conn:
+            conn.execute('DROP TABLE sensor_readings')
+            create_compat_view(conn.cursor())
+            set_schema_version(conn, SCHEMA_V2)
+
+        if vacuum:
+            conn.execute('VACUUM')
+
+        logger.info(f"迁移到 v2 完成: {copied} 条读数，"
+                    f"耗时 {time.perf_counter() - start:.1f}s")
+        return copied
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    migrate_to_v2()
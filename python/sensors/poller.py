@@ -0,0 +1,574 @@
+# poller.py
+import asyncio
+import gzip
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .log import logger
+from .change_log import SensorChangeLog
+from .cluster import SensorClusterIndex
+from .ingest import as_datetime
+from .liveness import LivenessTracker
+from .prefix_index import SensorPrefixIndex
+from .schema import format_epoch_ms, to_epoch_ms
+from .spatial import BBox, GridIndex, in_bbox
+
+
+# 进程启动标识，ETag 和增量同步游标中带上它，重启后旧的值不会误中
+_BOOT_ID = format(time.time_ns() // 1000000, 'x')
+
+
+class SensorSnapshot:
+    """某一时刻所有传感器的信息和最新读数"""
+
+    def __init__(self, version: int, taken_at: datetime,
+                 sensors: List[Dict], latest: Dict[str, Dict],
+                 index: Optional[SensorPrefixIndex] = None,
+                 data_version: Optional[int] = None,
+                 by_id: Optional[Dict[str, Dict]] = None,
+                 positions: Optional[Dict[str, int]] = None):
+        self.version = version
+        # 内容版本：只有传感器或最新读数变化时才增加
+        self.data_version = version if data_version is None else data_version
+        self.taken_at = taken_at
+        self.sensors = sensors  # get_sensor_info 的结果
+        self.latest = latest    # sensor_id -> 最新读数
+        self.by_id = by_id if by_id is not None else {
+            sensor['sensor_id']: sensor for sensor in sensors}
+        # sensor_id -> 在 sensors 中的位置，首次需要时生成，传感器集合不变时共用
+        self._positions = positions
+        # 传感器ID的前缀索引（传感器集合不变时沿用上一个快照的索引）
+        self.index = index or SensorPrefixIndex(self.by_id)
+        # rows() 的 JSON 编码，首次请求时生成，内容不变的快照之间共用
+        self._encoded: Dict = {}
+
+    @property
+    def cursor(self) -> str:
+        """增量同步的游标（见 SensorSnapshotPoller.changes_since）"""
+        return f'{_BOOT_ID}-{self.data_version}'
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.cursor}"'
+
+    def encoded(self, compress: bool = False) -> bytes:
+        """
+        rows() 的 JSON（compress 时为 gzip 压缩后的 JSON）
+
+        每个内容版本只序列化、压缩一次，之后的请求直接返回缓存的字节。
+        """
+        if 'json' not in self._encoded:
+            self._encoded['json'] = json.dumps(
+                self.rows(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if not compress:
+            return self._encoded['json']
+        if 'gzip' not in self._encoded:
+            self._encoded['gzip'] = gzip.compress(self._encoded['json'], compresslevel=6)
+        return self._encoded['gzip']
+
+    def with_latest(self, version: int, taken_at: datetime,
+                    latest: Dict[str, Dict]) -> 'SensorSnapshot':
+        """
+        只替换部分传感器最新读数的新快照，不重新查询数据库
+
+        传感器集合不变，前缀索引和其余传感器的行与本快照共用；
+        被替换的传感器的 last_updated 同时更新，与写入时维护的 sensors 表一致。
+
+        Args:
+            version: 新快照的版本（同时作为内容版本）
+            taken_at: 新快照的时间
+            latest: sensor_id -> 新的最新读数（格式同 latest），sensor_id 必须在快照中
+        """
+        if self._positions is None:
+            self._positions = {sensor['sensor_id']: i for i, sensor in enumerate(self.sensors)}
+        sensors, by_id = list(self.sensors), dict(self.by_id)
+        for sensor_id, row in latest.items():
+            sensor = dict(by_id[sensor_id])
+            if 'last_updated' in sensor:
+                sensor['last_updated'] = row['timestamp']
+            by_id[sensor_id] = sensors[self._positions[sensor_id]] = sensor
+        return SensorSnapshot(version, taken_at, sensors, {**self.latest, **latest},
+                              index=self.index, by_id=by_id, positions=self._positions)
+
+    def row(self, sensor_id: str) -> Dict:
+        """一个传感器的信息加上最新的 value, timestamp"""
+        row = dict(self.by_id[sensor_id])
+        latest = self.latest.get(sensor_id)
+        if latest:
+            row['value'] = latest['value']
+            row['timestamp'] = latest['timestamp']
+        return row
+
+    def rows(self) -> List[Dict]:
+        """每个传感器一行：传感器信息加上最新的 value, timestamp"""
+        return [self.row(sensor['sensor_id']) for sensor in self.sensors]
+
+
+def _position(sensor: Optional[Dict]) -> Optional[Tuple[float, float]]:
+    return None if sensor is None else (sensor['x_position'], sensor['y_position'])
+
+
+def _same_ms(old, new) -> bool:
+    """两个时间戳在毫秒精度下是否相同"""
+    if old == new:
+        return True
+    if old is None or new is None:
+        return False
+    return to_epoch_ms(as_datetime(old)) == to_epoch_ms(as_datetime(new))
+
+
+def same_row(old: Optional[Dict], new: Optional[Dict], key: str) -> bool:
+    """
+    两行（传感器信息或最新读数）是否相同，key 列的时间戳只比较到毫秒
+
+    增量合并的读数来自毫秒时间戳（见 SensorSnapshotPoller.feed_rows），
+    数据库中的文本可能带微秒；只差亚毫秒部分的行不算变化。
+    """
+    if old == new:
+        return True
+    if old is None or new is None or old.keys() != new.keys():
+        return False
+    return (all(old[name] == new[name] for name in old if name != key)
+            and _same_ms(old.get(key), new.get(key)))
+
+
+def diff_snapshots(previous: SensorSnapshot,
+                   snapshot: SensorSnapshot) -> Tuple[List[str], List[str], List[str]]:
+    """
+    两个快照之间信息或最新读数变化的传感器、被删除的传感器，以及新增或位置变化的传感器
+
+    时间戳只差亚毫秒部分的传感器不算变化（见 same_row）。
+
+    Returns:
+        (变化的 sensor_id 列表, 删除的 sensor_id 列表, 位置变化的 sensor_id 列表)
+    """
+    changed, moved = [], []
+    for sensor_id, sensor in snapshot.by_id.items():
+        old = previous.by_id.get(sensor_id)
+        if (not same_row(old, sensor, 'last_updated')
+                or not same_row(previous.latest.get(sensor_id),
+                                snapshot.latest.get(sensor_id), 'timestamp')):
+            changed.append(sensor_id)
+            if _position(old) != _position(sensor):
+                moved.append(sensor_id)
+    deleted = [sensor_id for sensor_id in previous.by_id if sensor_id not in snapshot.by_id]
+    return changed, deleted, moved
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[int]:
+    """游标中的内容版本；游标无效或来自之前的进程时返回 None"""
+    if not cursor:
+        return None
+    boot_id, _, version = cursor.partition('-')
+    if boot_id != _BOOT_ID or not version.isdigit():
+        return None
+    return int(version)
+
+
+def split_overview(rows: List[Dict]) -> Tuple[List[Dict], Dict[str, Dict]]:
+    """
+    把 get_sensor_overview 的结果拆成传感器信息和最新读数
+
+    Returns:
+        (get_sensor_info 格式的列表, sensor_id -> get_latest_data 格式的行)
+    """
+    sensors, latest = [], {}
+    for row in rows:
+        value = row.pop('value')
+        timestamp = row.pop('timestamp')
+        sensors.append(row)
+        if timestamp is not None:
+            latest[row['sensor_id']] = {
+                'sensor_id': row['sensor_id'], 'value': value, 'timestamp': timestamp,
+                'x_position': row['x_position'], 'y_position': row['y_position']}
+    return sensors, latest
+
+
+class SensorSnapshotPoller:
+    """
+    进程内共享的传感器快照轮询器
+
+    每个周期只查询一次数据库，把快照推送给所有订阅者（页面、接口），
+    数据库负载与打开的页面数无关。有新数据写入时可以调用 request_refresh
+    提前刷新，min_interval 内的多次请求合并为一次。
+
+    已经拿到新读数的调用方（数据库轮询、写入监听器）改用 feed_rows / feed_columns：
+    min_interval 后只把这些传感器的最新读数合并进快照并推送，不查询数据库、
+    不比较全部传感器；完整刷新仍按 interval 进行，负责传感器的增删和移动。
+
+    Args:
+        reader: SensorDataReader 的异步门面（见 util.async_db.async_reader）
+        interval: 轮询间隔（秒）
+        liveness: 在线状态跟踪器，每个快照只把最新读数有变化的传感器交给它
+        min_interval: 提前刷新时两次刷新的最小间隔（秒）
+    """
+
+    def __init__(self, reader, interval: float = 5.0,
+                 liveness: Optional[LivenessTracker] = None,
+                 min_interval: float = 0.25):
+        self.reader = reader
+        self.interval = interval
+        self.min_interval = min_interval
+        self.liveness = liveness or LivenessTracker()
+        # 最近各内容版本的变化，用于增量同步
+        self.changes = SensorChangeLog()
+        # 传感器位置的网格索引，随快照的变化增量更新
+        self.spatial = GridIndex()
+        # 按缩放级别的聚类，同样随快照的变化增量更新
+        self.clusters = SensorClusterIndex()
+        self.snapshot: Optional[SensorSnapshot] = None
+        self._subscribers: List[Callable] = []
+        self._delete_listeners: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        # feed_rows 收到、尚未合并进快照的读数：sensor_id -> (毫秒时间戳, value)
+        self._pending: Dict[str, Tuple[int, float]] = {}
+        self._pending_lock = threading.Lock()
+        self._stats = {'ticks': 0, 'deltas': 0, 'failed': 0, 'last_ms': 0.0}
+
+    def subscribe(self, callback: Callable[[SensorSnapshot], None]) -> Callable[[], None]:
+        """
+        订阅快照（同步函数或协程函数均可），已有快照时不会立即推送
+
+        Returns:
+            取消订阅的函数
+        """
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+        return unsubscribe
+
+    def add_delete_listener(self, callback: Callable[[str], None]):
+        """注册传感器删除的回调（参数为 sensor_id），在发现删除的那次刷新中调用"""
+        if callback not in self._delete_listeners:
+            self._delete_listeners.append(callback)
+
+    def start(self):
+        """在当前事件循环中启动轮询（重复调用无效）"""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+            logger.info(f"传感器快照轮询已启动，间隔 {self.interval}s")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def request_refresh(self, *args):
+        """
+        请求尽快刷新（线程安全，可直接注册为写入监听器）
+
+        轮询尚未启动时忽略。
+        """
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def feed_rows(self, rows: Iterable[Tuple[str, int, float]]):
+        """
+        新读数 [(sensor_id, 毫秒时间戳, value), ...]（线程安全，例如 DatabaseTailer 读到的一批）
+
+        每个传感器只记下最新的一条，并唤醒轮询器合并进快照。
+        """
+        with self._pending_lock:
+            for sensor_id, ts, value in rows:
+                old = self._pending.get(sensor_id)
+                if old is None or ts >= old[0]:
+                    self._pending[sensor_id] = (ts, value)
+        self.request_refresh()
+
+    def feed_columns(self, sensor_ids: Sequence[str], ts: np.ndarray, values: np.ndarray):
+        """列式的新读数（可直接注册为列式写入监听器），同 feed_rows"""
+        if not len(ts):
+            return
+        ids, inverse = np.unique(np.asarray(sensor_ids, dtype=object), return_inverse=True)
+        # 按 (传感器, 时间) 排序后，每个传感器的最后一条即为最新读数
+        order = np.lexsort((ts, inverse))
+        inverse, ts, values = inverse[order], ts[order], values[order]
+        ends = np.flatnonzero(np.append(inverse[1:] != inverse[:-1], True))
+        self.feed_rows(zip(ids[inverse[ends]].tolist(), ts[ends].tolist(),
+                           values[ends].tolist()))
+
+    async def apply_pending(self) -> Optional[SensorSnapshot]:
+        """
+        把 feed_rows 收到的读数合并进快照并推送（不查询数据库）
+
+        只处理这些传感器：不比快照中的读数新的读数被忽略，快照中没有的传感器
+        留给下一次完整刷新。没有可合并的读数时不生成新快照。
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.snapshot is None:
+            return self.snapshot
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            start = time.perf_counter()
+            previous = self.snapshot
+            updates = {}
+            for sensor_id, (ts, value) in pending.items():
+                if sensor_id not in previous.by_id:
+                    continue
+                old = previous.latest.get(sensor_id)
+                if old is not None and to_epoch_ms(as_datetime(old['timestamp'])) >= ts:
+                    continue
+                updates[sensor_id] = (ts, value)
+            if not updates:
+                return previous
+
+            timestamps = format_epoch_ms(np.array([ts for ts, _ in updates.values()],
+                                                  dtype=np.int64)).tolist()
+            latest = {}
+            for (sensor_id, (_, value)), timestamp in zip(updates.items(), timestamps):
+                sensor = previous.by_id[sensor_id]
+                latest[sensor_id] = {
+                    'sensor_id': sensor_id, 'value': value, 'timestamp': timestamp,
+                    'x_position': sensor['x_position'], 'y_position': sensor['y_position']}
+            self.snapshot = previous.with_latest(previous.version + 1, datetime.now(), latest)
+            self.changes.record(self.snapshot.data_version, latest, ())
+            for sensor_id, row in latest.items():
+                self.clusters.set_value(sensor_id, row['value'])
+            self._update_liveness(previous, self.snapshot, latest)
+            self._stats['deltas'] += 1
+            self._stats['last_ms'] = (time.perf_counter() - start) * 1000
+        await self._publish(self.snapshot)
+        return self.snapshot
+
+    async def refresh(self) -> SensorSnapshot:
+        """立即查询一次并推送（例如添加或删除传感器之后）"""
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            start = time.perf_counter()
+            sensors, latest = split_overview(await self.reader.get_sensor_overview())
+            previous = self.snapshot
+            version = previous.version + 1 if previous else 1
+            index = None
+            if previous and previous.by_id.keys() == {s['sensor_id'] for s in sensors}:
+                index = previous.index
+            exact = (previous is not None and previous.sensors == sensors
+                     and previous.latest == latest)
+            self.snapshot = SensorSnapshot(
+                version=version,
+                taken_at=datetime.now(),
+                sensors=sensors,
+                latest=latest,
+                index=index)
+            changed, deleted, moved = [], [], []
+            if previous is not None and not exact:
+                changed, deleted, moved = diff_snapshots(previous, self.snapshot)
+            if previous is not None and not changed and not deleted:
+                # 内容未变，或只有增量合并时截断的亚毫秒时间戳换成了数据库中的文本：
+                # 沿用内容版本，不重复推送
+                self.snapshot.data_version = previous.data_version
+                if exact:
+                    self.snapshot._encoded = previous._encoded
+            elif previous is None:
+                self.changes.reset(self.snapshot.data_version)
+                self.spatial.rebuild((s['sensor_id'], s['x_position'], s['y_position'])
+                                     for s in sensors)
+                self.clusters.rebuild(
+                    (s['sensor_id'], s['x_position'], s['y_position'],
+                     latest[s['sensor_id']]['value'] if s['sensor_id'] in latest else None)
+                    for s in sensors)
+            else:
+                self.changes.record(self.snapshot.data_version, changed, deleted, moved)
+                for sensor_id in deleted:
+                    self.spatial.remove(sensor_id)
+                    self.clusters.remove(sensor_id)
+                    self._notify_deleted(sensor_id)
+                for sensor_id in moved:
+                    self.spatial.insert(sensor_id, *_position(self.snapshot.by_id[sensor_id]))
+                    self.clusters.insert(sensor_id, *_position(self.snapshot.by_id[sensor_id]))
+                for sensor_id in changed:
+                    row = latest.get(sensor_id)
+                    self.clusters.set_value(sensor_id, row['value'] if row else None)
+            # 只有读数变化的传感器需要检查，其余传感器的老化由跟踪器的到期时间处理
+            self._update_liveness(previous, self.snapshot,
+                                  None if previous is None else changed)
+            self._stats['ticks'] += 1
+            self._stats['last_ms'] = (time.perf_counter() - start) * 1000
+        await self._publish(self.snapshot)
+        return self.snapshot
+
+    async def current(self) -> SensorSnapshot:
+        """当前快照（尚未轮询过时立即查询一次）"""
+        if self.snapshot is None:
+            return await self.refresh()
+        return self.snapshot
+
+    async def changes_since(self, cursor: Optional[str] = None,
+                            bbox: Optional[BBox] = None) -> Dict:
+        """
+        增量同步：游标之后信息或最新读数变化的传感器
+
+        Args:
+            cursor: 上次返回的游标；为空、无效或超出保留范围时返回全部传感器
+            bbox: 视口 (x0, y0, x1, y1)，只同步其中的传感器；移出视口的传感器
+                作为墓碑返回
+
+        Returns:
+            {'cursor': 新游标, 'full': 是否为全量,
+             'sensors': 变化的传感器（格式同 SensorSnapshot.rows）,
+             'deleted': 已删除的 sensor_id（墓碑）}
+        """
+        snapshot = await self.current()
+        version = parse_cursor(cursor)
+        delta = self.changes.since(version) if version is not None else None
+        if delta is None:
+            return {'cursor': snapshot.cursor, 'full': True,
+                    'sensors': self.rows_in(snapshot, bbox), 'deleted': []}
+
+        changed, deleted, moved = delta
+        alive = snapshot.by_id
+        visible = [sensor_id for sensor_id in sorted(changed) if sensor_id in alive
+                   and (bbox is None or in_bbox(*_position(alive[sensor_id]), bbox))]
+        # 删除后又重新添加的传感器按变化处理；移出视口的传感器也作为墓碑
+        gone = {sensor_id for sensor_id in deleted | changed if sensor_id not in alive}
+        if bbox is not None:
+            gone |= {sensor_id for sensor_id in moved
+                     if sensor_id in alive and not in_bbox(*_position(alive[sensor_id]), bbox)}
+        return {'cursor': snapshot.cursor, 'full': False,
+                'sensors': [snapshot.row(sensor_id) for sensor_id in visible],
+                'deleted': sorted(gone)}
+
+    def rows_in(self, snapshot: SensorSnapshot, bbox: Optional[BBox] = None) -> List[Dict]:
+        """快照中位于 bbox 内的传感器（bbox 为 None 时为全部），按ID排序"""
+        if bbox is None:
+            return snapshot.rows()
+        sensor_ids = sorted(sensor_id for sensor_id in self.spatial.bbox(*bbox)
+                            if sensor_id in snapshot.by_id)
+        return [snapshot.row(sensor_id) for sensor_id in sensor_ids]
+
+    def clusters_in(self, snapshot: SensorSnapshot, zoom: float,
+                    bbox: Optional[BBox] = None) -> Dict:
+        """
+        缩放级别 zoom 下 bbox 内的聚类和单独显示的传感器
+
+        Args:
+            snapshot: 当前快照
+            zoom: 缩放级别（见 SensorClusterIndex），超过最大聚类级别时不再聚类
+            bbox: 视口 (x0, y0, x1, y1)，为 None 时为全部
+
+        Returns:
+            {'zoom': 级别, 'clusters': 聚类列表（见 SensorClusterIndex.query）,
+             'sensors': 单独显示的传感器（格式同 SensorSnapshot.rows）}
+        """
+        level = self.clusters.level(zoom)
+        if level > self.clusters.max_zoom:
+            return {'zoom': level, 'clusters': [], 'sensors': self.rows_in(snapshot, bbox)}
+        clusters, singles = self.clusters.query(level, bbox)
+        sensors = [snapshot.row(sensor_id) for sensor_id in sorted(singles)
+                   if sensor_id in snapshot.by_id]
+        return {'zoom': level, 'clusters': clusters, 'sensors': sensors}
+
+    def nearest(self, x: float, y: float, k: int = 5) -> List[Dict]:
+        """距离 (x, y) 最近的 k 个传感器（格式同 SensorSnapshot.rows，另加 distance）"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return []
+        rows = []
+        for sensor_id, distance in self.spatial.nearest(x, y, k):
+            if sensor_id in snapshot.by_id:
+                rows.append({**snapshot.row(sensor_id), 'distance': distance})
+        return rows
+
+    def stats(self) -> Dict:
+        return {**self._stats, 'subscribers': len(self._subscribers),
+                'version': self.snapshot.version if self.snapshot else 0,
+                'liveness': self.liveness.stats(), 'clusters': self.clusters.stats()}
+
+    def _update_liveness(self, previous: Optional[SensorSnapshot], snapshot: SensorSnapshot,
+                         sensor_ids: Optional[Iterable[str]] = None):
+        """
+        把最新读数时间有变化的传感器交给状态跟踪器，并处理到期的状态变化
+
+        Args:
+            sensor_ids: 只检查这些传感器（None 表示全部，仅用于第一个快照），
+                通常是 diff_snapshots 得到的变化的传感器，代价与变化数成正比
+        """
+        if previous is None or snapshot.index is not previous.index:
+            self.liveness.sync_sensors(snapshot.by_id)
+
+        old_latest = previous.latest if previous else {}
+        if sensor_ids is None:
+            candidates = snapshot.latest.items()
+        else:
+            candidates = ((sensor_id, snapshot.latest[sensor_id]) for sensor_id in sensor_ids)
+        changed = []
+        for sensor_id, row in candidates:
+            old = old_latest.get(sensor_id)
+            if old is None or old['timestamp'] != row['timestamp']:
+                changed.append((sensor_id, to_epoch_ms(as_datetime(row['timestamp']))))
+
+        now_ms = to_epoch_ms(snapshot.taken_at)
+        self.liveness.observe_many(changed, now_ms)
+        self.liveness.advance(now_ms)
+
+    def _notify_deleted(self, sensor_id: str):
+        for callback in list(self._delete_listeners):
+            try:
+                callback(sensor_id)
+            except Exception as e:
+                logger.error(f"传感器删除回调出错: {e}")
+
+    async def _publish(self, snapshot: SensorSnapshot):
+        """并发推送给所有订阅者，单个订阅者出错或变慢不影响其他订阅者"""
+        async def deliver(callback):
+            try:
+                result = callback(snapshot)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"推送传感器快照失败: {e}")
+
+        await asyncio.gather(*(deliver(cb) for cb in list(self._subscribers)))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 刷新期间到达的请求会在下一轮立即生效
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats['failed'] += 1
+                logger.error(f"传感器快照轮询失败: {e}")
+
+            deadline = loop.time() + self.interval
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                # 被写入唤醒：稍等片刻，合并同一批写入
+                await asyncio.sleep(self.min_interval)
+                self._wake.clear()
+                if not self._pending:
+                    # request_refresh：没有附带读数，只能完整刷新
+                    break
+                try:
+                    await self.apply_pending()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._stats['failed'] += 1
+                    logger.error(f"合并传感器读数失败: {e}")
@@ -0,0 +1,154 @@
+# pool.py
+import sqlite3
+import threading
+import contextlib
+from typing import Dict
+
+from .log import logger
+from .storage import configure_connection
+
+
+class ConnectionPool:
+    """
+    按线程复用的只读 SQLite 连接池
+
+    每个线程持有一个长期打开的连接，pragma 只在创建时设置一次，
+    预编译语句由 sqlite3 的语句缓存（cached_statements）复用。
+    max_connections 限制同时借出的连接数，超出时调用方需要等待。
+    """
+
+    # 每个连接上执行一次的 pragma
+    READ_PRAGMAS = {
+        'query_only': 'ON',
+        'temp_store': 'MEMORY',
+        'cache_size': -16000,  # 约 16MB 页缓存
+    }
+
+    def __init__(self, db_path: str, max_connections: int = 16,
+                 cached_statements: int = 256, timeout: float = 10.0,
+                 managed: bool = True):
+        self.db_path = db_path
+        self.managed = managed
+        self.max_connections = max_connections
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'created': 0,
+            'closed': 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建新连接并设置 pragma"""
+        conn = sqlite3.connect(self.db_path,
+                               timeout=self.timeout,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        if self.managed:
+            # 只读连接不修改 journal_mode，只设置连接级选项
+            configure_connection(conn, persistent=False)
+        for name, value in self.READ_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+
+        with self._lock:
+            self._connections.add(conn)
+            self._stats['created'] += 1
+        logger.debug(f"连接池新建连接: {self.db_path}")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        借出当前线程的连接
+
+        同一线程内嵌套调用会复用同一个连接，不重复占用名额。
+        """
+        local = self._local
+        if getattr(local, 'depth', 0) > 0:
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            self._slots.acquire()
+
+        try:
+            conn = getattr(local, 'conn', None)
+            if conn is None:
+                conn = self._connect()
+                local.conn = conn
+
+            with self._lock:
+                self._stats['checkouts'] += 1
+
+            local.depth = 1
+            try:
+                yield conn
+            finally:
+                local.depth = 0
+                # 只读连接不应留有未结束的事务
+                if conn.in_transaction:
+                    conn.rollback()
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        """
+        连接池统计信息
+
+        Returns:
+            {'checkouts': 借出次数, 'waits': 等待次数,
+             'open_connections': 当前打开的连接数, ...}
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_connections'] = len(self._connections)
+        stats['max_connections'] = self.max_connections
+        stats['db_path'] = self.db_path
+        return stats
+
+    def close_all(self):
+        """关闭所有连接（线程下次借用时会重新创建）"""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+            self._stats['closed'] += len(connections)
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"关闭连接失败: {e}")
+        # 当前线程的缓存连接已失效
+        self._local = threading.local()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = 'db/sensor_data.db', **kwargs) -> ConnectionPool:
+    """获取进程内共享的连接池（按数据库路径区分）"""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path, **kwargs)
+            _pools[db_path] = pool
+        return pool
+
+
+def all_pool_stats() -> Dict[str, Dict]:
+    """所有连接池的统计信息"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.db_path: pool.stats() for pool in pools}
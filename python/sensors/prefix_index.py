@@ -0,0 +1,74 @@
+# prefix_index.py
+import string
+from bisect import bisect_left
+from typing import Iterable, List, Tuple
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold_case(text: str) -> str:
+    """
+    只把 ASCII 字母转为小写
+
+    与 SQLite 的 LIKE、lower() 一致（二者只对 ASCII 不区分大小写），
+    前缀索引和数据库分页对同一个搜索得到相同的结果。
+    """
+    return text.translate(_ASCII_LOWER)
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """
+    以 prefix 开头的字符串的上界（不含）
+
+    例如 'temp' -> 'temq'，满足 prefix <= s < 上界 的 s 恰好是以 prefix 开头的字符串。
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SensorPrefixIndex:
+    """
+    传感器ID的有序前缀索引（ASCII 字母不区分大小写，见 fold_case）
+
+    ID 按 (fold_case(ID), ID) 排序保存，前缀搜索用二分查找确定区间，计数和取某一页都与
+    传感器总数无关，输入框每次按键都可以直接查询。
+    """
+
+    def __init__(self, sensor_ids: Iterable[str]):
+        pairs = sorted((fold_case(sensor_id), sensor_id) for sensor_id in sensor_ids)
+        self._keys = [key for key, _ in pairs]
+        self._ids = [sensor_id for _, sensor_id in pairs]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def range(self, prefix: str = '') -> Tuple[int, int]:
+        """以 prefix 开头的ID在有序列表中的区间 [lo, hi)"""
+        if not prefix:
+            return 0, len(self._keys)
+        prefix = fold_case(prefix)
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix_upper_bound(prefix), lo)
+        return lo, hi
+
+    def count(self, prefix: str = '') -> int:
+        """以 prefix 开头的ID个数"""
+        lo, hi = self.range(prefix)
+        return hi - lo
+
+    def page(self, prefix: str = '', offset: int = 0, limit: int = 10,
+             descending: bool = False) -> List[str]:
+        """
+        按ID排序后的一页
+
+        Args:
+            prefix: ID前缀，空字符串表示全部
+            offset: 跳过的个数
+            limit: 本页个数
+            descending: 是否降序
+        """
+        lo, hi = self.range(prefix)
+        if descending:
+            end = max(hi - offset, lo)
+            return self._ids[max(end - limit, lo):end][::-1]
+        start = min(lo + offset, hi)
+        return self._ids[start:min(start + limit, hi)]
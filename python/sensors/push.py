@@ -0,0 +1,144 @@
+# push.py
+import asyncio
+import contextlib
+import json
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from .poller import SensorSnapshot, SensorSnapshotPoller
+from .spatial import BBox
+
+
+def format_event(event: str, data: str, event_id: Optional[str] = None) -> str:
+    """一条 Server-Sent Events 消息"""
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.extend(f'data: {line}' for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+class SensorEventStream:
+    """
+    传感器变化的服务端推送（SSE）
+
+    每个连接订阅共享轮询器，新快照到达时发送游标之后的增量
+    （格式同 SensorSnapshotPoller.changes_since），没有变化时不发送；
+    空闲时只定期发送注释行保持连接。游标和视口相同的连接共用编码结果。
+    clusters 以同样的方式推送某个缩放级别下视口内的聚类。
+
+    Args:
+        poller: 共享的快照轮询器
+        keepalive: 保持连接的注释行间隔（秒）
+    """
+
+    def __init__(self, poller: SensorSnapshotPoller, keepalive: float = 15.0):
+        self.poller = poller
+        self.keepalive = keepalive
+        # (起始游标, 视口, 当前游标) -> (编码后的消息, 是否有变化)；
+        # ('clusters', 级别, 视口, 当前游标) -> (编码后的消息, 数据)
+        self._cache: Dict[Tuple, Tuple] = {}
+        self._cache_cursor: Optional[str] = None
+        self.connections = 0
+
+    async def _event(self, since: Optional[str],
+                     bbox: Optional[BBox] = None) -> Tuple[str, str, bool]:
+        """since 之后的增量消息：(消息, 新游标, 是否有变化)"""
+        snapshot = await self.poller.current()
+        if snapshot.cursor != self._cache_cursor:
+            self._cache.clear()
+            self._cache_cursor = snapshot.cursor
+
+        key = (since, bbox, snapshot.cursor)
+        if key not in self._cache:
+            delta = await self.poller.changes_since(since, bbox)
+            changed = bool(delta['full'] or delta['sensors'] or delta['deleted'])
+            data = json.dumps(delta, ensure_ascii=False, separators=(',', ':'))
+            self._cache[key] = (format_event('sensors', data, delta['cursor']), changed)
+        message, changed = self._cache[key]
+        return message, snapshot.cursor, changed
+
+    async def _cluster_event(self, zoom: float,
+                             bbox: Optional[BBox] = None) -> Tuple[str, str]:
+        """当前快照下的聚类消息：(消息, 不含游标的数据)"""
+        snapshot = await self.poller.current()
+        if snapshot.cursor != self._cache_cursor:
+            self._cache.clear()
+            self._cache_cursor = snapshot.cursor
+
+        key = ('clusters', self.poller.clusters.level(zoom), bbox, snapshot.cursor)
+        if key not in self._cache:
+            result = self.poller.clusters_in(snapshot, zoom, bbox)
+            data = json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+            self._cache[key] = (format_event('clusters', data, snapshot.cursor), data)
+        return self._cache[key]
+
+    async def events(self, since: Optional[str] = None,
+                     bbox: Optional[BBox] = None) -> AsyncIterator[str]:
+        """
+        一个连接的消息流（连接关闭时生成器被取消，自动取消订阅）
+
+        Args:
+            since: 客户端已有数据的游标（重连时为 Last-Event-ID），为空时先发送全量
+            bbox: 视口 (x0, y0, x1, y1)，只推送其中的传感器
+        """
+        cursor = since
+
+        async def next_message() -> Optional[str]:
+            nonlocal cursor
+            message, cursor, changed = await self._event(cursor, bbox)
+            return message if changed else None
+
+        async with contextlib.aclosing(self._stream(next_message)) as stream:
+            async for message in stream:
+                yield message
+
+    async def clusters(self, zoom: float,
+                       bbox: Optional[BBox] = None) -> AsyncIterator[str]:
+        """
+        一个连接的聚类消息流：连接时发送一次，之后聚类内容变化时再发送
+
+        Args:
+            zoom: 缩放级别（见 SensorClusterIndex）
+            bbox: 视口 (x0, y0, x1, y1)
+        """
+        sent = None
+
+        async def next_message() -> Optional[str]:
+            nonlocal sent
+            message, data = await self._cluster_event(zoom, bbox)
+            if data == sent:
+                return None
+            sent = data
+            return message
+
+        async with contextlib.aclosing(self._stream(next_message)) as stream:
+            async for message in stream:
+                yield message
+
+    async def _stream(self, next_message: Callable[[], Awaitable[Optional[str]]]
+                      ) -> AsyncIterator[str]:
+        """订阅轮询器，每个新快照调用一次 next_message，返回 None 时不发送"""
+        wake = asyncio.Event()
+
+        def on_snapshot(snapshot: SensorSnapshot):
+            wake.set()
+
+        unsubscribe = self.poller.subscribe(on_snapshot)
+        self.connections += 1
+        try:
+            # 告诉浏览器断线后 1 秒重连
+            yield 'retry: 1000\n\n'
+            while True:
+                message = await next_message()
+                if message:
+                    yield message
+
+                try:
+                    await asyncio.wait_for(wake.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                wake.clear()
+        finally:
+            unsubscribe()
+            self.connections -= 1
@@ -0,0 +1,235 @@
+# rolling_stats.py
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .ingest import Reading, as_datetime
+from .schema import from_epoch_ms, to_epoch_ms
+
+
+class SensorRollingStats:
+    """
+    每个传感器的增量统计：样本数、均值、方差（Welford）、EWMA、滑动窗口最小/最大值
+
+    统计量保存在按传感器槽位索引的 NumPy 数组中，由写入路径逐批更新，
+    每条读数的开销为 O(1)，查询时不扫描历史数据。样本数、均值、方差
+    从进程启动（或传感器第一次出现）时开始累计。
+
+    一批读数按传感器分组后一次合并：均值和方差用 Chan 的并行合并公式，
+    EWMA 按组内序号加权求和；滑动窗口分成 buckets 个时间桶，
+    每个桶记录最小、最大值，窗口的最小、最大值为窗口内各桶的最小、最大值
+    （窗口边界精确到桶）。
+
+    线程安全：写入线程和数据库轮询线程都可以调用。
+
+    Args:
+        alpha: EWMA 的平滑系数（每条读数）
+        window: 滑动窗口长度（秒）
+        buckets: 滑动窗口的时间桶数
+    """
+
+    def __init__(self, alpha: float = 0.1, window: float = 3600, buckets: int = 12):
+        self.alpha = alpha
+        self.window_ms = int(window * 1000)
+        self.buckets = buckets
+        self.bucket_ms = max(1, self.window_ms // buckets)
+        self._slot: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._lock = threading.Lock()
+        self._stats = {'readings': 0, 'batches': 0, 'last_ms': 0.0}
+        self._allocate_arrays(0)
+
+    def _allocate_arrays(self, capacity: int):
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._mean = np.zeros(capacity)
+        self._m2 = np.zeros(capacity)
+        self._ewma = np.full(capacity, np.nan)
+        self._last_ts = np.full(capacity, -1, dtype=np.int64)
+        self._last_value = np.full(capacity, np.nan)
+        # 滑动窗口的时间桶：桶编号（时间戳 // bucket_ms）、桶内最小值、最大值
+        self._bucket_id = np.full((capacity, self.buckets), -1, dtype=np.int64)
+        self._bucket_min = np.full((capacity, self.buckets), np.inf)
+        self._bucket_max = np.full((capacity, self.buckets), -np.inf)
+
+    def __len__(self) -> int:
+        return len(self._slot)
+
+    def feed(self, readings: List[Reading]):
+        """更新一批读数 [(sensor_id, value, timestamp), ...]（可直接注册为写入监听器）"""
+        if not readings:
+            return
+        sensor_ids = [sensor_id for sensor_id, _, _ in readings]
+        ts = np.fromiter((to_epoch_ms(as_datetime(t)) for _, _, t in readings),
+                         dtype=np.int64, count=len(readings))
+        values = np.fromiter((v for _, v, _ in readings), dtype=float, count=len(readings))
+        self.update(sensor_ids, ts, values)
+
+    def feed_rows(self, rows: List[Tuple[str, int, float]]):
+        """更新 DatabaseTailer 读到的一批 [(sensor_id, 毫秒时间戳, value), ...]"""
+        if not rows:
+            return
+        sensor_ids = [sensor_id for sensor_id, _, _ in rows]
+        ts = np.fromiter((t for _, t, _ in rows), dtype=np.int64, count=len(rows))
+        values = np.fromiter((v for _, _, v in rows), dtype=float, count=len(rows))
+        self.update(sensor_ids, ts, values)
+
+    def update(self, sensor_ids: List[str], ts: np.ndarray, values: np.ndarray):
+        """
+        合并一批读数（可直接注册为列式写入监听器）
+
+        不比该传感器已合并的最新读数新的读数被忽略，同一读数重复送入
+        （例如同进程写入后又被数据库轮询读到）时只计一次。
+        """
+        start = time.perf_counter()
+        with self._lock:
+            slots = np.fromiter((self._slot_of(sensor_id) for sensor_id in sensor_ids),
+                                dtype=np.int64, count=len(sensor_ids))
+            fresh = (ts > self._last_ts[slots]) & ~np.isnan(values)
+            slots, ts, values = slots[fresh], ts[fresh], values[fresh]
+            order = np.lexsort((ts, slots))
+            slots, ts, values = slots[order], ts[order], values[order]
+            if len(slots):
+                # 同一传感器同一时间戳只保留一条
+                keep = np.ones(len(slots), dtype=bool)
+                keep[1:] = (slots[1:] != slots[:-1]) | (ts[1:] != ts[:-1])
+                slots, ts, values = slots[keep], ts[keep], values[keep]
+                self._merge(slots, ts, values)
+            self._stats['readings'] += len(slots)
+            self._stats['batches'] += 1
+            self._stats['last_ms'] = (time.perf_counter() - start) * 1000
+
+    def get(self, sensor_id: str, now: Optional[datetime] = None) -> Optional[Dict]:
+        """单个传感器的统计量（没有读数时返回 None），字段见 get_many"""
+        rows = self.get_many([sensor_id], now)
+        return rows[0] if rows else None
+
+    def get_many(self, sensor_ids: Optional[Iterable[str]] = None,
+                 now: Optional[datetime] = None) -> List[Dict]:
+        """
+        多个传感器的统计量（None 表示全部，没有读数的传感器不返回）
+
+        Returns:
+            [{'sensor_id', 'count', 'mean', 'variance', 'std', 'ewma',
+              'min', 'max', 'last', 'timestamp'}, ...]；
+            variance 为样本方差（不足两条读数时为 None），
+            min, max 为最近 window 秒内的最小、最大值（窗口内没有读数时为 None）
+        """
+        now_bucket = to_epoch_ms(now or datetime.now()) // self.bucket_ms
+        with self._lock:
+            if sensor_ids is None:
+                slots = np.arange(len(self._ids))
+            else:
+                slots = np.array([self._slot[s] for s in sensor_ids if s in self._slot],
+                                 dtype=np.int64)
+            slots = slots[self._count[slots] > 0]
+            count = self._count[slots]
+            mean = self._mean[slots]
+            variance = np.where(count > 1, self._m2[slots] / np.maximum(count - 1, 1), np.nan)
+            ewma = self._ewma[slots]
+            in_window = ((self._bucket_id[slots] > now_bucket - self.buckets)
+                         & (self._bucket_id[slots] <= now_bucket))
+            low = np.where(in_window, self._bucket_min[slots], np.inf).min(axis=1, initial=np.inf)
+            high = np.where(in_window, self._bucket_max[slots], -np.inf).max(axis=1, initial=-np.inf)
+            last = self._last_value[slots]
+            last_ts = self._last_ts[slots]
+            ids = [self._ids[slot] for slot in slots.tolist()]
+
+        def number(value) -> Optional[float]:
+            return None if not np.isfinite(value) else float(value)
+
+        return [{'sensor_id': sensor_id, 'count': int(count[i]), 'mean': float(mean[i]),
+                 'variance': number(variance[i]),
+                 'std': number(np.sqrt(variance[i])),
+                 'ewma': float(ewma[i]), 'min': number(low[i]), 'max': number(high[i]),
+                 'last': float(last[i]), 'timestamp': from_epoch_ms(int(last_ts[i]))}
+                for i, sensor_id in enumerate(ids)]
+
+    def drop(self, sensor_id: str):
+        """清空传感器的统计量（例如传感器被删除后）"""
+        with self._lock:
+            slot = self._slot.get(sensor_id)
+            if slot is None:
+                return
+            self._count[slot] = 0
+            self._mean[slot] = self._m2[slot] = 0.0
+            self._ewma[slot] = self._last_value[slot] = np.nan
+            self._last_ts[slot] = -1
+            self._bucket_id[slot] = -1
+            self._bucket_min[slot] = np.inf
+            self._bucket_max[slot] = -np.inf
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'sensors': len(self._ids)}
+
+    def _slot_of(self, sensor_id: str) -> int:
+        slot = self._slot.get(sensor_id)
+        if slot is not None:
+            return slot
+        slot = len(self._ids)
+        if slot >= len(self._count):
+            # 容量翻倍
+            old = {name: getattr(self, name) for name in (
+                '_count', '_mean', '_m2', '_ewma', '_last_ts', '_last_value',
+                '_bucket_id', '_bucket_min', '_bucket_max')}
+            self._allocate_arrays(max(64, 2 * slot))
+            for name, array in old.items():
+                getattr(self, name)[:slot] = array
+        self._ids.append(sensor_id)
+        self._slot[sensor_id] = slot
+        return slot
+
+    def _merge(self, slots: np.ndarray, ts: np.ndarray, values: np.ndarray):
+        """合并按 (槽位, 时间) 排序的读数"""
+        first = np.ones(len(slots), dtype=bool)
+        first[1:] = slots[1:] != slots[:-1]
+        starts = np.flatnonzero(first)
+        k = np.diff(np.append(starts, len(slots)))
+        g = slots[starts]
+
+        # 均值、方差：本批的均值和离差平方和，再与已有的合并
+        batch_mean = np.add.reduceat(values, starts) / k
+        batch_m2 = np.add.reduceat((values - np.repeat(batch_mean, k)) ** 2, starts)
+        n_old = self._count[g]
+        n = n_old + k
+        delta = batch_mean - self._mean[g]
+        self._mean[g] += delta * k / n
+        self._m2[g] += batch_m2 + delta ** 2 * n_old * k / n
+        self._count[g] = n
+
+        # EWMA：第一次出现的传感器以第一条读数为初值
+        decay = 1 - self.alpha
+        rank = np.arange(len(slots)) - np.repeat(starts, k)
+        weights = self.alpha * decay ** (np.repeat(k, k) - 1 - rank)
+        previous = np.where(n_old > 0, self._ewma[g], values[starts])
+        self._ewma[g] = decay ** k * previous + np.add.reduceat(weights * values, starts)
+
+        ends = starts + k - 1
+        self._last_ts[g] = ts[ends]
+        self._last_value[g] = values[ends]
+
+        # 滑动窗口：按 (槽位, 桶) 分组后更新对应的桶
+        bucket = ts // self.bucket_ms
+        bucket_first = first.copy()
+        bucket_first[1:] |= bucket[1:] != bucket[:-1]
+        bucket_starts = np.flatnonzero(bucket_first)
+        b_slot = slots[bucket_starts]
+        b_id = bucket[bucket_starts]
+        b_min = np.minimum.reduceat(values, bucket_starts)
+        b_max = np.maximum.reduceat(values, bucket_starts)
+        # 同一批中比最新的桶早一个窗口以上的桶已经过期（也避免同一位置写两次）
+        newest = bucket[ends][np.searchsorted(starts, bucket_starts, side='right') - 1]
+        live = b_id > newest - self.buckets
+        b_slot, b_id, b_min, b_max = b_slot[live], b_id[live], b_min[live], b_max[live]
+
+        col = b_id % self.buckets
+        current = self._bucket_id[b_slot, col]
+        same = current == b_id
+        self._bucket_min[b_slot, col] = np.where(
+            same, np.minimum(self._bucket_min[b_slot, col], b_min), b_min)
+        self._bucket_max[b_slot, col] = np.where(
+            same, np.maximum(self._bucket_max[b_slot, col], b_max), b_max)
+        self._bucket_id[b_slot, col] = b_id
@@ -0,0 +1,177 @@
+# rollup.py
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .log import logger
+from .schema import format_epoch_ms
+
+
+# 汇总分辨率：名称 -> (桶长度（秒）, 桶起点格式)
+RESOLUTIONS = {
+    '1m': (60, '%Y-%m-%d %H:%M:00'),
+    '1h': (3600, '%Y-%m-%d %H:00:00'),
+    '1d': (86400, '%Y-%m-%d 00:00:00'),
+}
+
+
+def rollup_table(resolution: str) -> str:
+    """汇总表名，例如 sensor_rollup_1m"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'未知的汇总分辨率: {resolution}')
+    return f'sensor_rollup_{resolution}'
+
+
+def create_rollup_tables(cursor: sqlite3.Cursor):
+    """创建各分辨率的汇总表（每个传感器每个时间桶一行）"""
+    for resolution in RESOLUTIONS:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {rollup_table(resolution)} (
+            sensor_id TEXT NOT NULL,
+            bucket TIMESTAMP NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            last REAL NOT NULL,
+            last_ts TIMESTAMP NOT NULL,
+            PRIMARY KEY (sensor_id, bucket)
+        ) WITHOUT ROWID
+        ''')
+
+
+def _aggregate(readings: List[Tuple], fmt: str) -> List[Tuple]:
+    """在内存中按 (传感器, 时间桶) 聚合一批读数"""
+    buckets: Dict[Tuple[str, str], list] = {}
+    for sensor_id, value, timestamp in readings:
+        key = (sensor_id, timestamp.strftime(fmt))
+        agg = buckets.get(key)
+        if agg is None:
+            buckets[key] = [1, value, value, value, value, timestamp]
+            continue
+        agg[0] += 1
+        agg[1] += value
+        if value < agg[2]:
+            agg[2] = value
+        if value > agg[3]:
+            agg[3] = value
+        if timestamp >= agg[5]:
+            agg[4] = value
+            agg[5] = timestamp
+    return [(sensor_id, bucket, *agg) for (sensor_id, bucket), agg in buckets.items()]
+
+
+def update_rollups(cursor: sqlite3.Cursor, readings: List[Tuple]):
+    """
+    在当前事务中把一批读数增量合并到各汇总表
+
+    Args:
+        cursor: 数据库游标
+        readings: [(sensor_id, value, timestamp), ...]，timestamp 为 datetime
+    """
+    for resolution, (_, fmt) in RESOLUTIONS.items():
+        _merge_buckets(cursor, rollup_table(resolution), _aggregate(readings, fmt))
+
+
+def update_rollups_columns(cursor: sqlite3.Cursor, sensor_ids: List[str],
+                           inverse: np.ndarray, ts: np.ndarray, values: np.ndarray):
+    """
+    update_rollups 的列式版本：在 numpy 中按 (传感器, 时间桶) 聚合
+
+    Args:
+        sensor_ids: 不重复的传感器ID
+        inverse: 每条读数在 sensor_ids 中的序号，读数按 (inverse, ts) 排序
+        ts: 毫秒时间戳
+        values: 数值
+    """
+    n = len(ts)
+    if not n:
+        return
+    for resolution, (seconds, fmt) in RESOLUTIONS.items():
+        # 按 (传感器, 时间) 排序后同一传感器的时间桶也是连续的
+        bucket = ts // (seconds * 1000)
+        starts = np.flatnonzero(np.append(
+            True, (inverse[1:] != inverse[:-1]) | (bucket[1:] != bucket[:-1])))
+        ends = np.append(starts[1:], n) - 1
+
+        # 时间桶起点是整秒，文本与 fmt 格式化的结果相同
+        _merge_buckets(cursor, rollup_table(resolution), zip(
+            (sensor_ids[i] for i in inverse[starts].tolist()),
+            format_epoch_ms(bucket[starts] * (seconds * 1000)).tolist(),
+            np.diff(np.append(starts, n)).tolist(),
+            np.add.reduceat(values, starts).tolist(),
+            np.minimum.reduceat(values, starts).tolist(),
+            np.maximum.reduceat(values, starts).tolist(),
+            values[ends].tolist(),
+            format_epoch_ms(ts[ends]).tolist()))
+
+
+def _merge_buckets(cursor: sqlite3.Cursor, table: str, rows: Iterable[Tuple]):
+    """把 (sensor_id, bucket, count, sum, min, max, last, last_ts) 合并到汇总表"""
+    cursor.executemany(f'''
+    INSERT INTO {table} (sensor_id, bucket, count, sum, min, max, last, last_ts)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(sensor_id, bucket) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max),
+        last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,
+        last_ts = MAX(last_ts, excluded.last_ts)
+    ''', rows)
+
+
+def rebuild_rollups(conn: sqlite3.Connection,
+                    start_time: Optional[datetime] = None):
+    """
+    从原始读数重新计算汇总表（用于旧数据库回填或后台校正）
+
+    Args:
+        conn: 数据库连接
+        start_time: 只重算该时间之后的时间桶，None表示全部重算
+    """
+    cursor = conn.cursor()
+    for resolution, (_, fmt) in RESOLUTIONS.items():
+        table = rollup_table(resolution)
+        params = []
+        where = ''
+        if start_time is not None:
+            bucket_start = start_time.strftime(fmt)
+            cursor.execute(f'DELETE FROM {table} WHERE bucket >= ?',
+                           (bucket_start,))
+            where = 'WHERE timestamp >= ?'
+            params.append(bucket_start)
+        else:
+            cursor.execute(f'DELETE FROM {table}')
+
+        # MAX(timestamp) 的裸列取值来自同一行，即时间桶内最后一条读数
+        cursor.execute(f'''
+        INSERT INTO {table} (sensor_id, bucket, count, sum, min, max, last, last_ts)
+        SELECT sensor_id, strftime('{fmt}', timestamp), COUNT(*), SUM(value),
+               MIN(value), MAX(value), value, MAX(timestamp)
+        FROM sensor_readings
+        {where}
+        GROUP BY sensor_id, strftime('{fmt}', timestamp)
+        ''', params)
+        logger.info(f"重算汇总表 {table}: {cursor.rowcount} 个时间桶")
+    conn.commit()
+
+
+def choose_resolution(start_time: datetime, end_time: datetime,
+                      max_points: int) -> str:
+    """
+    选择满足点数预算的汇总分辨率
+
+    在时间桶数量不超过 max_points 的分辨率中选择最细的一个；
+    所有分辨率都超出预算时返回最粗的分辨率。
+
+    Returns:
+        分辨率名称，例如 '1m'
+    """
+    span = max((end_time - start_time).total_seconds(), 0)
+    for resolution, (seconds, _) in RESOLUTIONS.items():
+        if span / seconds <= max_points:
+            return resolution
+    return list(RESOLUTIONS)[-1]
@@ -0,0 +1,372 @@
+# schema.py
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# 存储结构版本，记录在 PRAGMA user_version 中
+# v1: sensor_readings(id, sensor_id TEXT, value, timestamp TEXT) + 三个索引
+# v2: sensor_keys(sensor_key, sensor_id) +
+#     readings_v2(sensor_key, ts 毫秒, value) WITHOUT ROWID，按 (sensor_key, ts) 聚簇
+SCHEMA_V1 = 1
+SCHEMA_V2 = 2
+
+# 时间戳按“本地时间的墙上时钟”存储：naive datetime 当作 UTC 换算为毫秒，
+# 反向换算时不做时区转换，与 v1 中的文本时间一致
+EPOCH = datetime(1970, 1, 1)
+ONE_MS = timedelta(milliseconds=1)
+
+# 在 SQL 中把 v2 的毫秒时间戳还原为 v1 格式的文本时间
+TS_TEXT_SQL = "strftime('%Y-%m-%d %H:%M:%f', {col} / 1000.0, 'unixepoch')"
+
+
+def to_epoch_ms(timestamp: datetime) -> int:
+    """datetime -> 毫秒时间戳"""
+    return (timestamp - EPOCH) // ONE_MS
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    """毫秒时间戳 -> datetime"""
+    return EPOCH + ms * ONE_MS
+
+
+def format_epoch_ms(ms: np.ndarray) -> np.ndarray:
+    """
+    毫秒时间戳数组 -> 文本时间数组
+
+    格式与 sqlite3 默认的 datetime 适配器相同（'YYYY-MM-DD HH:MM:SS[.ffffff]'，
+    整秒时没有小数部分），与逐条写入 datetime 得到的文本一致。
+    """
+    moments = np.asarray(ms, dtype=np.int64).astype('datetime64[ms]')
+    text = np.char.replace(np.datetime_as_string(moments, unit='us'), 'T', ' ')
+    whole = np.asarray(ms) % 1000 == 0
+    if whole.any():
+        text[whole] = np.char.replace(
+            np.datetime_as_string(moments[whole], unit='s'), 'T', ' ')
+    return text
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """数据库的存储结构版本（未设置时视为 v1）"""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    return version or SCHEMA_V1
+
+
+def set_schema_version(conn: sqlite3.Connection, version: int):
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def create_v2_tables(cursor: sqlite3.Cursor):
+    """创建 v2 存储结构"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sensor_keys (
+        sensor_key INTEGER PRIMARY KEY,
+        sensor_id TEXT NOT NULL UNIQUE
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS readings_v2 (
+        sensor_key INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        value REAL NOT NULL,
+        PRIMARY KEY (sensor_key, ts)
+    ) WITHOUT ROWID
+    ''')
+
+
+def create_journal(cursor: sqlite3.Cursor):
+    """
+    v2 的写入日志 readings_journal：每条新写入的读数按提交顺序得到递增的 seq
+
+    readings_v2 没有 rowid，按时间戳轮询会漏掉迟到的读数（补传、时钟偏差），
+    其他进程按 seq 增量读取新写入的读数（见 hot_cache.DatabaseTailer）。
+    日志由触发器维护，旧记录由 prune_journal 删除。
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS readings_journal (
+        seq INTEGER PRIMARY KEY,
+        sensor_key INTEGER NOT NULL,
+        ts INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS readings_v2_journal
+    AFTER INSERT ON readings_v2
+    BEGIN
+        INSERT INTO readings_journal (sensor_key, ts) VALUES (NEW.sensor_key, NEW.ts);
+    END
+    ''')
+
+
+def prune_journal(conn: sqlite3.Connection, keep: int = 1000000) -> int:
+    """
+    只保留 readings_journal 中最新的 keep 条（没有日志表时不做任何事）
+
+    Returns:
+        删除的条数
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'readings_journal'").fetchone() is None:
+        return 0
+    with conn:
+        cursor = conn.execute('''
+        DELETE FROM readings_journal
+        WHERE seq <= (SELECT MAX(seq) FROM readings_journal) - ?
+        ''', (keep,))
+    return cursor.rowcount
+
+
+def create_compat_view(cursor: sqlite3.Cursor):
+    """
+    v2 下提供与 v1 同名同列的只读视图 sensor_readings
+
+    用于回填、重算汇总等不在热路径上的查询；热路径直接查询 readings_v2。
+    """
+    cursor.execute(f'''
+    CREATE VIEW IF NOT EXISTS sensor_readings AS
+    SELECT NULL AS id, k.sensor_id AS sensor_id, r.value AS value,
+           {TS_TEXT_SQL.format(col='r.ts')} AS timestamp
+    FROM readings_v2 r
+    JOIN sensor_keys k ON r.sensor_key = k.sensor_key
+    ''')
+
+
+def resolve_sensor_keys(cursor: sqlite3.Cursor,
+                        sensor_ids: Iterable[str]) -> Dict[str, int]:
+    """获取（必要时分配）传感器的整数键"""
+    sensor_ids = list(set(sensor_ids))
+    cursor.executemany('INSERT OR IGNORE INTO sensor_keys (sensor_id) VALUES (?)',
+                       [(sensor_id,) for sensor_id in sensor_ids])
+
+    keys = {}
+    # 分块查询，避免超过 SQLite 的参数个数限制
+    for i in range(0, len(sensor_ids), 500):
+        chunk = sensor_ids[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        keys.update(cursor.execute(
+            f'SELECT sensor_id, sensor_key FROM sensor_keys WHERE sensor_id IN ({placeholders})',
+            chunk).fetchall())
+    return keys
+
+
+# v2 写入读数：同一传感器同一毫秒已有读数时不写入（以先写入的为准），
+# 派生表只合并实际写入的读数，与原始数据保持一致
+INSERT_V2_SQL = '''
+INSERT INTO readings_v2 (sensor_key, ts, value)
+VALUES (?, ?, ?)
+ON CONFLICT(sensor_key, ts) DO NOTHING
+'''
+
+
+def inserted_v2_rows(cursor: sqlite3.Cursor, sensor_keys: List[int], ts: List[int],
+                     inserted: int) -> np.ndarray:
+    """
+    刚执行的 INSERT_V2_SQL 实际写入了哪些行
+
+    写入日志（readings_journal）只记录实际写入的行，本事务最新的 inserted 条
+    即为这次写入的行；同一批中重复的 (传感器, 毫秒) 只有第一条被写入。
+
+    Args:
+        sensor_keys, ts: 这次写入的各行
+        inserted: executemany 之后的 rowcount
+
+    Returns:
+        布尔掩码
+    """
+    n = len(ts)
+    if inserted == n:
+        return np.ones(n, dtype=bool)
+    mask = np.zeros(n, dtype=bool)
+    if inserted <= 0:
+        return mask
+    pending = set(cursor.execute(
+        'SELECT sensor_key, ts FROM readings_journal ORDER BY seq DESC LIMIT ?',
+        (inserted,)).fetchall())
+    for i, row in enumerate(zip(sensor_keys, ts)):
+        if row in pending:
+            pending.discard(row)
+            mask[i] = True
+    return mask
+
+
+def insert_readings(cursor: sqlite3.Cursor, readings: List[Tuple],
+                    schema: int = SCHEMA_V1) -> List[Tuple]:
+    """
+    按存储结构写入读数
+
+    Args:
+        readings: [(sensor_id, value, timestamp), ...]，timestamp 为 datetime
+        schema: SCHEMA_V1 或 SCHEMA_V2
+
+    Returns:
+        实际写入的读数（v2 中已有的 (传感器, 毫秒) 不再写入）
+    """
+    if schema == SCHEMA_V2:
+        keys = resolve_sensor_keys(cursor, (r[0] for r in readings))
+        sensor_keys = [keys[sensor_id] for sensor_id, _, _ in readings]
+        ts = [to_epoch_ms(timestamp) for _, _, timestamp in readings]
+        cursor.executemany(INSERT_V2_SQL, zip(sensor_keys, ts, (r[1] for r in readings)))
+        mask = inserted_v2_rows(cursor, sensor_keys, ts, cursor.rowcount)
+        if mask.all():
+            return readings
+        return [reading for reading, keep in zip(readings, mask.tolist()) if keep]
+    cursor.executemany('''
+    INSERT INTO sensor_readings (sensor_id, value, timestamp)
+    VALUES (?, ?, ?)
+    ''', readings)
+    return readings
+
+
+def select_series(schema: int, sensor_id: str, start_time: datetime,
+                  end_time: Optional[datetime] = None) -> Tuple[str, list]:
+    """
+    构造查询单个传感器时间序列的 SQL
+
+    Returns:
+        (sql, params)，结果列为 ts（毫秒）, value，按时间升序
+    """
+    if schema == SCHEMA_V2:
+        query = '''
+        SELECT r.ts, r.value
+        FROM sensor_keys k
+        JOIN readings_v2 r ON r.sensor_key = k.sensor_key
+        WHERE k.sensor_id = ? AND r.ts >= ?
+        '''
+        params = [sensor_id, to_epoch_ms(start_time)]
+        if end_time:
+            query += ' AND r.ts <= ?'
+            params.append(to_epoch_ms(end_time))
+        query += ' ORDER BY r.ts'
+    else:
+        query = '''
+        SELECT CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER),
+               value
+        FROM sensor_readings
+        WHERE sensor_id = ? AND timestamp >= ?
+        '''
+        params = [sensor_id, start_time]
+        if end_time:
+            query += ' AND timestamp <= ?'
+            params.append(end_time)
+        query += ' ORDER BY timestamp'
+    return query, params
+
+
+def select_page(schema: int, sensor=None,
+                start_time: Optional[datetime] = None,
+                end_time: Optional[datetime] = None,
+                after=None, limit: int = 10000) -> Tuple[str, list]:
+    """
+    构造键集分页查询的 SQL（按时间升序的一页读数）
+
+    不使用 OFFSET：每页从上一页最后一行的键之后开始，在索引上直接定位。
+
+    Args:
+        sensor: v1 为传感器ID（None表示所有传感器）；v2 为单个传感器的 sensor_key
+        after: 上一页最后一行的键，v1 为 (timestamp, id)，v2 为 ts；None表示第一页
+        limit: 每页行数
+
+    Returns:
+        (sql, params)，结果列 v1 为 id, sensor_id, timestamp, ts（毫秒）, value；
+        v2 为 ts（毫秒）, value
+    """
+    params = []
+    if schema == SCHEMA_V2:
+        # 每个传感器在主键 (sensor_key, ts) 上做范围扫描
+        query = '''
+        SELECT ts, value
+        FROM readings_v2
+        WHERE sensor_key = ?
+        '''
+        params.append(sensor)
+        if after is not None:
+            query += ' AND ts > ?'
+            params.append(after)
+        elif start_time:
+            query += ' AND ts >= ?'
+            params.append(to_epoch_ms(start_time))
+        if end_time:
+            query += ' AND ts <= ?'
+            params.append(to_epoch_ms(end_time))
+        query += ' ORDER BY ts LIMIT ?'
+    else:
+        # idx_timestamp / idx_sensor_time 的索引项末尾带有 rowid（即 id），
+        # 因此 (timestamp, id) 的顺序与索引顺序一致
+        query = '''
+        SELECT id, sensor_id, timestamp,
+               CAST(ROUND((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER),
+               value
+        FROM sensor_readings
+        WHERE 1=1
+        '''
+        if sensor:
+            query += ' AND sensor_id = ?'
+            params.append(sensor)
+        if after is not None:
+            query += ' AND (timestamp, id) > (?, ?)'
+            params.extend(after)
+        elif start_time:
+            query += ' AND timestamp >= ?'
+            params.append(start_time)
+        if end_time:
+            query += ' AND timestamp <= ?'
+            params.append(end_time)
+        query += ' ORDER BY timestamp, id LIMIT ?'
+    params.append(limit)
+    return query, params
+
+
+def select_readings(schema: int, sensor_id: Optional[str] = None,
+                    start_time: Optional[datetime] = None,
+                    end_time: Optional[datetime] = None,
+                    descending: bool = False) -> Tuple[str, list]:
+    """
+    构造查询读数（带传感器位置）的 SQL
+
+    Returns:
+        (sql, params)，结果列为 [id,] sensor_id, value, timestamp, x_position, y_position
+    """
+    params = []
+    if schema == SCHEMA_V2:
+        # 以 sensor_keys 为外层循环，每个传感器在主键上做一次范围扫描
+        query = f'''
+        SELECT k.sensor_id, r.value,
+               {TS_TEXT_SQL.format(col='r.ts')} AS timestamp,
+               s.x_position, s.y_position
+        FROM sensor_keys k
+        CROSS JOIN readings_v2 r ON r.sensor_key = k.sensor_key
+        JOIN sensors s ON k.sensor_id = s.sensor_id
+        WHERE 1=1
+        '''
+        if sensor_id:
+            query += ' AND k.sensor_id = ?'
+            params.append(sensor_id)
+        if start_time:
+            query += ' AND r.ts >= ?'
+            params.append(to_epoch_ms(start_time))
+        if end_time:
+            query += ' AND r.ts <= ?'
+            params.append(to_epoch_ms(end_time))
+        query += ' ORDER BY r.ts'
+    else:
+        query = '''
+        SELECT sr.*, s.x_position, s.y_position
+        FROM sensor_readings sr
+        JOIN sensors s ON sr.sensor_id = s.sensor_id
+        WHERE 1=1
+        '''
+        if sensor_id:
+            query += ' AND sr.sensor_id = ?'
+            params.append(sensor_id)
+        if start_time:
+            query += ' AND sr.timestamp >= ?'
+            params.append(start_time)
+        if end_time:
+            query += ' AND sr.timestamp <= ?'
+            params.append(end_time)
+        query += ' ORDER BY sr.timestamp'
+
+    if descending:
+        query += ' DESC'
+    return query, params
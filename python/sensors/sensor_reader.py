@@ -1,13 +1,52 @@
 # sensor_reader.py
+import heapq
+import itertools
 import sqlite3
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
 
+from .pool import ConnectionPool, get_pool
+from .archive import iter_archive, load_archive
+from .rollup import RESOLUTIONS, choose_resolution, rollup_table
+from .schema import (SCHEMA_V2, from_epoch_ms, schema_version, select_page,
+                     select_readings, select_series, to_epoch_ms)
+from .hot_cache import SensorHotCache
+from .rolling_stats import SensorRollingStats
+from .downsample import downsample
+
 
 class SensorDataReader:
-    def __init__(self, db_path='db/sensor_data.db'):
+    def __init__(self, db_path='db/sensor_data.db',
+                 pool: Optional[ConnectionPool] = None,
+                 archive_dir: Optional[str] = 'data/sensor_archive',
+                 hot_cache: Optional[SensorHotCache] = None,
+                 rolling_stats: Optional[SensorRollingStats] = None):
         self.db_path = db_path
+        # 最近读数的内存缓存（见 sensors.hot_cache），None 表示总是查询数据库
+        self.hot_cache = hot_cache
+        # 写入路径维护的增量统计（见 sensors.rolling_stats）
+        self.rolling_stats = rolling_stats
+        # 冷数据归档目录（见 sensors.archive），None 表示只查询数据库
+        self.archive_dir = archive_dir
+        # 同一数据库的读取器共享连接池，避免每次查询重新建立连接
+        self.pool = pool or get_pool(db_path)
+        self._schema = None
+
+    def schema(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """数据库存储结构版本（首次查询后缓存，迁移后需重建读取器）"""
+        if self._schema is None:
+            if conn is None:
+                with self.pool.connection() as conn:
+                    self._schema = schema_version(conn)
+            else:
+                self._schema = schema_version(conn)
+        return self._schema
+
+    def get_pool_stats(self) -> Dict:
+        """获取连接池统计信息（借出次数、等待次数、打开的连接数）"""
+        return self.pool.stats()
 
     def get_recent_data(self, sensor_id: Optional[str] = None,
                         minutes: int = 60) -> List[Dict]:
@@ -21,35 +60,99 @@ class SensorDataReader:
         Returns:
             传感器数据列表
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
         time_threshold = datetime.now() - timedelta(minutes=minutes)
 
-        try:
-            if sensor_id:
-                cursor.execute('''
-                SELECT sr.*, s.x_position, s.y_position
-                FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.sensor_id
-                WHERE sr.sensor_id = ? AND sr.timestamp >= ?
-                ORDER BY sr.timestamp DESC
-                ''', (sensor_id, time_threshold))
-            else:
-                cursor.execute('''
-                SELECT sr.*, s.x_position, s.y_position
-                FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.sensor_id
-                WHERE sr.timestamp >= ?
-                ORDER BY sr.timestamp DESC
-                ''', (time_threshold,))
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+
+            query, params = select_readings(self.schema(conn), sensor_id,
+                                            start_time=time_threshold,
+                                            descending=True)
+            cursor.execute(query, params)
 
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
-        finally:
-            conn.close()
+    def get_recent_window(self, sensor_id: str, minutes: int = 60,
+                          now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取单个传感器最近一段时间的数据（NumPy 数组）
+
+        缓存在同步数据库时直接从内存读取，否则查询数据库并预热缓存。
+
+        Args:
+            sensor_id: 传感器ID
+            minutes: 最近多少分钟的数据
+
+        Returns:
+            (时间戳数组（毫秒，int64）, 数值数组（float64）)，按时间升序
+        """
+        start_time = (now or datetime.now()) - timedelta(minutes=minutes)
+        since_ms = to_epoch_ms(start_time)
+
+        cache = self.hot_cache
+        live = cache is not None and cache.is_live()
+        if live and cache.covers(sensor_id, since_ms):
+            return cache.window(sensor_id, since_ms)
+
+        ts, values = self._select_series(sensor_id, start_time)
+        if live:
+            cache.prime(sensor_id, ts, values, since_ms)
+        return ts, values
+
+    def get_chart_series(self, sensor_id: str, minutes: int = 60,
+                         max_points: int = 1000, method: str = 'lttb',
+                         now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取用于图表显示的时间序列，点数不超过 max_points
+
+        一小时以内使用原始读数（优先从内存缓存读取），更长的时间范围由 get_history
+        按点数预算选择原始数据或汇总表，最后在服务端降采样（见 sensors.downsample）。
+
+        Args:
+            sensor_id: 传感器ID
+            minutes: 最近多少分钟的数据
+            max_points: 点数预算，通常为图表的像素宽度
+            method: 降采样方法，'lttb' 或 'minmax'
+
+        Returns:
+            (时间戳数组（毫秒，int64）, 数值数组（float64）)，按时间升序
+        """
+        now = now or datetime.now()
+        if minutes <= 60:
+            ts, values = self.get_recent_window(sensor_id, minutes, now)
+        else:
+            # 多取几倍的点，降采样时仍有选择的余地
+            df = self.get_history(sensor_id, now - timedelta(minutes=minutes), now,
+                                  max_points=max_points * 4)
+            ts = df['timestamp'].to_numpy(dtype='datetime64[ms]').view(np.int64)
+            values = df['value'].to_numpy(dtype=np.float64)
+        return downsample(ts, values, max_points, method)
+
+    def get_readings_after(self, sensor_id: str,
+                           after_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取单个传感器 after_ms 之后（不含）的读数，用于增量刷新图表
+
+        Returns:
+            (时间戳数组（毫秒，int64）, 数值数组（float64）)，按时间升序
+        """
+        cache = self.hot_cache
+        if cache is not None and cache.is_live() and cache.covers(sensor_id, after_ms + 1):
+            return cache.window(sensor_id, after_ms + 1)
+        return self._select_series(sensor_id, from_epoch_ms(after_ms + 1))
+
+    def _select_series(self, sensor_id: str,
+                       start_time: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        with self.pool.connection() as conn:
+            query, params = select_series(self.schema(conn), sensor_id, start_time)
+            rows = conn.execute(query, params).fetchall()
+
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        data = np.asarray(rows, dtype=np.float64)
+        return data[:, 0].astype(np.int64), data[:, 1]
 
     def get_latest_data(self, sensor_id: Optional[str] = None) -> List[Dict]:
         """
@@ -61,40 +164,45 @@ class SensorDataReader:
         Returns:
             最新传感器数据列表
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
 
-        try:
+            # sensor_latest 每个传感器只有一行，查询代价与历史数据量无关
             if sensor_id:
                 # 获取指定传感器的最新数据
                 cursor.execute('''
-                SELECT sr.*, s.x_position, s.y_position
-                FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.sensor_id
-                WHERE sr.sensor_id = ?
-                ORDER BY sr.timestamp DESC
-                LIMIT 1
+                SELECT sl.*, s.x_position, s.y_position
+                FROM sensor_latest sl
+                JOIN sensors s ON sl.sensor_id = s.sensor_id
+                WHERE sl.sensor_id = ?
                 ''', (sensor_id,))
             else:
-                # 使用子查询获取每个传感器的最新数据（兼容旧版本SQLite）
                 cursor.execute('''
-                SELECT sr.*, s.x_position, s.y_position
-                FROM sensor_readings sr
-                JOIN sensors s ON sr.sensor_id = s.sensor_id
-                WHERE sr.timestamp = (
-                    SELECT MAX(timestamp)
-                    FROM sensor_readings sr2
-                    WHERE sr2.sensor_id = sr.sensor_id
-                )
-                ORDER BY sr.sensor_id
+                SELECT sl.*, s.x_position, s.y_position
+                FROM sensor_latest sl
+                JOIN sensors s ON sl.sensor_id = s.sensor_id
+                ORDER BY sl.sensor_id
                 ''')
 
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
-        finally:
-            conn.close()
+    def get_sensor_stats(self, sensor_id: Optional[str] = None) -> List[Dict]:
+        """
+        传感器的增量统计：样本数、均值、方差、EWMA、最近一段时间的最小/最大值
+
+        直接读取内存中的统计量，不查询历史数据；没有统计模块时返回空列表。
+
+        Args:
+            sensor_id: 传感器ID，None表示所有传感器
+
+        Returns:
+            统计量列表（字段见 SensorRollingStats.get_many）
+        """
+        if self.rolling_stats is None:
+            return []
+        return self.rolling_stats.get_many(None if sensor_id is None else [sensor_id])
 
     def get_sensor_info(self) -> List[Dict]:
         """
@@ -105,16 +213,90 @@ class SensorDataReader:
         'created_at': '2025-12-10 06:42:40',
         'last_updated': '2025-12-11 19:34:10.585190'}]
         """
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        try:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute('SELECT * FROM sensors ORDER BY sensor_id')
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
-        finally:
-            conn.close()
+
+    def get_sensor_overview(self) -> List[Dict]:
+        """
+        一次查询获取所有传感器信息及其最新读数
+
+        Returns:
+            每个传感器一行：get_sensor_info 的各列加上 value, timestamp
+            （没有读数时为 None）
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute('''
+            SELECT s.*, sl.value, sl.timestamp
+            FROM sensors s
+            LEFT JOIN sensor_latest sl ON sl.sensor_id = s.sensor_id
+            ORDER BY s.sensor_id
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
+    # get_sensor_page 可排序的列
+    PAGE_SORT_COLUMNS = {
+        'sensor_id': 's.sensor_id',
+        'value': 'sl.value',
+        'timestamp': 'sl.timestamp',
+    }
+
+    def get_sensor_page(self, offset: int = 0, limit: int = 10,
+                        sort_by: str = 'sensor_id', descending: bool = False,
+                        prefix: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        分页获取传感器及其最新读数（服务端分页）
+
+        只返回一页的行，排序和分页都在 SQLite 中完成。
+
+        Args:
+            offset: 跳过的行数
+            limit: 本页行数
+            sort_by: 排序列，见 PAGE_SORT_COLUMNS
+            descending: 是否降序
+            prefix: 传感器ID前缀（不区分大小写），None表示全部
+
+        Returns:
+            (本页的行, 符合条件的传感器总数)
+        """
+        if sort_by not in self.PAGE_SORT_COLUMNS:
+            raise ValueError(f'不支持的排序列: {sort_by}')
+        direction = 'DESC' if descending else 'ASC'
+        # ID 的顺序与前缀索引相同：先按 ASCII 小写（SQLite 的 lower 只转换 ASCII），再按原ID
+        order = f'lower(s.sensor_id) {direction}, s.sensor_id {direction}'
+        if sort_by != 'sensor_id':
+            # 没有读数的传感器排在最后，相同值按ID排序
+            order = (f'sl.sensor_id IS NULL, {self.PAGE_SORT_COLUMNS[sort_by]} {direction}, '
+                     f'{order}')
+
+        where, params = '', []
+        if prefix:
+            # LIKE 只对 ASCII 不区分大小写，与前缀索引的 fold_case 一致
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where = "WHERE s.sensor_id LIKE ? ESCAPE '\\'"
+            params.append(escaped + '%')
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(f'SELECT COUNT(*) FROM sensors s {where}', params)
+            total = cursor.fetchone()[0]
+
+            cursor.execute(f'''
+            SELECT s.sensor_id, s.x_position, s.y_position, sl.value, sl.timestamp
+            FROM sensors s
+            LEFT JOIN sensor_latest sl ON sl.sensor_id = s.sensor_id
+            {where}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+            ''', params + [limit, offset])
+            rows = [dict(row) for row in cursor.fetchall()]
+        return rows, total
 
     def get_data_as_dataframe(self, sensor_id: Optional[str] = None,
                               start_time: Optional[datetime] = None,
@@ -122,6 +304,8 @@ class SensorDataReader:
         """
         获取数据为Pandas DataFrame格式
 
+        已归档的冷数据与数据库中的数据合并返回。
+
         Args:
             sensor_id: 传感器ID
             start_time: 开始时间
@@ -130,41 +314,226 @@ class SensorDataReader:
         Returns:
             DataFrame格式的数据
         """
-        conn = sqlite3.connect(self.db_path)
+        with self.pool.connection() as conn:
+            query, params = select_readings(self.schema(conn), sensor_id,
+                                            start_time, end_time)
+            df = pd.read_sql_query(query, conn, params=params)
 
-        try:
-            query = '''
-            SELECT sr.*, s.x_position, s.y_position
-            FROM sensor_readings sr
-            JOIN sensors s ON sr.sensor_id = s.sensor_id
-            WHERE 1=1
-            '''
-            params = []
+        # 转换时间列
+        if 'timestamp' in df.columns:
+            df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
+
+        if self.archive_dir:
+            archived = load_archive(self.archive_dir, sensor_id,
+                                    start_time, end_time)
+            if not archived.empty:
+                positions = pd.DataFrame(self.get_sensor_info(),
+                                         columns=['sensor_id', 'x_position', 'y_position'])
+                archived = archived.merge(positions, on='sensor_id')
+                if df.empty:
+                    df = archived
+                else:
+                    df = pd.concat([archived, df], ignore_index=True)
+
+        return df
+
+    def iter_chunks(self, sensor_id: Optional[str] = None,
+                    start_time: Optional[datetime] = None,
+                    end_time: Optional[datetime] = None,
+                    chunk_size: int = 10000,
+                    as_frame: bool = False) -> Iterator[Union[Dict[str, np.ndarray], pd.DataFrame]]:
+        """
+        按时间顺序分块遍历读数（含归档数据），内存占用与时间范围无关
 
-            if sensor_id:
-                query += ' AND sr.sensor_id = ?'
-                params.append(sensor_id)
+        数据库中的数据用键集分页逐页查询，v1 按 (timestamp, id)，v2 按 (ts, sensor_key)。
+        每页查询完即归还连接，生成器挂起期间不保持读事务，不会阻塞 WAL 检查点。
 
-            if start_time:
-                query += ' AND sr.timestamp >= ?'
-                params.append(start_time)
+        Args:
+            sensor_id: 传感器ID，None表示所有传感器
+            start_time: 开始时间
+            end_time: 结束时间
+            chunk_size: 每块的行数（最后一块可能更少）
+            as_frame: True 时每块为 DataFrame
 
-            if end_time:
-                query += ' AND sr.timestamp <= ?'
-                params.append(end_time)
+        Yields:
+            as_frame=False 时为 dict：sensor_id（object 数组）, ts（毫秒，int64）,
+            value（float64）；as_frame=True 时为 DataFrame，列为 sensor_id, value, timestamp
+        """
+        rows = self._iter_db_rows(sensor_id, start_time, end_time, chunk_size)
+        if self.archive_dir:
+            # 归档的都是更早的数据，先于数据库中的数据输出
+            rows = itertools.chain(
+                self._iter_archive_rows(sensor_id, start_time, end_time), rows)
+
+        while True:
+            batch = list(itertools.islice(rows, chunk_size))
+            if not batch:
+                return
+            sensor_ids, ts, values = zip(*batch)
+            chunk = {
+                'sensor_id': np.asarray(sensor_ids, dtype=object),
+                'ts': np.asarray(ts, dtype=np.int64),
+                'value': np.asarray(values, dtype=np.float64),
+            }
+            if as_frame:
+                chunk = pd.DataFrame({
+                    'sensor_id': chunk['sensor_id'],
+                    'value': chunk['value'],
+                    'timestamp': chunk['ts'].astype('datetime64[ms]'),
+                })
+            yield chunk
+
+    def export_csv(self, path: str, sensor_id: Optional[str] = None,
+                   start_time: Optional[datetime] = None,
+                   end_time: Optional[datetime] = None,
+                   chunk_size: int = 50000) -> int:
+        """
+        分块导出读数到 CSV 文件
 
-            query += ' ORDER BY sr.timestamp'
+        Returns:
+            导出的行数
+        """
+        total = 0
+        for i, df in enumerate(self.iter_chunks(sensor_id, start_time, end_time,
+                                                chunk_size, as_frame=True)):
+            df.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+            total += len(df)
+        if total == 0:
+            pd.DataFrame(columns=['sensor_id', 'value', 'timestamp']).to_csv(path, index=False)
+        return total
+
+    def _iter_archive_rows(self, sensor_id, start_time, end_time) -> Iterator[Tuple]:
+        """逐行输出归档数据 (sensor_id, ts, value)，每次只读取一天的文件"""
+        for df in iter_archive(self.archive_dir, sensor_id, start_time, end_time):
+            ts = df['timestamp'].to_numpy(dtype='datetime64[ms]').view(np.int64)
+            yield from zip(df['sensor_id'].tolist(), ts.tolist(), df['value'].tolist())
+
+    def _iter_db_rows(self, sensor_id, start_time, end_time,
+                      page_size: int) -> Iterator[Tuple]:
+        """逐行输出数据库中的读数 (sensor_id, ts, value)，按时间升序"""
+        if self.schema() == SCHEMA_V2:
+            query = 'SELECT sensor_key, sensor_id FROM sensor_keys'
+            params = []
+            if sensor_id:
+                query += ' WHERE sensor_id = ?'
+                params.append(sensor_id)
+            with self.pool.connection() as conn:
+                keys = conn.execute(query + ' ORDER BY sensor_key', params).fetchall()
+            if not keys:
+                return
+
+            # 读数按传感器聚簇存储，所有传感器按时间排序需要一次全量排序；
+            # 这里改为每个传感器各自分页，再按 (ts, sensor_key) 归并
+            per_sensor = max(page_size // len(keys), 256)
+            streams = [self._iter_sensor_v2(key, sid, start_time, end_time, per_sensor)
+                       for key, sid in keys]
+            for ts, _, sid, value in heapq.merge(*streams):
+                yield sid, ts, value
+            return
+
+        after = None
+        while True:
+            query, params = select_page(self.schema(), sensor_id, start_time,
+                                        end_time, after, page_size)
+            with self.pool.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
+            for _, sid, _, ts, value in rows:
+                yield sid, ts, value
+            if len(rows) < page_size:
+                return
+            after = (rows[-1][2], rows[-1][0])
+
+    def _iter_sensor_v2(self, sensor_key: int, sensor_id: str, start_time, end_time,
+                        page_size: int) -> Iterator[Tuple]:
+        """单个传感器的分页读数 (ts, sensor_key, sensor_id, value)"""
+        after = None
+        while True:
+            query, params = select_page(SCHEMA_V2, sensor_key, start_time,
+                                        end_time, after, page_size)
+            with self.pool.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
+            for ts, value in rows:
+                yield ts, sensor_key, sensor_id, value
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    def get_history(self, sensor_id: Optional[str] = None,
+                    start_time: Optional[datetime] = None,
+                    end_time: Optional[datetime] = None,
+                    max_points: int = 1000) -> pd.DataFrame:
+        """
+        按点数预算获取历史数据，自动选择原始数据或汇总表
 
-            df = pd.read_sql_query(query, conn, params=params)
+        每个传感器的点数不超过 max_points 时直接返回原始读数，
+        否则从 1分钟/1小时/1天 汇总表中选择满足预算的最细分辨率。
 
-            # 转换时间列
-            if 'timestamp' in df.columns:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
+        Args:
+            sensor_id: 传感器ID，None表示所有传感器
+            start_time: 开始时间，默认为结束时间前1小时
+            end_time: 结束时间，默认为当前时间
+            max_points: 每个传感器的最大点数
 
+        Returns:
+            DataFrame，列为 sensor_id, timestamp, value(均值), min, max, count, last，
+            df.attrs['resolution'] 为实际使用的分辨率（'raw' 表示原始数据）
+        """
+        end_time = end_time or datetime.now()
+        start_time = start_time or end_time - timedelta(hours=1)
+
+        resolution = choose_resolution(start_time, end_time, max_points)
+        if resolution == '1m' and self._estimate_raw_points(
+                sensor_id, start_time, end_time) <= max_points:
+            resolution = 'raw'
+
+        if resolution == 'raw':
+            df = self.get_data_as_dataframe(sensor_id, start_time, end_time)
+            df = df[['sensor_id', 'timestamp', 'value']].copy()
+            df['min'] = df['value']
+            df['max'] = df['value']
+            df['count'] = 1
+            df['last'] = df['value']
+            df.attrs['resolution'] = resolution
             return df
 
-        finally:
-            conn.close()
+        _, fmt = RESOLUTIONS[resolution]
+        query = f'''
+        SELECT sensor_id, bucket AS timestamp, sum / count AS value,
+               min, max, count, last
+        FROM {rollup_table(resolution)}
+        WHERE bucket >= ? AND bucket <= ?
+        '''
+        params = [start_time.strftime(fmt), end_time]
+        if sensor_id:
+            query += ' AND sensor_id = ?'
+            params.append(sensor_id)
+        query += ' ORDER BY bucket'
+
+        with self.pool.connection() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df.attrs['resolution'] = resolution
+        return df
+
+    def _estimate_raw_points(self, sensor_id: Optional[str],
+                             start_time: datetime, end_time: datetime) -> int:
+        """用1分钟汇总表估计时间范围内单个传感器的最大原始点数"""
+        _, fmt = RESOLUTIONS['1m']
+        query = f'''
+        SELECT COALESCE(MAX(n), 0) FROM (
+            SELECT SUM(count) AS n
+            FROM {rollup_table('1m')}
+            WHERE bucket >= ? AND bucket <= ?
+        '''
+        params = [start_time.strftime(fmt), end_time]
+        if sensor_id:
+            query += ' AND sensor_id = ?'
+            params.append(sensor_id)
+        query += ' GROUP BY sensor_id)'
+
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).fetchone()[0]
 
 
 def demo_reader():
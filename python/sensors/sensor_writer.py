@@ -3,19 +3,48 @@ import sqlite3
 import time
 import random
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Sequence
+
+import numpy as np
+
 from .log import logger
+from .storage import configure_connection, start_checkpoint_scheduler
+from .db_creator import ensure_schema
+from .ingest import (IngestQueue, as_datetime, as_epoch_ms, notify_ingest,
+                     notify_ingest_columns, store_columns, store_readings)
+from .schema import SCHEMA_V2, resolve_sensor_keys, schema_version
 
 
 class SensorDataWriter:
-    def __init__(self, db_path='db/sensor_data.db'):
+    def __init__(self, db_path='db/sensor_data.db', managed=True,
+                 buffered=False, **ingest_options):
+        """
+        Args:
+            db_path: 数据库文件路径
+            managed: 是否使用托管存储模式（WAL）
+            buffered: 是否使用组提交写入队列，读数由后台线程批量提交
+            ingest_options: 传给 IngestQueue 的参数（max_rows, max_delay, max_queue）
+        """
         self.db_path = db_path
+        self.managed = managed
         self._init_connection()
 
+        self.ingest = None
+        if buffered:
+            self.ingest = IngestQueue(db_path, managed=managed, **ingest_options)
+
     def _init_connection(self):
         """初始化数据库连接"""
-        self.conn = sqlite3.connect(self.db_path)
+        # 允许在专用线程中使用（见 util.async_db.async_serial），调用方保证串行
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if self.managed:
+            configure_connection(self.conn)
+            # 持续写入时由后台线程控制 WAL 文件大小
+            start_checkpoint_scheduler(self.db_path)
+        # 已有数据库缺少派生表时补建并回填
+        ensure_schema(self.conn)
         self.cursor = self.conn.cursor()
+        self.schema = schema_version(self.conn)
 
     def register_sensor(self, sensor_id: str, x: float, y: float):
         """注册新传感器"""
@@ -24,6 +53,8 @@ class SensorDataWriter:
             INSERT OR REPLACE INTO sensors (sensor_id, x_position, y_position, last_updated)
             VALUES (?, ?, ?, ?)
             ''', (sensor_id, x, y, datetime.now()))
+            if self.schema == SCHEMA_V2:
+                resolve_sensor_keys(self.cursor, [sensor_id])
             self.conn.commit()
             logger.debug(f"传感器 {sensor_id} 注册成功 - 位置({x}, {y})")
             return True
@@ -53,6 +84,9 @@ class SensorDataWriter:
                 logger.warning(f"传感器 {sensor_id} 不存在，无法删除")
                 return False
 
+            self.cursor.execute(
+                'DELETE FROM sensor_latest WHERE sensor_id = ?', (sensor_id,))
+
             self.conn.commit()
             logger.debug(f"传感器 {sensor_id} 删除成功")
             return True
@@ -65,24 +99,23 @@ class SensorDataWriter:
     def write_sensor_data(self, sensor_id: str, value: float,
                           timestamp: Optional[datetime] = None):
         """写入传感器数据"""
-        try:
-            if timestamp is None:
-                timestamp = datetime.now()
+        if self.ingest is not None:
+            try:
+                return self.ingest.put(sensor_id, value, timestamp)
+            except RuntimeError as e:
+                logger.error(f"写入数据失败: {e}")
+                return False
 
-            # 写入传感器读数
-            self.cursor.execute('''
-            INSERT INTO sensor_readings (sensor_id, value, timestamp)
-            VALUES (?, ?, ?)
-            ''', (sensor_id, value, timestamp))
+        try:
+            timestamp = as_datetime(timestamp)
 
-            # 更新传感器的最后更新时间
-            self.cursor.execute('''
-            UPDATE sensors 
-            SET last_updated = ?
-            WHERE sensor_id = ?
-            ''', (timestamp, sensor_id))
+            # 写入传感器读数，并更新派生表和传感器的最后更新时间
+            written = store_readings(self.cursor, [(sensor_id, value, timestamp)],
+                                     self.schema)
 
             self.conn.commit()
+            if written:
+                notify_ingest(written)
             return True
         except Exception as e:
             logger.error(f"写入数据失败: {e}")
@@ -90,37 +123,127 @@ class SensorDataWriter:
 
     def batch_write_data(self, sensor_data: list):
         """批量写入传感器数据"""
+        if self.ingest is not None:
+            readings = [(data['sensor_id'], data['value'], data.get('timestamp'))
+                        for data in sensor_data]
+            try:
+                return self.ingest.put_many(readings) == len(readings)
+            except RuntimeError as e:
+                logger.error(f"批量写入数据失败: {e}")
+                return False
+
         try:
             current_time = datetime.now()
 
-            # 批量插入读数
+            # 批量插入读数，没有时间戳的读数记为当前时间
             readings = [(data['sensor_id'], data['value'],
-                        data.get('timestamp', current_time))
+                        as_datetime(data.get('timestamp', current_time)))
                         for data in sensor_data]
 
-            self.cursor.executemany('''
-            INSERT INTO sensor_readings (sensor_id, value, timestamp)
-            VALUES (?, ?, ?)
-            ''', readings)
-
-            # 批量更新传感器最后更新时间
-            sensor_ids = list(set(data['sensor_id'] for data in sensor_data))
-            for sensor_id in sensor_ids:
-                self.cursor.execute('''
-                UPDATE sensors 
-                SET last_updated = ?
-                WHERE sensor_id = ?
-                ''', (current_time, sensor_id))
+            # 最后更新时间取每个传感器本批读数中最大的时间戳
+            written = store_readings(self.cursor, readings, self.schema)
 
             self.conn.commit()
+            if written:
+                notify_ingest(written)
             logger.debug(f"批量写入 {len(sensor_data)} 条数据成功")
             return True
         except Exception as e:
             logger.error(f"批量写入失败: {e}")
             return False
 
+    def write_columns(self, sensor_ids: Sequence[str], timestamps, values,
+                      chunk_rows: int = 200000) -> int:
+        """
+        列式批量写入（例如回放录制的数据）
+
+        三列为等长的数组；每 chunk_rows 条作为一个事务提交并通知写入监听器。
+        不经过写入队列，缓冲模式下也直接写入。
+
+        Args:
+            sensor_ids: 传感器ID
+            timestamps: 整数毫秒时间戳、datetime64 或 datetime 序列（见 ingest.as_epoch_ms），
+                None 表示全部为当前时间
+            values: 数值
+
+        Returns:
+            写入的条数，不含已有的重复读数（出错时为出错前已提交的条数）
+        """
+        sensor_ids = np.asarray(sensor_ids, dtype=object)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) != len(sensor_ids):
+            raise ValueError(f'数值有 {len(values)} 条，传感器ID有 {len(sensor_ids)} 条')
+        ts = as_epoch_ms(timestamps, len(sensor_ids))
+
+        written = 0
+        for start in range(0, len(ts), chunk_rows):
+            chunk = slice(start, start + chunk_rows)
+            try:
+                stored = store_columns(self.cursor, sensor_ids[chunk], ts[chunk],
+                                       values[chunk], self.schema)
+                self.conn.commit()
+            except Exception as e:
+                logger.error(f"列式写入失败: {e}")
+                self.conn.rollback()
+                return written
+            if len(stored[1]):
+                notify_ingest_columns(*stored)
+            written += len(stored[1])
+        logger.debug(f"列式写入 {written} 条数据成功")
+        return written
+
+    def write_record_batch(self, batch, sensor_column: str = 'sensor_id',
+                           timestamp_column: Optional[str] = 'timestamp',
+                           value_column: str = 'value', **options) -> int:
+        """
+        写入 Arrow 的 RecordBatch 或 Table（需要安装 pyarrow，本模块不直接依赖）
+
+        数值列和时间列尽量零拷贝地转换为 numpy 数组；时间列为整数毫秒或
+        不带时区的 timestamp 类型（本地时间），数值列不能有空值。
+
+        Args:
+            timestamp_column: 时间列名，None 或不存在时全部为当前时间
+            options: 传给 write_columns 的参数
+
+        Returns:
+            写入的条数
+        """
+        if hasattr(batch, 'to_batches'):
+            # Table 的列可能分成多块，逐个 RecordBatch 写入
+            return sum(self.write_record_batch(b, sensor_column, timestamp_column,
+                                               value_column, **options)
+                       for b in batch.to_batches())
+
+        names = batch.schema.names
+        timestamps = None
+        if timestamp_column is not None and timestamp_column in names:
+            field = batch.schema.field(timestamp_column)
+            if getattr(field.type, 'tz', None):
+                raise ValueError(f'时间列 {timestamp_column} 带有时区，需为本地时间')
+            timestamps = batch.column(names.index(timestamp_column)).to_numpy(
+                zero_copy_only=False)
+        return self.write_columns(
+            batch.column(names.index(sensor_column)).to_numpy(zero_copy_only=False),
+            timestamps,
+            batch.column(names.index(value_column)).to_numpy(zero_copy_only=False),
+            **options)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """提交写入队列中的数据（非缓冲模式下直接返回True）"""
+        if self.ingest is None:
+            return True
+        return self.ingest.flush(timeout)
+
+    def ingest_stats(self) -> dict:
+        """写入队列统计信息（队列长度、提交耗时等）"""
+        if self.ingest is None:
+            return {}
+        return self.ingest.stats()
+
     def close(self):
         """关闭数据库连接"""
+        if self.ingest is not None:
+            self.ingest.close()
         if hasattr(self, 'conn'):
             self.conn.close()
 
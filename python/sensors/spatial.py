@@ -0,0 +1,150 @@
+# spatial.py
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# (x0, y0, x1, y1)
+BBox = Tuple[float, float, float, float]
+
+
+def in_bbox(x: float, y: float, bbox: BBox) -> bool:
+    x0, y0, x1, y1 = bbox
+    return x0 <= x <= x1 and y0 <= y <= y1
+
+
+class GridIndex:
+    """
+    传感器位置的均匀网格索引
+
+    平面按 cell_size 划分为网格，每个格子保存其中的传感器。范围查询只检查
+    与矩形相交的格子；最近邻查询从所在格子按环向外搜索，找到 k 个且第 k 个
+    不远于已搜索范围时停止。插入、移动、删除都是 O(1)。
+
+    Args:
+        cell_size: 格子边长（与 x_position, y_position 同单位）
+    """
+
+    def __init__(self, cell_size: float = 0.01):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._positions: Dict[str, Tuple[float, float]] = {}
+        # 出现过的格子坐标范围 (min_cx, min_cy, max_cx, max_cy)，删除时不收缩
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, sensor_id: str) -> bool:
+        return sensor_id in self._positions
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def position(self, sensor_id: str) -> Optional[Tuple[float, float]]:
+        return self._positions.get(sensor_id)
+
+    def insert(self, sensor_id: str, x: float, y: float):
+        """添加传感器（已存在时移动到新位置）"""
+        old = self._positions.get(sensor_id)
+        if old is not None:
+            if old == (x, y):
+                return
+            self.remove(sensor_id)
+        self._positions[sensor_id] = (x, y)
+        cx, cy = self._cell(x, y)
+        self._cells.setdefault((cx, cy), set()).add(sensor_id)
+        if self._bounds is None:
+            self._bounds = (cx, cy, cx, cy)
+        else:
+            x0, y0, x1, y1 = self._bounds
+            self._bounds = (min(x0, cx), min(y0, cy), max(x1, cx), max(y1, cy))
+
+    def remove(self, sensor_id: str):
+        position = self._positions.pop(sensor_id, None)
+        if position is None:
+            return
+        cell = self._cell(*position)
+        members = self._cells[cell]
+        members.discard(sensor_id)
+        if not members:
+            del self._cells[cell]
+
+    def rebuild(self, positions: Iterable[Tuple[str, float, float]]):
+        """用 [(sensor_id, x, y), ...] 重建索引"""
+        self._cells.clear()
+        self._positions.clear()
+        self._bounds = None
+        for sensor_id, x, y in positions:
+            self.insert(sensor_id, x, y)
+
+    def bbox(self, x0: float, y0: float, x1: float, y1: float) -> List[str]:
+        """矩形 [x0, x1] x [y0, y1] 内的传感器"""
+        cx0, cy0 = self._cell(x0, y0)
+        cx1, cy1 = self._cell(x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # 矩形覆盖的格子比非空格子还多时，直接遍历非空格子
+            cells = [members for (cx, cy), members in self._cells.items()
+                     if cx0 <= cx <= cx1 and cy0 <= cy <= cy1]
+        else:
+            cells = [self._cells[(cx, cy)]
+                     for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)
+                     if (cx, cy) in self._cells]
+
+        result = []
+        for members in cells:
+            for sensor_id in members:
+                x, y = self._positions[sensor_id]
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    result.append(sensor_id)
+        return result
+
+    def nearest(self, x: float, y: float, k: int = 1,
+                max_distance: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        距离 (x, y) 最近的 k 个传感器
+
+        Returns:
+            [(sensor_id, 距离), ...]，按距离升序
+        """
+        if k <= 0 or not self._positions:
+            return []
+        cx, cy = self._cell(x, y)
+        bx0, by0, bx1, by1 = self._bounds
+        max_ring = max(cx - bx0, bx1 - cx, cy - by0, by1 - cy, 0)
+        if (2 * max_ring + 1) ** 2 > 4 * len(self._positions):
+            # 网格稀疏时逐个计算更快
+            candidates = ((math.hypot(px - x, py - y), sensor_id)
+                          for sensor_id, (px, py) in self._positions.items())
+            best = heapq.nsmallest(k, candidates)
+        else:
+            # 按距离取负的最大堆，保存目前最近的 k 个
+            heap: List[Tuple[float, str]] = []
+            for ring in range(max_ring + 1):
+                for cell in self._ring(cx, cy, ring):
+                    for sensor_id in self._cells.get(cell, ()):
+                        px, py = self._positions[sensor_id]
+                        distance = math.hypot(px - x, py - y)
+                        if len(heap) < k:
+                            heapq.heappush(heap, (-distance, sensor_id))
+                        elif distance < -heap[0][0]:
+                            heapq.heapreplace(heap, (-distance, sensor_id))
+                # 未搜索的格子距离至少为 ring * cell_size
+                if len(heap) == k and -heap[0][0] <= ring * self.cell_size:
+                    break
+            best = sorted((-d, sensor_id) for d, sensor_id in heap)
+
+        return [(sensor_id, distance) for distance, sensor_id in best
+                if max_distance is None or distance <= max_distance]
+
+    @staticmethod
+    def _ring(cx: int, cy: int, ring: int):
+        """以 (cx, cy) 为中心、切比雪夫距离为 ring 的格子"""
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
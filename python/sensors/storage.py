@@ -0,0 +1,154 @@
+# storage.py
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from .log import logger
+from .schema import prune_journal
+
+
+# 写入数据库文件、持久生效的设置（建库时和写连接上执行）
+DATABASE_PRAGMAS = {
+    'journal_mode': 'WAL',
+}
+
+# 每个连接都需要重新设置的选项
+CONNECTION_PRAGMAS = {
+    'synchronous': 'NORMAL',            # WAL 下 NORMAL 已足够安全
+    'busy_timeout': 5000,               # 毫秒，锁冲突时等待而不是立即报错
+    'mmap_size': 256 * 1024 * 1024,     # 读路径使用内存映射
+    'wal_autocheckpoint': 1000,         # 页数，写连接提交后自动执行 PASSIVE 检查点
+    'journal_size_limit': 64 * 1024 * 1024,  # 检查点后截断 WAL 文件到该大小
+}
+
+
+def configure_connection(conn: sqlite3.Connection, persistent: bool = True):
+    """
+    为连接设置托管存储模式（WAL）的 pragma
+
+    Args:
+        conn: 数据库连接
+        persistent: 是否同时设置持久化选项（journal_mode），只读连接可设为False
+    """
+    if persistent:
+        for name, value in DATABASE_PRAGMAS.items():
+            mode = conn.execute(f'PRAGMA {name} = {value}').fetchone()
+            if mode and str(mode[0]).upper() != str(value).upper():
+                logger.warning(f"设置 {name}={value} 失败，当前为 {mode[0]}")
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+class CheckpointScheduler:
+    """
+    WAL 检查点调度器
+
+    后台线程定期检查 WAL 文件大小：超过 passive_bytes 时执行 PASSIVE 检查点，
+    超过 truncate_bytes 时执行 TRUNCATE 检查点，保证持续写入时 WAL 不会无限增长。
+    同时删除 v2 写入日志（readings_journal）中的旧记录。
+    """
+
+    def __init__(self, db_path: str = 'db/sensor_data.db', interval: float = 30.0,
+                 passive_bytes: int = 16 * 1024 * 1024,
+                 truncate_bytes: int = 128 * 1024 * 1024):
+        self.db_path = db_path
+        self.interval = interval
+        self.passive_bytes = passive_bytes
+        self.truncate_bytes = truncate_bytes
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'runs': 0,
+            'passive': 0,
+            'truncate': 0,
+            'busy': 0,
+            'last_wal_bytes': 0,
+        }
+
+    @property
+    def wal_path(self) -> str:
+        return self.db_path + '-wal'
+
+    def wal_size(self) -> int:
+        """当前 WAL 文件大小（字节）"""
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+
+    def start(self):
+        """启动后台线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='wal-checkpoint',
+                                        daemon=True)
+        self._thread.start()
+        logger.info(f"WAL检查点调度器已启动: {self.db_path}")
+
+    def stop(self):
+        """停止后台线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+    def checkpoint(self, conn: sqlite3.Connection) -> Optional[str]:
+        """根据 WAL 大小执行一次检查点，返回执行的模式"""
+        size = self.wal_size()
+        self._stats['runs'] += 1
+        self._stats['last_wal_bytes'] = size
+
+        if size >= self.truncate_bytes:
+            mode = 'TRUNCATE'
+        elif size >= self.passive_bytes:
+            mode = 'PASSIVE'
+        else:
+            return None
+
+        busy, log_pages, checkpointed = conn.execute(
+            f'PRAGMA wal_checkpoint({mode})').fetchone()
+        self._stats[mode.lower()] += 1
+        if busy:
+            self._stats['busy'] += 1
+        logger.debug(f"WAL检查点 {mode}: wal={size}B, "
+                     f"log={log_pages}, checkpointed={checkpointed}, busy={busy}")
+        return mode
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            configure_connection(conn, persistent=False)
+            while not self._stop.wait(self.interval):
+                try:
+                    prune_journal(conn)
+                    self.checkpoint(conn)
+                except sqlite3.Error as e:
+                    logger.warning(f"WAL检查点失败: {e}")
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        stats = dict(self._stats)
+        stats['wal_bytes'] = self.wal_size()
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+
+_schedulers: Dict[str, CheckpointScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def start_checkpoint_scheduler(db_path: str = 'db/sensor_data.db',
+                               **kwargs) -> CheckpointScheduler:
+    """启动（或获取已启动的）进程内共享检查点调度器"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(db_path)
+        if scheduler is None:
+            scheduler = CheckpointScheduler(db_path, **kwargs)
+            _schedulers[db_path] = scheduler
+        scheduler.start()
+        return scheduler
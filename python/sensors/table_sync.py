@@ -0,0 +1,121 @@
+# table_sync.py
+import json
+from typing import Dict, List, Tuple
+
+from nicegui import ui
+
+
+def diff_rows(previous: Dict[str, Dict], rows: List[Dict],
+              key: str) -> Tuple[List[Dict], List[str], List[Dict]]:
+    """
+    比较两次的表格行
+
+    Args:
+        previous: 上次发送的行 {key: row}
+        rows: 本次的行
+        key: 行的唯一键（列名）
+
+    Returns:
+        (新增的行, 删除的键, 内容变化的行)
+    """
+    added, changed = [], []
+    for row in rows:
+        old = previous.get(row[key])
+        if old is None:
+            added.append(row)
+        elif old != row:
+            changed.append(row)
+
+    current = {row[key] for row in rows}
+    removed = [k for k in previous if k not in current]
+    return added, removed, changed
+
+
+# 在浏览器中修改表格元素的 rows（Vue 响应式数据，只重新渲染变化的行）
+_PATCH_JS = '''
+(() => {
+    const element = mounted_app.elements[%(id)d];
+    if (!element) return;
+    const key = %(key)s;
+    const removed = new Set(%(removed)s);
+    const rows = element.props.rows.filter((row) => !removed.has(row[key]));
+    const index = new Map(rows.map((row, i) => [row[key], i]));
+    for (const row of %(upserts)s) {
+        if (index.has(row[key])) Object.assign(rows[index.get(row[key])], row);
+        else rows.push(row);
+    }
+    element.props.rows = rows;
+})()
+'''
+
+
+class TableDeltaSync:
+    """
+    某个客户端表格的增量更新
+
+    记住上次发送给该客户端的行，之后只把新增、删除和变化的行发送到浏览器，
+    不再整体替换 rows。服务端的 rows 同步修改但不触发整表更新，
+    页面重连时仍能得到完整的表格。
+    """
+
+    def __init__(self, table: ui.table, key: str, full_ratio: float = 0.5):
+        """
+        Args:
+            table: 表格元素
+            key: 行的唯一键（列名）
+            full_ratio: 变化的行超过该比例时直接整表替换
+        """
+        self.table = table
+        self.key = key
+        self.full_ratio = full_ratio
+        self._last: Dict[str, Dict] = {}
+        self._stats = {'full': 0, 'delta': 0, 'unchanged': 0, 'rows_sent': 0}
+
+    def publish(self, rows: List[Dict]) -> int:
+        """
+        发送新的表格行
+
+        Returns:
+            发送的行数（删除的行按键计数）
+        """
+        added, removed, changed = diff_rows(self._last, rows, self.key)
+        sent = len(added) + len(removed) + len(changed)
+        if sent == 0:
+            self._stats['unchanged'] += 1
+            return 0
+
+        if not self._last or sent > len(rows) * self.full_ratio:
+            self.table.rows = [dict(row) for row in rows]
+            self._stats['full'] += 1
+            sent = len(rows)
+        else:
+            self._patch(added, removed, changed)
+            self._stats['delta'] += 1
+
+        self._last = {row[self.key]: row for row in rows}
+        self._stats['rows_sent'] += sent
+        return sent
+
+    def _patch(self, added: List[Dict], removed: List[str], changed: List[Dict]):
+        upserts = changed + added
+        # 服务端与浏览器做同样的修改，但不发送整表
+        with self.table.props.suspend_updates():
+            removed_keys = set(removed)
+            table_rows = [row for row in self.table.rows if row[self.key] not in removed_keys]
+            index = {row[self.key]: i for i, row in enumerate(table_rows)}
+            for row in upserts:
+                if row[self.key] in index:
+                    table_rows[index[row[self.key]]].update(row)
+                else:
+                    table_rows.append(dict(row))
+            self.table.rows = table_rows
+
+        self.table.client.run_javascript(_PATCH_JS % {
+            'id': self.table.id,
+            'key': json.dumps(self.key),
+            'removed': json.dumps(removed, ensure_ascii=False),
+            'upserts': json.dumps(upserts, ensure_ascii=False, default=str),
+        })
+
+    def stats(self) -> Dict:
+        return dict(self._stats)
@@ -1,32 +1,57 @@
 # sensors_ui.py
-from nicegui import ui, app
-from datetime import datetime, timedelta
 import asyncio
+from nicegui import ui, app
+from datetime import datetime
+from typing import List, Optional
 
+from util.async_db import async_reader, async_serial
+
+from .log import logger
 from .sensor_reader import SensorDataReader
 from .sensor_writer import SensorDataWriter
+from .schema import to_epoch_ms
+from .poller import SensorSnapshot, SensorSnapshotPoller
+from .table_sync import TableDeltaSync
+from .chart_sync import TrendChartSync, trend_chart_options
+from .liveness import STATUS_COLORS
+from .alerts import ALERT_COLORS, DANGER, RAISED, WARNING, AlertEngine
+
+# 详情卡片中当前值按告警级别显示的颜色
+VALUE_COLORS = {None: 'text-green-600', WARNING: 'text-orange-500', DANGER: 'text-red-600'}
 
 
 class SensorsUI:
-    def __init__(self, data_reader: SensorDataReader, writer: SensorDataWriter, rights: dict = {}):
+    def __init__(self, data_reader: SensorDataReader, writer: SensorDataWriter,
+                 poller: SensorSnapshotPoller, rights: dict = {},
+                 alerts: Optional[AlertEngine] = None):
         self.auto_refresh = True
-        self.reader = data_reader
-        self.writer = writer
+        # 数据库操作在线程池中执行，不阻塞事件循环
+        self.reader = async_reader(data_reader)
+        self.writer = async_serial(writer)
+        # 传感器列表来自进程内共享的快照轮询器，页面本身不轮询数据库
+        self.poller = poller
+        # 在线状态由轮询器维护的跟踪器给出，页面不再逐行计算
+        self.liveness = poller.liveness
+        # 告警由写入时评估的告警引擎给出，页面只订阅事件
+        self.alerts = alerts
         self.rights = rights
-        self.current_page = 1
-        self.page_size = 10
+        # 服务端分页：浏览器只收到当前页的行，rowsNumber 为符合条件的总数
+        self.pagination = {'page': 1, 'rowsPerPage': 10, 'sortBy': 'sensor_id',
+                           'descending': False, 'rowsNumber': 0}
+        self.page_ids: List[str] = []
         self.selected_sensor = None
-        self.refresh_interval = 5  # 自动刷新间隔（秒）
+        self.refresh_interval = poller.interval  # 自动刷新间隔（秒）
 
     async def create_sensors_page(self):
         """创建传感器页面"""
         # 页面标题
         with ui.row().classes('w-full'):
             ui.label('传感器管理系统').classes('text-2xl font-bold')
+            self.alert_badge = ui.badge('告警: 0', color='green').classes('self-center')
             ui.space()
             with ui.row().classes('items-center'):
                 ui.button('刷新数据', icon='refresh',
-                          on_click=self.refresh_data).classes('bg-green-500')
+                          on_click=self.force_refresh).classes('bg-green-500')
                 if self.rights.get('create_content', False):
                     ui.button('添加传感器', icon='add', on_click=self.show_add_sensor_dialog).classes(
                         'bg-blue-500')
@@ -42,18 +67,18 @@ class SensorsUI:
                         on_change=self.filter_sensors
                     ).classes('w-64')
 
-                    # self.time_filter = ui.select(
-                    #     options=[
-                    #         {'label': '最近1小时', 'value': 60},
-                    #         {'label': '最近6小时', 'value': 360},
-                    #         {'label': '最近24小时', 'value': 1440},
-                    #         {'label': '最近7天', 'value': 10080},
-                    #         {'label': '所有数据', 'value': 0}
-                    #     ],
-                    #     value=60,
-                    #     label='时间范围',
-                    #     on_change=self.refresh_data
-                    # ).classes('w-40')
+                    # 趋势图的时间范围（分钟），长时间范围在服务端降采样后再发送
+                    self.time_filter = ui.select(
+                        options={
+                            60: '最近1小时',
+                            360: '最近6小时',
+                            1440: '最近24小时',
+                            10080: '最近7天',
+                        },
+                        value=60,
+                        label='时间范围',
+                        on_change=self.on_time_range_change
+                    ).classes('w-40')
 
                     ui.space()
                     ui.switch('自动刷新', value=True, on_change=self.toggle_auto_refresh).classes(
@@ -82,20 +107,24 @@ class SensorsUI:
                     rows=[],
                     row_key='sensor_id',
                     selection='single',
-                    pagination={'rowsPerPage': 10},
+                    pagination=dict(self.pagination),
                     on_select=self.on_sensor_select
                 ).classes('w-full h-96').props('''
                     dense
                     flat
                     bordered
                     row-key="sensor_id"
-                    :pagination.sync="pagination"
                     :rows-per-page-options="[10, 20, 50, 100]"
                 ''')
+                # 翻页、排序、修改每页行数时由服务端取对应的一页
+                self.table.on('request', self.on_table_request, ['pagination'])
+
+                # 每个客户端只接收变化的行
+                self.table_sync = TableDeltaSync(self.table, key='sensor_id')
 
                 self.table.add_slot('body-cell-status', '''
                     <q-td key="status" :props="props">
-                        <q-badge :color="props.value ==='在线'? 'green' : 'red'">
+                        <q-badge :color="{'在线': 'green', '延迟': 'orange'}[props.value] || 'red'">
                             {{ props.value }}
                         </q-badge>
                     </q-td>
@@ -117,9 +146,14 @@ class SensorsUI:
                                 '位置: -').classes('text-gray-600')
                             self.detail_status = ui.chip(
                                 '离线', color='red').props('outline')
+                            self.detail_alert = ui.chip(
+                                '正常', color='green').props('outline')
 
                         self.detail_last_update = ui.label(
                             '最后更新: -').classes('text-sm text-gray-500')
+                        # 写入路径维护的增量统计，不查询历史数据
+                        self.detail_stats = ui.label(
+                            '统计: -').classes('text-sm text-gray-600')
 
                         with ui.row().classes('w-full justify-end mt-2'):
                             # ui.button('查看历史', icon='history', on_click=self.show_history).props('flat')
@@ -138,69 +172,131 @@ class SensorsUI:
                     #     '图表区域 - 需要echarts扩展').classes('text-center text-gray-400')
                     # ui.linear_progress().props('indeterminate').classes('mt-2')
 
-                    self.echart = ui.echart({
-                        'xAxis': {
-                            'type': 'category',
-                            'name': '时间'
-                        },
-                        'yAxis': {
-                            'type': 'value',
-                            'name': '数值'
-                        }
-                    })
+                    # 时间轴，刷新时只追加新的点（见 sensors.chart_sync）
+                    self.echart = ui.echart(trend_chart_options())
+                    self.chart_sync = TrendChartSync(self.echart, window_ms=60 * 60 * 1000)
 
         # 初始化数据
-        await self.refresh_data()
-
-        # 启动自动刷新
-        self.auto_refresh_task = asyncio.create_task(self.auto_refresh_loop())
-
-    async def load_sensor_data(self):
-        """加载传感器数据"""
+        await self.refresh_data(reload_page=True)
+
+        # 订阅共享轮询器的快照，页面关闭时取消订阅
+        unsubscribe = self.poller.subscribe(self.on_snapshot)
+        ui.context.client.on_delete(unsubscribe)
+
+        # 告警事件在写入线程中产生，转到事件循环后更新本页面
+        if self.alerts is not None:
+            loop = asyncio.get_running_loop()
+            client = ui.context.client
+
+            def on_alerts(events):
+                loop.call_soon_threadsafe(self.show_alerts, client, events)
+
+            self.alerts.add_listener(on_alerts)
+            client.on_delete(lambda: self.alerts.remove_listener(on_alerts))
+            self.update_alert_badge()
+
+    def update_alert_badge(self):
+        """标题旁的未解除告警数"""
+        active = self.alerts.active()
+        danger = any(alert['level'] == DANGER for alert in active)
+        self.alert_badge.set_text(f'告警: {len(active)}')
+        self.alert_badge.props(
+            f"color={'red' if danger else 'orange' if active else 'green'}")
+
+    def show_alerts(self, client, events):
+        """告警产生或解除时提示，并更新告警数和当前传感器的详情"""
+        if client.is_deleted:
+            return
+        with client:
+            self.update_alert_badge()
+            # 一批读数可能产生大量事件，只逐条提示前几条
+            for event in events[:5]:
+                level = event['level'] if event['state'] == RAISED else event['previous']
+                action = '告警' if event['state'] == RAISED else '解除'
+                ui.notify(f"{event['sensor_id']} {level}{action}: {event['value']:.2f}",
+                          type='negative' if event['state'] == RAISED else 'positive')
+            if len(events) > 5:
+                ui.notify(f'另有 {len(events) - 5} 条告警变化')
+            if any(event['sensor_id'] == self.selected_sensor for event in events):
+                self.update_alert_detail(self.selected_sensor)
+
+    def update_alert_detail(self, sensor_id: str):
+        """详情卡片中的告警级别和阈值"""
+        if self.alerts is None:
+            return
+        level = self.alerts.level(sensor_id)
+        limits = self.alerts.thresholds(sensor_id)
+        text = level or '正常'
+        if limits['warning'] is not None:
+            text += f" (警戒 {limits['warning']:g}"
+            if limits['danger'] is not None:
+                text += f" / 危险 {limits['danger']:g}"
+            text += ')'
+        self.detail_alert.set_text(text)
+        self.detail_alert.props(f'color={ALERT_COLORS[level]}')
+
+    async def load_page(self, snapshot: SensorSnapshot):
+        """
+        确定当前页显示哪些传感器
+
+        按ID排序时用快照的前缀索引直接取出一页；按数值、更新时间或状态排序时
+        由 SQLite 排序并只返回一页。
+        """
+        pagination = self.pagination
+        prefix = (self.search_input.value or '').strip()
+        limit = pagination['rowsPerPage']
+        offset = (pagination['page'] - 1) * limit
+        sort_by = pagination.get('sortBy') or 'sensor_id'
+        descending = bool(pagination.get('descending'))
+        if sort_by == 'status':
+            # 状态由更新时间决定，升序（在线在前）即更新时间降序
+            sort_by, descending = 'timestamp', not descending
+
+        if sort_by == 'sensor_id':
+            self.page_ids = snapshot.index.page(prefix, offset, limit, descending)
+            total = snapshot.index.count(prefix)
+        else:
+            rows, total = await self.reader.get_sensor_page(
+                offset, limit, sort_by, descending, prefix)
+            self.page_ids = [row['sensor_id'] for row in rows]
+        pagination['rowsNumber'] = total
+
+        # 删除传感器或搜索后当前页超出范围时，退回最后一页
+        if not self.page_ids and total and pagination['page'] > 1:
+            pagination['page'] = (total - 1) // limit + 1
+            await self.load_page(snapshot)
+
+    async def load_sensor_data(self, snapshot: Optional[SensorSnapshot] = None,
+                               reload_page: bool = False):
+        """
+        加载当前页的传感器数据
+
+        Args:
+            reload_page: 是否重新确定当前页的传感器（翻页、排序、搜索时）；
+                按ID排序时代价很小，每次都重新确定
+        """
         try:
-            # 获取传感器基本信息
-            sensors = self.reader.get_sensor_info()
-
-            # 获取每个传感器的最新数据
-            latest_data = self.reader.get_latest_data()
-            latest_dict = {data['sensor_id']: data for data in latest_data}
+            snapshot = snapshot or await self.poller.current()
+            if reload_page or (self.pagination.get('sortBy') or 'sensor_id') == 'sensor_id':
+                await self.load_page(snapshot)
 
-            # 准备表格数据
+            # 准备表格数据（只有当前页）
             rows = []
-            for sensor in sensors:
-                sensor_id = sensor['sensor_id']
-                latest = latest_dict.get(sensor_id, {})
-
-                # 判断传感器状态（基于最后更新时间）
-                status = '在线'
-                color = 'green'
-                if 'timestamp' in latest:
-                    last_update = datetime.fromisoformat(
-                        latest['timestamp'].replace('Z', '+00:00'))
-                    time_diff = datetime.now() - last_update
-                    if time_diff > timedelta(minutes=5):
-                        status = '离线'
-                        color = 'red'
-                    elif time_diff > timedelta(minutes=1):
-                        status = '延迟'
-                        color = 'orange'
-                else:
-                    # The sensor has never been mentioned
-                    status = '离线'
-                    color = 'red'
-
+            for sensor_id in self.page_ids:
+                sensor = snapshot.by_id.get(sensor_id)
+                if sensor is None:
+                    # 已被删除，下次翻页时不再出现
+                    continue
+                latest = snapshot.latest.get(sensor_id, {})
+
+                # 只包含表格显示的字段，减少发送到浏览器的数据
                 rows.append({
                     'sensor_id': sensor_id,
                     'value': f"{latest.get('value', 'N/A'):.2f}" if 'value' in latest else 'N/A',
                     'position': f"({sensor['x_position']:.1f}, {sensor['y_position']:.1f})",
                     'timestamp': latest.get('timestamp', 'N/A'),
-                    'status': status,
-                    '_status_color': color,
+                    'status': self.liveness.state(sensor_id),
                     'actions': '--',
-                    '_raw_data': {
-                        'sensor': sensor,
-                        'latest': latest
-                    }
                 })
 
             return rows
@@ -241,37 +337,45 @@ class SensorsUI:
 
         return formatted_rows
 
-    async def refresh_data(self):
+    async def refresh_data(self, snapshot: Optional[SensorSnapshot] = None,
+                           reload_page: bool = False):
         """刷新表格数据"""
         try:
             # 显示加载状态
             # ui.notify('正在刷新数据...', type='info', position='top')
 
-            # 加载数据
-            rows = await self.load_sensor_data()
-
-            # 应用搜索筛选
-            search_text = self.search_input.value.lower() if self.search_input.value else ''
-            if search_text:
-                # rows = [r for r in rows if search_text in r['sensor_id'].lower()]
-                rows = [
-                    r for r in rows if r['sensor_id'].lower().startswith(search_text)]
+            # 加载数据（搜索筛选和分页已在 load_page 中完成）
+            rows = await self.load_sensor_data(snapshot, reload_page)
 
-            # 格式化数据
-            formatted_rows = self.format_table_rows(rows)
+            # 页码、排序或总数变化时更新分页
+            if self.table.pagination != self.pagination:
+                self.table.pagination = dict(self.pagination)
 
-            # 更新表格
-            self.table.rows = rows
+            # 更新表格（只发送变化的行）
+            self.table_sync.publish(rows)
 
             # 如果有选中的传感器，更新详情
             if self.selected_sensor:
-                await self.update_sensor_detail(self.selected_sensor)
+                await self.update_sensor_detail(self.selected_sensor, snapshot)
 
             # ui.notify(f'已更新 {len(rows)} 个传感器的数据', type='positive')
 
         except Exception as e:
-            # ui.notify(f'刷新失败: {str(e)}', type='negative')
-            pass
+            logger.error(f"刷新传感器表格失败: {e!r}")
+
+    async def on_snapshot(self, snapshot: SensorSnapshot):
+        """共享轮询器推送的新快照（在轮询任务中调用，需要进入本页面的上下文）"""
+        client = self.table.client
+        if not self.auto_refresh or client.is_deleted:
+            return
+        with client:
+            await self.refresh_data(snapshot)
+
+    async def force_refresh(self):
+        """立即重新查询（新快照会推送给所有打开的页面）"""
+        snapshot = await self.poller.refresh()
+        if not self.auto_refresh:
+            await self.refresh_data(snapshot)
 
     async def on_sensor_select(self, event):
         """传感器选中事件"""
@@ -280,18 +384,17 @@ class SensorsUI:
             self.selected_sensor = sensor_id
             await self.update_sensor_detail(sensor_id)
 
-    async def update_sensor_detail(self, sensor_id):
+    async def update_sensor_detail(self, sensor_id, snapshot: Optional[SensorSnapshot] = None):
         """更新传感器详情"""
         try:
+            snapshot = snapshot or await self.poller.current()
+
             # 获取传感器信息
-            sensors = self.reader.get_sensor_info()
-            sensor_info = next(
-                (s for s in sensors if s['sensor_id'] == sensor_id), None)
+            sensor_info = snapshot.by_id.get(sensor_id)
 
             if sensor_info:
                 # 获取最新数据
-                latest_data = self.reader.get_latest_data(sensor_id)
-                latest = latest_data[0] if latest_data else {}
+                latest = snapshot.latest.get(sensor_id, {})
 
                 # 更新详情显示
                 self.detail_id.set_text(f'传感器ID: {sensor_id}')
@@ -300,16 +403,11 @@ class SensorsUI:
                     value = latest['value']
                     self.detail_value.set_text(f'当前值: {value:.2f}')
 
-                    # 根据数值改变颜色
-                    if value > 30:
-                        self.detail_value.classes(
-                            replace='text-red-600 text-2xl font-bold')
-                    elif value > 25:
-                        self.detail_value.classes(
-                            replace='text-orange-500 text-2xl font-bold')
-                    else:
-                        self.detail_value.classes(
-                            replace='text-green-600 text-2xl font-bold')
+                    # 根据告警级别改变颜色（阈值见告警引擎）
+                    level = self.alerts.level(sensor_id) if self.alerts else None
+                    self.detail_value.classes(
+                        replace=f'{VALUE_COLORS[level]} text-2xl font-bold')
+                self.update_alert_detail(sensor_id)
 
                 self.detail_position.set_text(
                     f"位置: ({sensor_info['x_position']:.1f}, {sensor_info['y_position']:.1f})")
@@ -318,76 +416,74 @@ class SensorsUI:
                     self.detail_last_update.set_text(
                         f'最后更新: {latest["timestamp"]}')
 
-                    # 更新状态
-                    last_update = datetime.fromisoformat(
-                        latest['timestamp'].replace('Z', '+00:00'))
-                    time_diff = datetime.now() - last_update
-
-                    if time_diff <= timedelta(minutes=1):
-                        self.detail_status.set_text('在线')
-                        self.detail_status.props('color=green')
-                    elif time_diff <= timedelta(minutes=5):
-                        self.detail_status.set_text('延迟')
-                        self.detail_status.props('color=orange')
-                    else:
-                        self.detail_status.set_text('离线')
-                        self.detail_status.props('color=red')
-
-                sensor_data = self.reader.get_recent_data(sensor_id)
-                # 提取时间和数值数据
-                times = []
-                values = []
-
-                if sensor_data:
-                    # 假设每个传感器有多个历史数据点
-                    for data_point in sensor_data:
-                        # 时间数据（转换为合适格式）
-                        timestamp = data_point.get('timestamp', '')
-                        # # 如果是datetime对象，转换为字符串
-                        # if hasattr(timestamp, 'strftime'):
-                        #     time_str = timestamp.strftime('%H:%M:%S')
-                        # else:
-                        # 假设timestamp是ISO格式字符串，如 '2024-01-15T10:30:00'
-                        timestamp_dt = datetime.fromisoformat(
-                            timestamp)
-
-                        # 计算与当前时间的差值
-                        current_time = datetime.now()
-                        time_difference = current_time - timestamp_dt
-                        seconds_int = int(time_difference.total_seconds())
-                        time_str = str(seconds_int)
-                        # time_str = str(timestamp)
-
-                        times.append(time_str)
-                        values.append(data_point.get('value', 0))
-
-                self.echart.options['xAxis']['data'] = times
-                self.echart.options['series'] = [{
-                    'type': 'line',
-                    'data': values,
-                    'name': 'temp_001'
-                }]
-                self.echart.update()
+                stats = await self.reader.get_sensor_stats(sensor_id)
+                self.detail_stats.set_text(self.format_stats(stats[0]) if stats else '统计: -')
+
+                # 更新状态
+                status = self.liveness.state(sensor_id)
+                self.detail_status.set_text(status)
+                self.detail_status.props(f'color={STATUS_COLORS[status]}')
+
+                # 趋势图：切换传感器或时间范围时整体加载（按图表宽度降采样），
+                # 之后只取上次之后的新读数
+                now_ms = to_epoch_ms(datetime.now())
+                if self.chart_sync.sensor_id != sensor_id or self.chart_sync.needs_reset():
+                    max_points = await self.chart_point_budget()
+                    ts, values = await self.reader.get_chart_series(
+                        sensor_id, minutes=self.time_filter.value, max_points=max_points)
+                    self.chart_sync.reset(sensor_id, ts, values, now_ms, max_points)
+                else:
+                    ts, values = await self.reader.get_readings_after(
+                        sensor_id, self.chart_sync.last_ts)
+                    self.chart_sync.append(ts, values, now_ms)
 
         except Exception as e:
             ui.notify(f'更新详情失败: {str(e)}', type='negative')
 
+    @staticmethod
+    def format_stats(stats: dict) -> str:
+        """详情卡片中的统计量文字"""
+        text = f"均值: {stats['mean']:.2f}"
+        if stats['std'] is not None:
+            text += f" ± {stats['std']:.2f}"
+        text += f" | EWMA: {stats['ewma']:.2f}"
+        if stats['min'] is not None:
+            text += f" | 最近1小时: {stats['min']:.2f} ~ {stats['max']:.2f}"
+        return text + f" | 样本数: {stats['count']}"
+
+    async def chart_point_budget(self) -> int:
+        """趋势图的点数预算：每个像素一个点"""
+        try:
+            width = await self.echart.run_chart_method('getWidth')
+            return max(int(width), 100)
+        except Exception:
+            return self.chart_sync.max_points
+
+    async def on_time_range_change(self, event):
+        """切换趋势图的时间范围"""
+        self.chart_sync.window_ms = event.value * 60 * 1000
+        self.chart_sync.invalidate()
+        if self.selected_sensor:
+            await self.update_sensor_detail(self.selected_sensor)
+
+    async def on_table_request(self, event):
+        """表格翻页、排序（服务端分页）"""
+        pagination = event.args['pagination']
+        for key in ('page', 'rowsPerPage', 'sortBy', 'descending'):
+            if key in pagination:
+                self.pagination[key] = pagination[key]
+        await self.refresh_data(reload_page=True)
+
     async def filter_sensors(self):
-        """过滤传感器"""
-        await self.refresh_data()
+        """按ID前缀过滤传感器，回到第一页"""
+        self.pagination['page'] = 1
+        await self.refresh_data(reload_page=True)
 
-    def change_page(self, page):
+    async def change_page(self, page):
         """切换页面"""
         if page > 0:
-            self.current_page = page
-            # 这里可以添加分页逻辑
-
-    async def auto_refresh_loop(self):
-        """自动刷新循环"""
-        while True:
-            await asyncio.sleep(self.refresh_interval)
-            if hasattr(self, 'auto_refresh') and self.auto_refresh:
-                await self.refresh_data()
+            self.pagination['page'] = page
+            await self.refresh_data(reload_page=True)
 
     def toggle_auto_refresh(self, event):
         """切换自动刷新"""
@@ -436,14 +532,13 @@ class SensorsUI:
         try:
             # Prevent insert existing sensor.
             if not allow_existing:
-                sensors = self.reader.get_sensor_info()
-                for s in sensors:
-                    assert s['sensor_id'] != sensor_id, f'Sensor({sensor_id}) exists.'
+                snapshot = await self.poller.current()
+                assert sensor_id not in snapshot.by_id, f'Sensor({sensor_id}) exists.'
             # 这里需要调用写入器添加传感器
-            self.writer.register_sensor(sensor_id, x, y)
+            await self.writer.register_sensor(sensor_id, x, y)
             ui.notify(f'传感器 {sensor_id} 操作成功', type='positive')
             dialog.close()
-            await self.refresh_data()
+            await self.force_refresh()
         except Exception as e:
             ui.notify(f'添加失败: {str(e)}', type='negative')
 
@@ -453,22 +548,17 @@ class SensorsUI:
             ui.notify(f'显示 {self.selected_sensor} 的历史数据', type='info')
             # 这里可以打开历史数据对话框或跳转到历史页面
 
-    def show_edit_dialog(self):
+    async def show_edit_dialog(self):
         """显示编辑对话框"""
         if not self.selected_sensor:
             return
 
         sensor_id = self.selected_sensor
-        sensors = self.reader.get_sensor_info()
-        x = None
-        y = None
-        for s in sensors:
-            if s['sensor_id'] == sensor_id:
-                x = s['x_position']
-                y = s['y_position']
-                break
-        if x is None or y is None:
+        sensor = (await self.poller.current()).by_id.get(sensor_id)
+        if sensor is None:
             return
+        x = sensor['x_position']
+        y = sensor['y_position']
 
         with ui.dialog() as dialog, ui.card().classes('p-6 w-96'):
             ui.label('添加新传感器').classes('text-xl font-bold mb-4')
@@ -492,9 +582,9 @@ class SensorsUI:
         """显示删除对话框"""
         if not self.selected_sensor:
             return
-        if self.writer.delete_sensor(self.selected_sensor):
+        if await self.writer.delete_sensor(self.selected_sensor):
             ui.notify(f'删除 {self.selected_sensor}', type='warning')
-            await self.refresh_data()
+            await self.force_refresh()
         else:
             ui.notify(f'删除 {self.selected_sensor}', type='error')
         return
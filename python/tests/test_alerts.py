@@ -0,0 +1,177 @@
+# test_alerts.py
+import sqlite3
+
+import numpy as np
+import pytest
+
+from sensors.alerts import CLEARED, DANGER, RAISED, RATE, WARNING, AlertEngine, AlertLog
+from sensors.schema import from_epoch_ms
+
+BASE = 1_700_000_000_000
+
+
+def feed(engine, sensor_id, values, start=0, step=1000):
+    """按 step 毫秒的间隔送入一个传感器的一串读数，返回产生的事件"""
+    n = len(values)
+    ts = BASE + start + np.arange(n, dtype=np.int64) * step
+    return engine.evaluate([sensor_id] * n, ts, np.asarray(values, dtype=float))
+
+
+def summary(events):
+    return [(e['sensor_id'], e['rule'], e['state'], e['level'], e['previous']) for e in events]
+
+
+def test_no_thresholds_means_no_alerts():
+    engine = AlertEngine()
+    assert feed(engine, 'a', [0, 1e6, 1e9, 0]) == []
+    assert engine.thresholds('a') == {'clear': None, 'warning': None, 'danger': None}
+
+
+def test_warning_hysteresis():
+    engine = AlertEngine(warning=10, danger=20, hysteresis=0.1, debounce=1)
+    events = feed(engine, 'a', [5, 10])
+    assert summary(events) == [('a', 'threshold', RAISED, WARNING, None)]
+    assert events[0]['threshold'] == 10
+    # 回落到解除阈值 9 以上仍保持
+    assert feed(engine, 'a', [9.5, 9.0, 9.99], start=2000) == []
+    assert engine.level('a') == WARNING
+    events = feed(engine, 'a', [8.9], start=5000)
+    assert summary(events) == [('a', 'threshold', CLEARED, None, WARNING)]
+    assert events[0]['threshold'] == pytest.approx(9.0)
+
+
+def test_danger_hysteresis_steps_down_to_warning():
+    engine = AlertEngine(warning=10, danger=20, hysteresis=0.1, debounce=1)
+    assert summary(feed(engine, 'a', [25])) == [('a', 'threshold', RAISED, DANGER, None)]
+    # 危险级别的解除阈值为 18
+    assert feed(engine, 'a', [19, 18], start=1000) == []
+    events = feed(engine, 'a', [15], start=3000)
+    assert summary(events) == [('a', 'threshold', CLEARED, WARNING, DANGER)]
+    events = feed(engine, 'a', [1], start=4000)
+    assert summary(events) == [('a', 'threshold', CLEARED, None, WARNING)]
+
+
+def test_safe_threshold_from_gas_database():
+    engine = AlertEngine(hysteresis=0.1, debounce=1)
+    gases = [{'分子式': 'CO', '气体名称': '一氧化碳', 'CAS号': '630-08-0',
+              '安全阈值': '5 ppm', '警戒浓度': '30 ppm', '危险浓度': '1,500 ppm'}]
+    engine.set_gases(gases, {'co-': 'CO', 'x-': 'unknown'})
+    assert engine.thresholds('co-1') == {'clear': 5.0, 'warning': 30.0, 'danger': 1500.0}
+    assert engine.thresholds('x-1')['warning'] is None
+    feed(engine, 'co-1', [30])
+    # 解除阈值为安全阈值而不是 27
+    assert feed(engine, 'co-1', [6], start=1000) == []
+    assert summary(feed(engine, 'co-1', [4], start=2000)) == \
+        [('co-1', 'threshold', CLEARED, None, WARNING)]
+
+
+def test_debounce_needs_consecutive_readings():
+    engine = AlertEngine(warning=10, danger=20, debounce=3)
+    # 越限与回落交替时不告警
+    assert feed(engine, 'a', [11, 11, 1, 11, 11, 1]) == []
+    events = feed(engine, 'a', [11, 11, 11], start=6000)
+    assert summary(events) == [('a', 'threshold', RAISED, WARNING, None)]
+    # 第三条连续越限的读数触发
+    assert events[0]['timestamp'] == from_epoch_ms(BASE + 8000)
+    assert feed(engine, 'a', [1, 1], start=9000) == []
+    assert summary(feed(engine, 'a', [1], start=11000)) == \
+        [('a', 'threshold', CLEARED, None, WARNING)]
+
+
+def test_debounce_jumps_straight_to_highest_level():
+    engine = AlertEngine(warning=10, danger=20, debounce=2)
+    events = feed(engine, 'a', [11, 25])
+    assert summary(events) == [('a', 'threshold', RAISED, DANGER, None)]
+
+
+def test_duplicate_and_stale_readings_are_evaluated_once():
+    engine = AlertEngine(warning=10, debounce=2)
+    ts = BASE + np.array([0, 1000], dtype=np.int64)
+    values = np.array([11.0, 11.0])
+    events = engine.evaluate(['a', 'a'], ts, values)
+    assert len(events) == 1
+    # 同一批读数再次送入（例如同进程写入后又被数据库轮询读到）
+    assert engine.evaluate(['a', 'a'], ts, values) == []
+    # 比已评估的读数旧的读数被忽略
+    assert engine.evaluate(['a'], ts[:1] - 5000, np.array([0.0])) == []
+    assert engine.evaluate(['a'], ts[:1] - 4000, np.array([0.0])) == []
+    assert engine.level('a') == WARNING
+    assert engine.stats()['active'] == 1
+
+
+def test_unordered_batch_is_evaluated_in_time_order():
+    engine = AlertEngine(warning=10, debounce=2)
+    ts = BASE + np.array([3000, 0, 2000, 1000], dtype=np.int64)
+    values = np.array([1.0, 11.0, 1.0, 11.0])
+    events = engine.evaluate(['a'] * 4, ts, values)
+    # 0, 1000 两条越限后告警，2000, 3000 两条回落后解除
+    assert [e['state'] for e in events] == [RAISED, CLEARED]
+    assert events[0]['timestamp'] < events[1]['timestamp']
+
+
+def test_sensors_are_independent_within_a_batch():
+    engine = AlertEngine(warning=10, debounce=1)
+    events = engine.evaluate(['a', 'b', 'a', 'b'], BASE + np.array([0, 0, 1000, 1000]),
+                             np.array([11.0, 1.0, 1.0, 12.0]))
+    assert sorted(summary(events)) == [('a', 'threshold', CLEARED, None, WARNING),
+                                       ('a', 'threshold', RAISED, WARNING, None),
+                                       ('b', 'threshold', RAISED, WARNING, None)]
+
+
+def test_rate_rule_with_hysteresis():
+    engine = AlertEngine(max_rate=1.0, hysteresis=0.5, debounce=1)
+    # 第一条读数没有变化率
+    assert feed(engine, 'a', [100]) == []
+    events = feed(engine, 'a', [102], start=1000)
+    assert summary(events) == [('a', 'rate', RAISED, RATE, None)]
+    # 解除阈值为 0.5 / 秒
+    assert feed(engine, 'a', [102.6], start=2000) == []
+    assert summary(feed(engine, 'a', [102.7], start=3000)) == \
+        [('a', 'rate', CLEARED, None, RATE)]
+
+
+def test_listeners_and_remove():
+    engine = AlertEngine(warning=10, max_rate=1.0, debounce=1)
+    received = []
+    engine.add_listener(received.extend)
+    feed(engine, 'a', [0, 50])
+    assert sorted(e['rule'] for e in received) == ['rate', 'threshold']
+    assert [alert['sensor_id'] for alert in engine.active()] == ['a']
+
+    received.clear()
+    events = engine.remove('a')
+    assert sorted(summary(events)) == [('a', 'rate', CLEARED, None, RATE),
+                                       ('a', 'threshold', CLEARED, None, WARNING)]
+    assert received == events
+    assert engine.active() == []
+    # 同ID的传感器重新出现时从头开始评估
+    assert feed(engine, 'a', [0], start=-10000) == []
+    assert engine.remove('missing') == []
+
+
+def test_restore_from_log(tmp_path):
+    db_path = str(tmp_path / 'alerts.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE sensors (sensor_id TEXT PRIMARY KEY)')
+    conn.executemany('INSERT INTO sensors VALUES (?)', [('a',), ('b',)])
+    conn.commit()
+    conn.close()
+
+    log = AlertLog(db_path, managed=False)
+    engine = AlertEngine(warning=10, debounce=1)
+    engine.add_listener(log.record)
+    feed(engine, 'a', [11])
+    feed(engine, 'b', [11])
+    feed(engine, 'b', [1], start=1000)
+    feed(engine, 'gone', [11])
+    raised = log.raised()
+    assert [(e['sensor_id'], e['level']) for e in raised] == [('a', WARNING)]
+
+    # 重启：恢复后不重复告警，回落时正常解除
+    restored = AlertEngine(warning=10, debounce=1)
+    restored.restore(raised)
+    assert restored.level('a') == WARNING
+    assert feed(restored, 'a', [12], start=1000) == []
+    assert summary(feed(restored, 'a', [1], start=2000)) == \
+        [('a', 'threshold', CLEARED, None, WARNING)]
+    log.close()
@@ -0,0 +1,60 @@
+# test_archive.py
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+
+from sensors.archive import SensorArchiver, archived_days, load_archive
+from sensors.db_creator import init_database
+from sensors.schema import SCHEMA_V2, to_epoch_ms
+from sensors.sensor_writer import SensorDataWriter
+
+
+class CountingConnection(sqlite3.Connection):
+    """记录执行过的语句条数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = 0
+        self.set_trace_callback(self._count)
+
+    def _count(self, statement):
+        self.statements += 1
+
+
+def write(db_path, rows):
+    writer = SensorDataWriter(db_path)
+    for sensor_id in {sensor_id for sensor_id, _, _ in rows}:
+        writer.register_sensor(sensor_id, 0.0, 0.0)
+    ids, ts, values = zip(*rows)
+    writer.write_columns(list(ids), np.array([to_epoch_ms(t) for t in ts], dtype=np.int64),
+                         np.array(values, dtype=float))
+    writer.close()
+
+
+def test_days_v2_skips_empty_days(tmp_path):
+    db_path = str(tmp_path / 'sensor_data.db')
+    init_database(db_path, schema=SCHEMA_V2)
+    write(db_path, [
+        ('a', datetime(1970, 1, 1, 0, 0, 1), 1.0),  # 异常的时间戳
+        ('a', datetime(2026, 3, 1, 12), 2.0),
+        ('a', datetime(2026, 3, 1, 13), 3.0),
+        ('b', datetime(2026, 3, 3, 23, 59, 59), 4.0),
+        ('b', datetime(2026, 3, 20), 5.0),  # 截止时间之后
+    ])
+    archiver = SensorArchiver(db_path, str(tmp_path / 'archive'), max_age_days=10,
+                              managed=False)
+    conn = sqlite3.connect(db_path, factory=CountingConnection)
+    days = archiver._days_v2(conn, datetime(2026, 3, 10))
+    # 每个传感器每个有读数的日期一次查找，再加一次确认没有更多
+    assert conn.statements <= 1 + 3 + 2
+    conn.close()
+    assert days == ['1970-01-01', '2026-03-01', '2026-03-03']
+
+    assert archiver.archive(now=datetime(2026, 3, 20)) == 4
+    assert archived_days(tmp_path / 'archive') == days
+    df = load_archive(tmp_path / 'archive')
+    assert sorted(df['value'].tolist()) == [1.0, 2.0, 3.0, 4.0]
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM readings_v2').fetchone()[0] == 1
+    conn.close()
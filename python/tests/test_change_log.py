@@ -0,0 +1,76 @@
+# test_change_log.py
+from sensors.change_log import SensorChangeLog
+
+
+def test_first_record_sets_floor_without_entry():
+    log = SensorChangeLog()
+    log.record(5, ['a'], [])
+    assert len(log) == 0
+    assert log.since(5) == (set(), set(), set())
+    assert log.since(4) is None
+
+
+def test_since_merges_versions_after_cursor():
+    log = SensorChangeLog()
+    log.reset(1)
+    log.record(2, ['a'], [], ['a'])
+    log.record(3, ['b'], ['c'])
+    log.record(4, ['a', 'd'], [])
+    assert log.since(1) == ({'a', 'b', 'd'}, {'c'}, {'a'})
+    assert log.since(2) == ({'a', 'b', 'd'}, {'c'}, set())
+    assert log.since(3) == ({'a', 'd'}, set(), set())
+    assert log.since(4) == (set(), set(), set())
+
+
+def test_cursor_before_floor_needs_full_sync():
+    log = SensorChangeLog()
+    log.reset(10)
+    log.record(11, ['a'], [])
+    assert log.since(9) is None
+    assert log.since(10) == ({'a'}, set(), set())
+
+
+def test_eviction_raises_floor_to_oldest_evicted_version():
+    log = SensorChangeLog(max_versions=3)
+    log.reset(1)
+    for version in range(2, 5):
+        log.record(version, [f's{version}'], [])
+    assert len(log) == 3
+    assert log.since(1) == ({'s2', 's3', 's4'}, set(), set())
+
+    # 版本 2 被挤出：游标 1 缺少版本 2 的变化，不能再增量同步
+    log.record(5, ['s5'], [])
+    assert len(log) == 3
+    assert log.since(1) is None
+    assert log.since(2) == ({'s3', 's4', 's5'}, set(), set())
+
+    log.record(6, ['s6'], ['s2'])
+    assert log.since(2) is None
+    assert log.since(3) == ({'s4', 's5', 's6'}, {'s2'}, set())
+
+
+def test_eviction_never_loses_changes_for_valid_cursors():
+    log = SensorChangeLog(max_versions=4)
+    log.reset(0)
+    history = {}
+    for version in range(1, 30):
+        history[version] = f's{version % 7}'
+        log.record(version, [history[version]], [])
+        # 保留范围内最早的游标仍可增量同步
+        assert log.since(max(version - 4, 0)) is not None
+        for cursor in range(0, version + 1):
+            delta = log.since(cursor)
+            if delta is None:
+                continue
+            expected = {history[v] for v in range(cursor + 1, version + 1)}
+            assert delta[0] == expected
+
+
+def test_reset_clears_entries():
+    log = SensorChangeLog()
+    log.reset(1)
+    log.record(2, ['a'], [])
+    log.reset(7)
+    assert len(log) == 0
+    assert log.since(6) is None
+    assert log.since(7) == (set(), set(), set())
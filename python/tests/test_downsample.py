@@ -0,0 +1,106 @@
+# test_downsample.py
+import numpy as np
+import pytest
+
+from sensors.downsample import downsample, lttb, minmax
+
+
+def reference_lttb(ts, values, n_out):
+    """按原始论文逐点实现的 LTTB，用于对照"""
+    n = len(ts)
+    every = (n - 2) / (n_out - 2)
+    x = [float(t - ts[0]) for t in ts]
+    y = [float(v) for v in values]
+    selected = [0]
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def reference_minmax(values, n_out):
+    """每个桶最早的最小值和最晚的最大值的下标"""
+    n = len(values)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    selected = set()
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = values[start:end]
+        selected.add(start + int(np.argmin(bucket)))
+        selected.add(start + len(bucket) - 1 - int(np.argmax(bucket[::-1])))
+    return sorted(selected)
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000_000 + np.cumsum(rng.integers(1, 5000, n))
+    values = np.cumsum(rng.normal(size=n))
+    return ts.astype(np.int64), values
+
+
+@pytest.mark.parametrize('n, n_out', [(10, 3), (100, 7), (1000, 50), (1001, 64), (5000, 500)])
+def test_lttb_matches_reference(n, n_out):
+    ts, values = series(n, seed=n)
+    out_ts, out_values = lttb(ts, values, n_out)
+    expected = reference_lttb(ts, values, n_out)
+    assert out_ts.tolist() == ts[expected].tolist()
+    assert out_values.tolist() == values[expected].tolist()
+
+
+def test_lttb_keeps_endpoints_in_order():
+    ts, values = series(2000)
+    out_ts, _ = lttb(ts, values, 100)
+    assert len(out_ts) == 100
+    assert out_ts[0] == ts[0] and out_ts[-1] == ts[-1]
+    assert np.all(np.diff(out_ts) > 0)
+
+
+@pytest.mark.parametrize('n_out', [2, 10, 11])
+def test_lttb_returns_input_when_nothing_to_drop(n_out):
+    ts, values = series(10)
+    out_ts, out_values = lttb(ts, values, n_out)
+    assert out_ts is ts and out_values is values
+
+
+@pytest.mark.parametrize('n, n_out', [(10, 4), (100, 9), (1000, 50), (5000, 400)])
+def test_minmax_matches_reference(n, n_out):
+    ts, values = series(n, seed=n)
+    out_ts, out_values = minmax(ts, values, n_out)
+    expected = reference_minmax(values, n_out)
+    assert out_ts.tolist() == ts[expected].tolist()
+    assert out_values.tolist() == values[expected].tolist()
+    assert len(out_ts) <= n_out
+
+
+def test_minmax_keeps_spikes():
+    ts, values = series(10000)
+    values[1234], values[8765] = 1e6, -1e6
+    _, out_values = minmax(ts, values, 100)
+    assert 1e6 in out_values and -1e6 in out_values
+
+
+def test_minmax_with_ties_picks_each_bucket_once():
+    ts = np.arange(100, dtype=np.int64)
+    values = np.zeros(100)
+    out_ts, _ = minmax(ts, values, 20)
+    # 平坦的桶只保留首尾两点
+    assert len(out_ts) == 20
+    assert np.all(np.diff(out_ts) > 0)
+
+
+def test_downsample_rejects_unknown_method():
+    ts, values = series(10)
+    with pytest.raises(ValueError):
+        downsample(ts, values, 5, method='mean')
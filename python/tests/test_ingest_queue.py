@@ -0,0 +1,74 @@
+# test_ingest_queue.py
+import sqlite3
+import threading
+
+import pytest
+
+from sensors import ingest
+from sensors.db_creator import init_database
+from sensors.ingest import IngestQueue
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'sensor_data.db')
+    init_database(path)
+    return path
+
+
+def count_readings(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM sensor_readings').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_failed_batch_does_not_stop_the_writer(db_path, monkeypatch):
+    store = ingest.store_readings
+    calls = []
+
+    def flaky(cursor, readings, schema):
+        calls.append(len(readings))
+        if len(calls) == 1:
+            raise ValueError('bad reading')
+        return store(cursor, readings, schema)
+
+    monkeypatch.setattr(ingest, 'store_readings', flaky)
+    queue = IngestQueue(db_path, max_delay=0.01)
+    assert queue.put('a', 1.0)
+    assert queue.flush(timeout=5)
+    assert queue.put('a', 2.0)
+    assert queue.flush(timeout=5)
+    stats = queue.stats()
+    queue.close(timeout=5)
+
+    assert stats['failed'] == 1 and stats['committed'] == 1
+    assert count_readings(db_path) == 1
+
+
+def test_put_raises_when_the_writer_thread_died(db_path, monkeypatch):
+    def broken(self):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(IngestQueue, '_take_batch', broken)
+    queue = IngestQueue(db_path, max_queue=2)
+    queue._thread.join(timeout=5)
+    assert not queue._thread.is_alive()
+
+    result = {}
+
+    def writer():
+        try:
+            queue.put_many([('a', float(i), None) for i in range(5)])
+        except RuntimeError as e:
+            result['error'] = str(e)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    # 不会在已停止的消费者上一直等待
+    assert not thread.is_alive()
+    assert result['error'] == '写入线程已停止'
+    # 没有数据入队，flush 立即返回
+    assert queue.flush(timeout=5)
@@ -0,0 +1,119 @@
+# test_poller.py
+import asyncio
+
+import numpy as np
+
+from sensors.ingest import as_datetime
+from sensors.poller import SensorSnapshotPoller
+from sensors.schema import to_epoch_ms
+
+
+class FakeReader:
+    """get_sensor_overview 的异步替身，rows 为数据库中的当前内容"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    async def get_sensor_overview(self):
+        self.calls += 1
+        return [dict(row) for row in self.rows]
+
+
+def sensor(sensor_id, x, value=None, timestamp=None):
+    return {'sensor_id': sensor_id, 'x_position': x, 'y_position': 0.0,
+            'created_at': '2026-01-01 00:00:00', 'last_updated': timestamp,
+            'value': value, 'timestamp': timestamp}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_delta_with_truncated_timestamp_is_not_pushed_twice():
+    async def scenario():
+        reader = FakeReader([sensor('a', 0.1), sensor('b', 0.2, 1.0, '2026-01-01 00:00:01')])
+        poller = SensorSnapshotPoller(reader)
+        first = await poller.refresh()
+
+        # 写入时带微秒，增量合并只拿到毫秒时间戳
+        written = '2026-01-01 00:00:05.654321'
+        reader.rows[0] = sensor('a', 0.1, 5.0, written)
+        poller.feed_rows([('a', to_epoch_ms(as_datetime(written)), 5.0)])
+        delta = await poller.apply_pending()
+        assert delta.data_version > first.data_version
+        assert delta.latest['a']['timestamp'] == '2026-01-01 00:00:05.654000'
+        assert reader.calls == 1
+        assert (await poller.changes_since(first.cursor))['sensors'][0]['value'] == 5.0
+
+        full = await poller.refresh()
+        assert full.data_version == delta.data_version
+        assert full.etag == delta.etag
+        # 完整刷新后换成数据库中的原文
+        assert full.latest['a']['timestamp'] == written
+        assert full.by_id['a']['last_updated'] == written
+        assert len(poller.changes) == 1
+    run(scenario())
+
+
+def test_full_refresh_records_real_changes():
+    async def scenario():
+        reader = FakeReader([sensor('a', 0.1, 1.0, '2026-01-01 00:00:01'),
+                             sensor('b', 0.2, 2.0, '2026-01-01 00:00:01')])
+        poller = SensorSnapshotPoller(reader)
+        deleted = []
+        poller.add_delete_listener(deleted.append)
+        first = await poller.refresh()
+        assert (await poller.refresh()).data_version == first.data_version
+
+        reader.rows = [sensor('a', 0.5, 1.0, '2026-01-01 00:00:01'),
+                       sensor('c', 0.3, 3.0, '2026-01-01 00:00:02')]
+        await poller.refresh()
+        delta = await poller.changes_since(first.cursor)
+        assert [row['sensor_id'] for row in delta['sensors']] == ['a', 'c']
+        assert delta['deleted'] == ['b']
+        assert deleted == ['b']
+        assert [sensor_id for sensor_id, _ in poller.spatial.nearest(0.5, 0.0, 1)] == ['a']
+    run(scenario())
+
+
+def test_stale_and_unknown_rows_are_ignored():
+    async def scenario():
+        reader = FakeReader([sensor('a', 0.1, 1.0, '2026-01-01 00:00:05')])
+        poller = SensorSnapshotPoller(reader)
+        first = await poller.refresh()
+        ts = to_epoch_ms(as_datetime('2026-01-01 00:00:05'))
+        poller.feed_rows([('a', ts, 9.0), ('a', ts - 1000, 8.0), ('zz', ts + 1000, 7.0)])
+        assert await poller.apply_pending() is first
+
+        poller.feed_columns(['a', 'a', 'zz'], np.array([ts + 2000, ts + 1000, ts], dtype=np.int64),
+                            np.array([3.0, 2.0, 1.0]))
+        snapshot = await poller.apply_pending()
+        assert snapshot.latest['a']['value'] == 3.0
+        assert 'zz' not in snapshot.by_id
+    run(scenario())
+
+
+def test_full_refresh_only_observes_changed_sensors():
+    async def scenario():
+        reader = FakeReader([sensor(f's{i}', 0.01 * i, 1.0, '2026-01-01 00:00:01')
+                             for i in range(50)])
+        poller = SensorSnapshotPoller(reader)
+        observed = []
+        observe_many = poller.liveness.observe_many
+
+        def spy(readings, now_ms):
+            readings = list(readings)
+            observed.append([sensor_id for sensor_id, _ in readings])
+            return observe_many(readings, now_ms)
+
+        poller.liveness.observe_many = spy
+        await poller.refresh()
+        assert len(observed[0]) == 50
+
+        reader.rows[7] = sensor('s7', 0.07, 2.0, '2026-01-01 00:00:09')
+        await poller.refresh()
+        await poller.refresh()
+        assert observed[1:] == [['s7'], []]
+        assert poller.liveness.last_seen('s7') == to_epoch_ms(as_datetime('2026-01-01 00:00:09'))
+    run(scenario())
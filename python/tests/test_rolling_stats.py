@@ -0,0 +1,125 @@
+# test_rolling_stats.py
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from sensors.rolling_stats import SensorRollingStats
+from sensors.schema import from_epoch_ms
+
+BASE = 1_700_000_000_000
+
+
+class Reference:
+    """逐条读数计算的统计量，作为对照"""
+
+    def __init__(self, alpha, window_ms, buckets):
+        self.alpha = alpha
+        self.bucket_ms = window_ms // buckets
+        self.buckets = buckets
+        self.readings = defaultdict(list)  # sensor_id -> [(ts, value), ...]
+
+    def update(self, sensor_ids, ts, values):
+        last = {s: r[-1][0] for s, r in self.readings.items() if r}
+        accepted = defaultdict(dict)
+        for sensor_id, t, v in zip(sensor_ids, ts.tolist(), values.tolist()):
+            if np.isnan(v) or t <= last.get(sensor_id, -1):
+                continue
+            # 同一批中同一时间戳只取第一条
+            accepted[sensor_id].setdefault(t, v)
+        for sensor_id, rows in accepted.items():
+            self.readings[sensor_id].extend(sorted(rows.items()))
+
+    def get(self, sensor_id, now_ms):
+        rows = self.readings.get(sensor_id)
+        if not rows:
+            return None
+        values = [v for _, v in rows]
+        ewma = values[0]
+        for v in values[1:]:
+            ewma = self.alpha * v + (1 - self.alpha) * ewma
+        now_bucket = now_ms // self.bucket_ms
+        window = [v for t, v in rows if now_bucket - self.buckets < t // self.bucket_ms <= now_bucket]
+        return {'count': len(values), 'mean': np.mean(values),
+                'variance': np.var(values, ddof=1) if len(values) > 1 else None,
+                'ewma': ewma, 'min': min(window) if window else None,
+                'max': max(window) if window else None, 'last': values[-1],
+                'timestamp': from_epoch_ms(rows[-1][0])}
+
+
+def assert_matches(stats, reference, sensor_ids, now_ms):
+    for sensor_id in sensor_ids:
+        got = stats.get(sensor_id, now=from_epoch_ms(now_ms))
+        expected = reference.get(sensor_id, now_ms)
+        if expected is None:
+            assert got is None
+            continue
+        assert got['count'] == expected['count']
+        assert got['last'] == expected['last']
+        assert got['timestamp'] == expected['timestamp']
+        assert got['min'] == expected['min'] and got['max'] == expected['max']
+        assert got['mean'] == pytest.approx(expected['mean'], rel=1e-9, abs=1e-9)
+        assert got['ewma'] == pytest.approx(expected['ewma'], rel=1e-9, abs=1e-9)
+        if expected['variance'] is None:
+            assert got['variance'] is None
+        else:
+            assert got['variance'] == pytest.approx(expected['variance'], rel=1e-7, abs=1e-9)
+            assert got['std'] == pytest.approx(np.sqrt(expected['variance']), rel=1e-7, abs=1e-9)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    stats = SensorRollingStats(alpha=0.2, window=60, buckets=6)
+    reference = Reference(0.2, 60000, 6)
+    sensor_ids = [f's{i}' for i in range(8)]
+    clock = BASE
+    for _ in range(40):
+        n = int(rng.integers(1, 60))
+        ids = [sensor_ids[i] for i in rng.integers(0, len(sensor_ids), n)]
+        # 大多向前推进，也有迟到、重复和缺失的读数
+        ts = clock + rng.integers(-5000, 20000, n)
+        values = rng.normal(50, 10, n).round(2)
+        values[rng.random(n) < 0.05] = np.nan
+        if rng.random() < 0.2:
+            ids, ts, values = ids + ids[:5], np.append(ts, ts[:5]), np.append(values, values[:5])
+        stats.update(ids, ts.astype(np.int64), values)
+        reference.update(ids, ts.astype(np.int64), values)
+        # 查询时刻不早于已写入的读数
+        clock = max(clock, int(ts.max())) + int(rng.integers(0, 30000))
+        assert_matches(stats, reference, sensor_ids, clock)
+    assert_matches(stats, reference, sensor_ids, clock + 45000)
+
+
+def test_batch_spanning_more_than_a_window():
+    stats = SensorRollingStats(window=60, buckets=6)
+    reference = Reference(0.1, 60000, 6)
+    ts = BASE + np.arange(0, 300000, 7000, dtype=np.int64)
+    values = np.sin(np.arange(len(ts))) * 10
+    stats.update(['a'] * len(ts), ts, values)
+    reference.update(['a'] * len(ts), ts, values)
+    assert_matches(stats, reference, ['a'], int(ts[-1]))
+
+
+def test_feed_rows_and_duplicates_count_once():
+    stats = SensorRollingStats()
+    rows = [('a', BASE, 1.0), ('a', BASE + 1000, 3.0)]
+    stats.feed_rows(rows)
+    stats.feed_rows(rows)
+    row = stats.get('a', now=from_epoch_ms(BASE + 1000))
+    assert row['count'] == 2 and row['mean'] == 2.0 and row['variance'] == 2.0
+
+
+def test_drop_starts_over():
+    stats = SensorRollingStats()
+    stats.feed_rows([('a', BASE, 1.0), ('a', BASE + 1000, 3.0), ('b', BASE, 5.0)])
+    stats.drop('a')
+    stats.drop('missing')
+    now = from_epoch_ms(BASE + 2000)
+    assert stats.get('a', now=now) is None
+    assert [row['sensor_id'] for row in stats.get_many(now=now)] == ['b']
+    # 同ID的传感器重新出现时从第一条读数开始累计，更早的时间戳也接受
+    stats.feed_rows([('a', BASE - 5000, 7.0)])
+    row = stats.get('a', now=now)
+    assert row['count'] == 1 and row['mean'] == 7.0 and row['ewma'] == 7.0
+    assert row['min'] == 7.0 and row['max'] == 7.0
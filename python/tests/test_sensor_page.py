@@ -0,0 +1,43 @@
+# test_sensor_page.py
+import pytest
+
+from sensors.db_creator import init_database
+from sensors.prefix_index import SensorPrefixIndex, fold_case
+from sensors.sensor_reader import SensorDataReader
+from sensors.sensor_writer import SensorDataWriter
+
+SENSOR_IDS = ['ab', 'AB', 'Ab-1', 'aB_2', 'a%3', 'temp', 'Temp2', 'TEMP_3', 'température',
+              'Äpfel', 'äpfel', 'ÄX', 'Σensor', 'σensor', 'zz', 'Z']
+
+
+@pytest.fixture(scope='module')
+def reader(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('page') / 'sensor_data.db')
+    init_database(db_path)
+    writer = SensorDataWriter(db_path)
+    for i, sensor_id in enumerate(SENSOR_IDS):
+        writer.register_sensor(sensor_id, float(i), 0.0)
+    writer.close()
+    return SensorDataReader(db_path)
+
+
+def test_fold_case_only_changes_ascii():
+    assert fold_case('TeMP-Äσ') == 'temp-Äσ'
+
+
+@pytest.mark.parametrize('prefix', ['', 'a', 'A', 'ab', 'a_', 'a%', 'ä', 'Ä', 't', 'TEMP',
+                                    'temp_', 'tempé', 'TEMPÉ', 'σ', 'Σ', 'z', 'x'])
+@pytest.mark.parametrize('descending', [False, True])
+def test_index_and_database_pages_match(reader, prefix, descending):
+    index = SensorPrefixIndex(SENSOR_IDS)
+    for offset, limit in [(0, 3), (2, 4), (0, 100)]:
+        rows, total = reader.get_sensor_page(offset, limit, 'sensor_id', descending, prefix)
+        assert total == index.count(prefix)
+        assert [row['sensor_id'] for row in rows] == \
+            index.page(prefix, offset, limit, descending)
+
+
+def test_non_ascii_prefix_is_case_sensitive(reader):
+    index = SensorPrefixIndex(SENSOR_IDS)
+    assert index.page('ä', 0, 10) == ['äpfel']
+    assert reader.get_sensor_page(0, 10, 'sensor_id', False, 'Ä')[1] == 2
@@ -0,0 +1,97 @@
+# test_spatial.py
+import math
+import random
+
+import pytest
+
+from sensors.spatial import GridIndex, in_bbox
+
+
+def brute_nearest(positions, x, y, k, max_distance=None):
+    ranked = sorted((math.hypot(px - x, py - y), sensor_id)
+                    for sensor_id, (px, py) in positions.items())[:k]
+    return [(sensor_id, d) for d, sensor_id in ranked
+            if max_distance is None or d <= max_distance]
+
+
+def brute_bbox(positions, bbox):
+    return sorted(sensor_id for sensor_id, (x, y) in positions.items() if in_bbox(x, y, bbox))
+
+
+def random_positions(rng, n, spread=1.0, offset=0.0):
+    return {f's{i:04d}': (rng.uniform(-spread, spread) + offset,
+                          rng.uniform(-spread, spread) + offset) for i in range(n)}
+
+
+@pytest.mark.parametrize('n, spread, cell_size', [
+    (500, 0.05, 0.01),  # 格子密集：按环搜索
+    (50, 1.0, 0.01),    # 格子稀疏：逐个计算
+    (300, 0.2, 0.05),
+])
+def test_nearest_matches_brute_force(n, spread, cell_size):
+    rng = random.Random(n)
+    positions = random_positions(rng, n, spread)
+    index = GridIndex(cell_size)
+    index.rebuild((sensor_id, x, y) for sensor_id, (x, y) in positions.items())
+    for _ in range(100):
+        x, y = rng.uniform(-1.5 * spread, 1.5 * spread), rng.uniform(-1.5 * spread, 1.5 * spread)
+        k = rng.choice([1, 3, 10, n + 5])
+        assert index.nearest(x, y, k) == brute_nearest(positions, x, y, k)
+
+
+def test_nearest_with_max_distance():
+    rng = random.Random(1)
+    positions = random_positions(rng, 400, 0.1)
+    index = GridIndex(0.01)
+    index.rebuild((sensor_id, x, y) for sensor_id, (x, y) in positions.items())
+    for _ in range(50):
+        x, y = rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1)
+        assert index.nearest(x, y, 20, max_distance=0.02) == \
+            brute_nearest(positions, x, y, 20, max_distance=0.02)
+
+
+@pytest.mark.parametrize('n, spread', [(500, 0.05), (50, 2.0)])
+def test_bbox_matches_brute_force(n, spread):
+    rng = random.Random(n)
+    positions = random_positions(rng, n, spread)
+    index = GridIndex(0.01)
+    index.rebuild((sensor_id, x, y) for sensor_id, (x, y) in positions.items())
+    for _ in range(100):
+        xs = sorted(rng.uniform(-1.2 * spread, 1.2 * spread) for _ in range(2))
+        ys = sorted(rng.uniform(-1.2 * spread, 1.2 * spread) for _ in range(2))
+        bbox = (xs[0], ys[0], xs[1], ys[1])
+        assert sorted(index.bbox(*bbox)) == brute_bbox(positions, bbox)
+
+
+def test_bbox_includes_points_on_the_edge():
+    index = GridIndex(0.01)
+    index.insert('a', 0.01, 0.02)
+    index.insert('b', 0.03, 0.02)
+    assert sorted(index.bbox(0.01, 0.02, 0.03, 0.02)) == ['a', 'b']
+
+
+def test_moves_and_removals_match_brute_force():
+    rng = random.Random(7)
+    positions = random_positions(rng, 300, 0.1)
+    index = GridIndex(0.01)
+    index.rebuild((sensor_id, x, y) for sensor_id, (x, y) in positions.items())
+    for step in range(500):
+        sensor_id = f's{rng.randrange(400):04d}'
+        if rng.random() < 0.3:
+            positions.pop(sensor_id, None)
+            index.remove(sensor_id)
+        else:
+            positions[sensor_id] = (rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1))
+            index.insert(sensor_id, *positions[sensor_id])
+        if step % 25 == 0:
+            x, y = rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1)
+            assert index.nearest(x, y, 5) == brute_nearest(positions, x, y, 5)
+            assert sorted(index.bbox(-0.05, -0.05, 0.05, 0.05)) == \
+                brute_bbox(positions, (-0.05, -0.05, 0.05, 0.05))
+    assert len(index) == len(positions)
+
+
+def test_empty_index():
+    index = GridIndex()
+    assert index.nearest(0, 0, 3) == []
+    assert index.bbox(-1, -1, 1, 1) == []
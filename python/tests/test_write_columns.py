@@ -0,0 +1,99 @@
+# test_write_columns.py
+import sqlite3
+
+import numpy as np
+import pytest
+
+from sensors.db_creator import init_database
+from sensors.rollup import RESOLUTIONS, rollup_table
+from sensors.schema import SCHEMA_V1, SCHEMA_V2, from_epoch_ms
+from sensors.sensor_writer import SensorDataWriter
+
+BASE = 1_700_000_000_000
+SENSORS = [f's{i}' for i in range(12)]
+
+
+def readings(seed=1, n=3000):
+    rng = np.random.default_rng(seed)
+    sensor_ids = np.array(SENSORS, dtype=object)[rng.integers(0, len(SENSORS), n)]
+    # 有整秒和非整秒的时间戳，跨越多个小时和天
+    ts = BASE + rng.integers(0, 2 * 86400, n) * 1000 + rng.choice([0, 250, 999], n)
+    values = rng.random(n).round(3)
+    return sensor_ids, ts.astype(np.int64), values
+
+
+def new_writer(tmp_path, name, schema):
+    db_path = str(tmp_path / f'{name}.db')
+    init_database(db_path, schema=schema)
+    writer = SensorDataWriter(db_path)
+    for sensor_id in SENSORS:
+        writer.register_sensor(sensor_id, 0.1, 0.2)
+    return writer, db_path
+
+
+def dump(db_path):
+    conn = sqlite3.connect(db_path)
+    tables = {
+        'readings': conn.execute(
+            'SELECT sensor_id, value, timestamp FROM sensor_readings').fetchall(),
+        'sensor_latest': conn.execute('SELECT * FROM sensor_latest').fetchall(),
+        'sensors': conn.execute('SELECT sensor_id, last_updated FROM sensors').fetchall(),
+    }
+    for resolution in RESOLUTIONS:
+        tables[resolution] = conn.execute(
+            f'SELECT * FROM {rollup_table(resolution)}').fetchall()
+    conn.close()
+    return {name: sorted(rows, key=repr) for name, rows in tables.items()}
+
+
+def assert_same_tables(expected, got):
+    for name in ('readings', 'sensor_latest', 'sensors'):
+        assert got[name] == expected[name], name
+    for resolution in RESOLUTIONS:
+        assert len(got[resolution]) == len(expected[resolution])
+        for a, b in zip(expected[resolution], got[resolution]):
+            # 汇总的和按不同顺序累加，只有浮点误差
+            assert a[:3] == b[:3] and a[4:] == b[4:]
+            assert b[3] == pytest.approx(a[3], rel=1e-12)
+
+
+@pytest.mark.parametrize('schema', [SCHEMA_V1, SCHEMA_V2])
+def test_write_columns_matches_batch_write_data(tmp_path, schema):
+    sensor_ids, ts, values = readings()
+
+    rows_writer, rows_path = new_writer(tmp_path, 'rows', schema)
+    assert rows_writer.batch_write_data(
+        [{'sensor_id': sensor_id, 'value': float(value), 'timestamp': from_epoch_ms(int(t))}
+         for sensor_id, t, value in zip(sensor_ids, ts.tolist(), values)])
+    rows_writer.close()
+
+    columns_writer, columns_path = new_writer(tmp_path, 'columns', schema)
+    # 分成多个事务，并用 datetime64 时间戳
+    written = columns_writer.write_columns(sensor_ids, ts.astype('datetime64[ms]'), values,
+                                           chunk_rows=700)
+    columns_writer.close()
+
+    expected = dump(rows_path)
+    assert written == len(expected['readings'])
+    assert_same_tables(expected, dump(columns_path))
+
+
+def test_write_columns_skips_duplicates_on_v2(tmp_path):
+    sensor_ids, ts, values = readings(seed=2, n=500)
+    writer, db_path = new_writer(tmp_path, 'columns', SCHEMA_V2)
+    first = writer.write_columns(sensor_ids, ts, values)
+    before = dump(db_path)
+    # 重复写入不改变读数，也不重复计入汇总
+    assert writer.write_columns(sensor_ids, ts, values + 1) == 0
+    writer.close()
+    assert first == len(before['readings'])
+    assert_same_tables(before, dump(db_path))
+
+
+def test_write_columns_rejects_mismatched_lengths(tmp_path):
+    writer, _ = new_writer(tmp_path, 'columns', SCHEMA_V2)
+    with pytest.raises(ValueError):
+        writer.write_columns(['s0', 's1'], [BASE], [1.0, 2.0])
+    with pytest.raises(ValueError):
+        writer.write_columns(['s0', 's1'], [BASE, BASE], [1.0])
+    writer.close()
@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+# 同步数据库对象的异步门面
+#
+# NiceGUI 的页面和定时刷新都运行在同一个事件循环中，直接调用 sqlite3 会阻塞
+# 所有客户端。门面把方法调用放到专用线程池中执行，页面 await 结果即可。
+
+# 只读查询共用的线程池：限制同时执行的查询数，多个标签页的刷新在此排队
+READ_WORKERS = 8
+_read_executor = ThreadPoolExecutor(READ_WORKERS, thread_name_prefix='db-read')
+
+# 持有单个 sqlite3 连接的对象，每个对象一个单线程执行器，保证调用串行
+_serial_executors: 'weakref.WeakKeyDictionary[Any, ThreadPoolExecutor]' = \
+    weakref.WeakKeyDictionary()
+_serial_lock = threading.Lock()
+
+
+class AsyncFacade:
+    """
+    把对象的方法包装为协程，在指定线程池中执行
+
+    非方法属性直接返回原值。
+    """
+
+    def __init__(self, target, executor: ThreadPoolExecutor):
+        self._target = target
+        self._executor = executor
+
+    @property
+    def target(self):
+        """被包装的同步对象"""
+        return self._target
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(attr, *args, **kwargs))
+        return call
+
+
+def async_reader(reader) -> AsyncFacade:
+    """
+    只读对象（如 SensorDataReader，连接来自按线程分配的连接池）的门面
+
+    所有读取器共用 READ_WORKERS 个线程。
+    """
+    return AsyncFacade(reader, _read_executor)
+
+
+def async_serial(target) -> AsyncFacade:
+    """
+    持有单个连接的对象（如 SensorDataWriter、ToxicGasDatabase）的门面
+
+    同一对象的调用都在同一个线程中依次执行；该对象的连接需以
+    check_same_thread=False 打开。
+    """
+    with _serial_lock:
+        executor = _serial_executors.get(target)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                1, thread_name_prefix=f'db-{type(target).__name__}')
+            _serial_executors[target] = executor
+    return AsyncFacade(target, executor)